@@ -17,14 +17,16 @@ Copyright (c) 2015, 2020 Tim Waugh <tim@cyberelk.net>
 """
 
 from journal_brief.journal_brief import SelectiveReader, LatestJournalEntries
+from journal_brief.export import ExportReader
 from journal_brief.filter import JournalFilter
 from journal_brief.format import list_formatters, get_formatter
 from journal_brief.config import Config
+from journal_brief.engine import BriefEngine
 
 
-__all__ = ['SelectiveReader', 'LatestJournalEntries',
+__all__ = ['SelectiveReader', 'LatestJournalEntries', 'ExportReader',
            'JournalFilter',
            'list_formatters', 'get_formatter',
-           'Config']
+           'Config', 'BriefEngine']
 
 __version__ = '1.1.8'  # also update setup.py and python-journal-brief.spec
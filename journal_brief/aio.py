@@ -0,0 +1,151 @@
+"""
+Copyright (c) 2026 Tim Waugh <tim@cyberelk.net>
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from journal_brief.filter import JournalFilter
+from journal_brief.journal_brief import LatestJournalEntries
+from journal_brief.pipeline import OutputChunk
+
+
+class AsyncLatestJournalEntries(object):
+    """
+    Iterate over new journal entries since last time, for asyncio
+
+    This wraps LatestJournalEntries, which is created, read from and
+    closed in a thread of its own so that the event loop is not
+    blocked by journal access or by writing the cursor bookmark file:
+
+      async with AsyncLatestJournalEntries(cursor_file=...) as entries:
+          async for entry in entries:
+              ...
+
+    Entries are read in batches. If iteration stops early, the
+    cursor saved is that of the last entry returned.
+    """
+
+    BATCH_SIZE = 64
+
+    def __init__(self, batch_size=None, **kwargs):
+        """
+        Constructor
+
+        :param batch_size: int, most entries to read at a time
+        :param kwargs: keyword arguments for LatestJournalEntries
+        """
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.kwargs = kwargs
+        self.entries = None
+        self.batch = deque()
+        self.ended = False
+        self.cursor = None
+
+        # The journal reader is only used from this thread
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def run(self, func, *args):
+        """
+        Call a function in the reader thread
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def __aenter__(self):
+        self.entries = await self.run(lambda: LatestJournalEntries(
+            **self.kwargs))
+        self.cursor = self.entries.cursor
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if self.batch:
+                # Entries were read which were never returned
+                self.entries.cursor = self.cursor
+
+            await self.run(self.entries.__exit__,
+                           exc_type, exc_val, exc_tb)
+        finally:
+            self.executor.shutdown(wait=False)
+
+    def read_batch(self):
+        """
+        Read the next batch of entries
+
+        :return: list, entries, fewer than the batch size at the end
+        """
+        batch = []
+        for entry in self.entries:
+            batch.append(entry)
+            if len(batch) == self.batch_size:
+                break
+
+        return batch
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.batch:
+            if self.ended:
+                raise StopAsyncIteration
+
+            batch = await self.run(self.read_batch)
+            if len(batch) < self.batch_size:
+                self.ended = True
+
+            if not batch:
+                raise StopAsyncIteration
+
+            self.batch.extend(batch)
+
+        entry = self.batch.popleft()
+        self.cursor = entry.get('__CURSOR', self.cursor)
+        return entry
+
+
+class AsyncJournalFilter(JournalFilter):
+    """
+    Apply filters to journal entries from an asynchronous iterator
+
+    The iterator is an asynchronous one, such as
+    AsyncLatestJournalEntries, and format() is a coroutine.
+    """
+
+    async def format(self, stream, encoding='utf-8'):
+        """
+        Format the entries from the iterator, writing them to a stream
+
+        :param stream: asyncio.StreamWriter, or any object with a
+                       write() method taking bytes and a drain()
+                       coroutine
+        :param encoding: str, encoding for the output
+        """
+        try:
+            async for entry in self.iterator:
+                chunk = OutputChunk()
+                self.format_entry(chunk, entry)
+                output = chunk.getvalue()
+                if output:
+                    stream.write(output.encode(encoding))
+                    await stream.drain()
+        finally:
+            chunk = OutputChunk()
+            self.flush(chunk)
+            stream.write(chunk.getvalue().encode(encoding))
+            await stream.drain()
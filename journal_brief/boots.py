@@ -0,0 +1,112 @@
+"""
+Copyright (c) 2026 Tim Waugh <tim@cyberelk.net>
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+
+from collections import namedtuple
+from logging import getLogger
+from systemd import journal
+import uuid
+
+
+log = getLogger(__name__)
+
+# A boot recorded in the journal, with the __REALTIME_TIMESTAMP
+# values of its first and last entries
+Boot = namedtuple('Boot', ['boot_id', 'first', 'last'])
+
+
+class BootIndex(object):
+    """
+    The boots recorded in the journal, oldest first
+
+    The boot IDs are enumerated from the journal's field data, and the
+    first and last entries of each are found by seeking, so building
+    the index doesn't read every entry.
+    """
+
+    def __init__(self, reader=None):
+        """
+        Constructor
+
+        :param reader: systemd.journal.Reader instance, or None for a
+                       new one; its matches are flushed
+        """
+        close = reader is None
+        if reader is None:
+            reader = journal.Reader()
+
+        self.boots = []
+        for boot_id in reader.query_unique('_BOOT_ID'):
+            reader.flush_matches()
+            reader.this_boot(boot_id)
+            reader.seek_head()
+            first = reader.get_next()
+            reader.seek_tail()
+            last = reader.get_previous()
+            if first and last:
+                self.boots.append(Boot(boot_id=boot_id,
+                                       first=first['__REALTIME_TIMESTAMP'],
+                                       last=last['__REALTIME_TIMESTAMP']))
+
+        reader.flush_matches()
+        if close:
+            reader.close()
+
+        self.boots.sort(key=lambda boot: boot.first)
+        log.debug("%d boots", len(self.boots))
+
+    def __len__(self):
+        return len(self.boots)
+
+    def __iter__(self):
+        return iter(self.boots)
+
+    def find(self, boot):
+        """
+        Find a boot by offset or boot ID
+
+        As for 'journalctl --boot', an offset of 1 is the first boot
+        in the journal, 2 the next, and so on, while 0 is the last
+        boot, -1 the one before, and so on.
+
+        :param boot: str, offset or boot ID
+        :return: Boot instance
+        :raises ValueError: if there is no such boot
+        """
+        try:
+            if len(boot) in (32, 36):
+                boot_id = uuid.UUID(boot).hex
+                offset = None
+            else:
+                offset = int(boot)
+        except ValueError:
+            raise ValueError("invalid boot {0!r}".format(boot))
+
+        if offset is None:
+            for found in self.boots:
+                if getattr(found.boot_id, 'hex', found.boot_id) == boot_id:
+                    return found
+        else:
+            if offset > 0:
+                index = offset - 1
+            else:
+                index = len(self.boots) - 1 + offset
+
+            if 0 <= index < len(self.boots):
+                return self.boots[index]
+
+        raise ValueError("no boot {0!r} in the journal".format(boot))
@@ -18,3 +18,5 @@ Copyright (c) 2020 Tim Waugh <tim@cyberelk.net>
 
 EMAIL_SUPPRESS_EMPTY_TEXT = 'No matching entries found in journal.\n'
 EMAIL_DRY_RUN_SEPARATOR = '------'
+BACKLOG_REMAINING_TEXT = ('\n[Backlog remaining: stopped after {0} entries, '
+                          'the next run continues from here]\n')
@@ -17,12 +17,15 @@ Copyright (c) 2015, 2020 Tim Waugh <tim@cyberelk.net>
 """
 
 import argparse
+import contextlib
+import datetime
 from email.mime.text import MIMEText
 from email import charset
 import io
 from locale import setlocale, LC_ALL
 import logging
 import os
+import re
 import signal
 from smtplib import SMTP
 import ssl
@@ -36,9 +39,24 @@ from journal_brief import (SelectiveReader,
                            JournalFilter,
                            __version__ as journal_brief_version)
 from journal_brief.cli.constants import (EMAIL_SUPPRESS_EMPTY_TEXT,
-                                         EMAIL_DRY_RUN_SEPARATOR)
+                                         EMAIL_DRY_RUN_SEPARATOR,
+                                         BACKLOG_REMAINING_TEXT)
+from journal_brief.boots import BootIndex
 from journal_brief.config import Config, ConfigError
-from journal_brief.constants import PACKAGE, CONFIG_DIR, PRIORITY_MAP
+from journal_brief.engine import (configured_inclusions,
+                                  configured_log_level,
+                                  output_formatters,
+                                  DEFAULT_OUTPUT_FORMATS)
+from journal_brief.export import ExportReader, ExportFormatError
+from journal_brief.filter import (Exclusion, Inclusion, RuleSet,
+                                  push_down_exclusions)
+from journal_brief.constants import PACKAGE, CONFIG_DIR
+from journal_brief.history import ExclusionHistory
+from journal_brief.journal_brief import (inclusion_rules, journal_unchanged,
+                                         read_cursor_file, MultiCursorEntries,
+                                         ReverseJournalEntries)
+from journal_brief.parallel import ParallelFilter
+from journal_brief.pipeline import Pipeline
 import journal_brief.format.config   # registers class; # noqa: F401
 import journal_brief.format.short    # registers class; # noqa: F401
 import journal_brief.format.json     # registers class; # noqa: F401
@@ -49,6 +67,66 @@ import journal_brief.format.systemd  # registers class; # noqa: F401
 
 log = logging.getLogger('cli')
 
+# Day names for --since and --until, relative to today
+DAYS = {'yesterday': -1, 'today': 0, 'tomorrow': 1}
+
+# Units for relative times, in seconds
+TIME_UNITS = {'s': 1, 'min': 60, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_time(value, now=None):
+    """
+    Parse a local time given to --since or --until
+
+    These are accepted:
+     'YYYY-MM-DD', 'YYYY-MM-DD HH:MM' or 'YYYY-MM-DD HH:MM:SS'
+     'HH:MM' or 'HH:MM:SS', meaning today
+     'now', or 'yesterday', 'today' or 'tomorrow' optionally followed
+       by a time as above
+     'N ago', '-N' or '+N', where N is a number followed by 's',
+       'min', 'h' or 'd', relative to now
+
+    :param value: str, time to parse
+    :param now: datetime, current time
+    :return: datetime
+    """
+    if now is None:
+        now = datetime.datetime.now()
+
+    text = value.strip()
+    if text == 'now':
+        return now
+
+    relative = (re.match(r'([-+])(\d+)(s|min|m|h|d)$', text) or
+                re.match(r'()(\d+) ?(s|min|m|h|d) +ago$', text))
+    if relative:
+        (sign, count, unit) = relative.groups()
+        delta = datetime.timedelta(seconds=int(count) * TIME_UNITS[unit])
+        return now + delta if sign == '+' else now - delta
+
+    words = text.split(None, 1)
+    if words and words[0] in DAYS:
+        day = now.date() + datetime.timedelta(days=DAYS[words[0]])
+        text = words[1] if len(words) > 1 else '00:00'
+    else:
+        for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d']:
+            try:
+                return datetime.datetime.strptime(text, fmt)
+            except ValueError:
+                pass
+
+        day = now.date()
+
+    for fmt in ['%H:%M:%S', '%H:%M']:
+        try:
+            time = datetime.datetime.strptime(text, fmt).time()
+        except ValueError:
+            pass
+        else:
+            return datetime.datetime.combine(day, time)
+
+    raise argparse.ArgumentTypeError("invalid time: {0!r}".format(value))
+
 
 class InstanceConfig(object):
     def __init__(self, config, args):
@@ -81,31 +159,74 @@ class NullStream(object):
 
 
 class CLI(object):
-    def __init__(self, args=None):
-        self.args = self.get_args(args or sys.argv[1:])
-        config = Config(config_file=self.args.conf)
+    def __init__(self, args=None, conf=None):
+        """
+        Constructor
+
+        :param args: list, command-line arguments
+        :param conf: str, config file to use instead of the first --conf
+        """
+        args = args or sys.argv[1:]
+        self.args = self.get_args(args)
+        conf_files = self.args.conf or [None]
+        config = Config(config_file=conf or conf_files[0])
         self.config = InstanceConfig(config, self.args)
 
-        self.default_output_formats = ['reboot', 'short']
         self.cursor_file = None
         self.log_level = None
 
+        # Each further config file is a profile, processed in the same
+        # pass over the journal
+        self.profiles = [self]
+        if conf is None:
+            self.profiles.extend(CLI(args, conf=conf_file)
+                                 for conf_file in conf_files[1:])
+
     @staticmethod
     def get_args(args):
         description = 'Show new journal entries since last run'
         parser = argparse.ArgumentParser(description=description)
         parser.add_argument('-b', action='store_true', default=False,
                             help='process all entries from the current boot')
+        parser.add_argument('--boot', metavar='N|ID',
+                            help='process all entries from boot N (1 is '
+                            'the first in the journal, 0 the current boot, '
+                            '-1 the one before) or with boot ID, without '
+                            'updating the cursor bookmark')
+        parser.add_argument('--since', metavar='TIME', type=parse_time,
+                            help='process entries from TIME onwards, '
+                            'without updating the cursor bookmark')
+        parser.add_argument('--until', metavar='TIME', type=parse_time,
+                            help='process entries up to TIME, without '
+                            'updating the cursor bookmark')
         parser.add_argument('-p', '--priority', metavar='PRI',
                             help='show entries at priority PRI and lower',
                             choices=['emerg', 'alert', 'crit', 'err',
                                      'warning', 'notice', 'info', 'debug'])
-        parser.add_argument('--conf', metavar='FILE',
-                            help='use FILE as config file')
+        parser.add_argument('--conf', metavar='FILE', action='append',
+                            help='use FILE as config file; give this '
+                            'more than once to process several profiles '
+                            'together')
         parser.add_argument('--debug', action='store_true', default=False,
                             help='enable debugging')
         parser.add_argument('--dry-run', action='store_true', default=False,
                             help='do not update cursor bookmark file')
+        parser.add_argument('--export', metavar='FILE',
+                            help='read entries in journal export format '
+                            'from FILE (- for stdin) instead of the '
+                            'journal, without using the cursor bookmark')
+        parser.add_argument('-j', '--jobs', metavar='N', type=int,
+                            help='match entries against exclusions in N '
+                            'worker processes')
+        parser.add_argument('--last', metavar='N', type=int,
+                            help='show only the last N entries, without '
+                            'updating the cursor bookmark')
+        parser.add_argument('--max-entries', metavar='N', type=int,
+                            help='stop after reading N entries, leaving '
+                            'the rest for the next run')
+        parser.add_argument('--max-runtime', metavar='SECONDS', type=float,
+                            help='stop reading entries after SECONDS, '
+                            'leaving the rest for the next run')
         helptxt = ('output format for journal entries, '
                    'comma-separated list from {0}'.format(list_formatters()))
         parser.add_argument('-o', '--output', metavar='FORMAT', help=helptxt)
@@ -115,9 +236,82 @@ class CLI(object):
 
         cmds = parser.add_subparsers(dest='cmd')
         cmds.add_parser('debrief', help='create exclusions config')
+        follow = cmds.add_parser('follow', help='keep running, showing new '
+                                 'entries in batches as they arrive')
+        follow.add_argument('--interval', metavar='SECONDS', type=float,
+                            default=3600,
+                            help='time to collect each batch for '
+                            '(default: 3600)')
+        follow.add_argument('--entries', metavar='N', type=int,
+                            help='end each batch after reading N entries')
         cmds.add_parser('reset', help='reset cursor bookmark and exit')
-        cmds.add_parser('stats', help='show statistics')
-        return parser.parse_args(args)
+        stats = cmds.add_parser('stats', help='show statistics')
+        stats.add_argument('--history', action='store_true', default=False,
+                           help='show statistics saved from previous runs '
+                           'instead of reading the journal')
+        args = parser.parse_args(args)
+        if args.jobs is not None and args.jobs < 1:
+            parser.error('--jobs must be positive')
+        if args.max_entries is not None and args.max_entries < 1:
+            parser.error('--max-entries must be positive')
+        if args.max_runtime is not None and args.max_runtime <= 0:
+            parser.error('--max-runtime must be positive')
+        if args.export is not None and (args.max_entries is not None or
+                                        args.max_runtime is not None):
+            parser.error('--max-entries and --max-runtime need the journal, '
+                         'not --export')
+        if args.boot is not None:
+            if args.b:
+                parser.error('-b and --boot cannot be used together')
+            if args.export is not None:
+                parser.error('--boot needs the journal, not --export')
+            if args.cmd == 'follow':
+                parser.error('follow cannot be used with --boot')
+        if args.last is not None:
+            if args.last < 1:
+                parser.error('--last must be positive')
+            if args.export is not None:
+                parser.error('--last needs the journal, not --export')
+            if args.cmd in ('follow', 'stats'):
+                parser.error('{0} cannot be used with --last'.format(args.cmd))
+            if (args.jobs is not None or args.max_entries is not None or
+                    args.max_runtime is not None):
+                parser.error('--last cannot be used with --jobs, '
+                             '--max-entries or --max-runtime')
+        if args.since is not None or args.until is not None:
+            if args.export is not None:
+                parser.error('--since and --until need the journal, not '
+                             '--export')
+            if args.cmd == 'follow':
+                parser.error('follow cannot be used with --since or --until')
+            if (args.since is not None and args.until is not None and
+                    args.since > args.until):
+                parser.error('--since must not be later than --until')
+        if args.conf and len(args.conf) > 1:
+            if args.cmd not in (None, 'reset'):
+                parser.error('several --conf files cannot be used with '
+                             '{0}'.format(args.cmd))
+            if (args.export is not None or args.jobs is not None or
+                    args.max_entries is not None or
+                    args.max_runtime is not None or
+                    args.boot is not None or args.since is not None or
+                    args.until is not None or args.last is not None):
+                parser.error('several --conf files cannot be used with '
+                             '--export, --jobs, --max-entries, '
+                             '--max-runtime, --boot, --since, --until or '
+                             '--last')
+        if args.cmd == 'follow':
+            if args.export is not None:
+                parser.error('follow needs the journal, not --export')
+            if args.max_entries is not None or args.max_runtime is not None:
+                parser.error('follow uses --interval and --entries instead '
+                             'of --max-entries and --max-runtime')
+            if args.interval <= 0:
+                parser.error('--interval must be positive')
+            if args.entries is not None and args.entries < 1:
+                parser.error('--entries must be positive')
+
+        return args
 
     def show_stats(self, jfilter):
         jfilter.format(NullStream())
@@ -129,6 +323,30 @@ class CLI(object):
             print(strf.format(FREQ=stat.hits,
                               EXCLUSION=repr(dict(stat.exclusion))))
 
+    def show_history(self):
+        """
+        Respond to 'stats --history'
+        """
+
+        exclusions = [Exclusion(excl)
+                      for excl in self.config.get('exclusions', [])]
+        history = ExclusionHistory.for_cursor_file(self.cursor_file)
+        stats = history.get_statistics(exclusions)
+        log.debug("stats: %r", stats)
+        strf = "{FREQ:>10}  {EVAL:>10}  {LAST:<15}  {EXCLUSION}"
+        print(strf.format(FREQ='FREQUENCY', EVAL='EVALUATED',
+                          LAST='LAST HIT', EXCLUSION='EXCLUSION'))
+        for stat in stats:
+            if stat.last_hit is None:
+                last_hit = 'never'
+            else:
+                last_hit = stat.last_hit.strftime('%b %d %T')
+
+            print(strf.format(FREQ=stat.hits,
+                              EVAL=stat.evaluations,
+                              LAST=last_hit,
+                              EXCLUSION=repr(dict(stat.exclusion))))
+
     def show_output_help(self):
         """
         Respond to --help-output
@@ -147,7 +365,7 @@ class CLI(object):
             print('\n'.join(['    ' + line for line in docstring]))
 
         print("\nMultiple output formats can be used at the same time.")
-        print("The default is '{0}'".format(','.join(self.default_output_formats)))
+        print("The default is '{0}'".format(','.join(DEFAULT_OUTPUT_FORMATS)))
 
     def reset(self):
         """
@@ -183,10 +401,12 @@ class CLI(object):
             self.reset()
             return True
 
-        priority = self.config.get('priority')
-        if priority:
-            self.log_level = int(PRIORITY_MAP[priority])
-            log.debug("priority=%r from args/config", self.log_level)
+        if self.args.cmd == 'stats' and self.args.history:
+            self.show_history()
+            return True
+
+        self.log_level = configured_log_level(self.config)
+        log.debug("priority=%r from args/config", self.log_level)
 
         return False
 
@@ -199,9 +419,9 @@ class CLI(object):
         if self.args.cmd == 'debrief':
             formatters = [get_formatter('config')]
         else:
-            outputs = self.config.get('output', self.default_output_formats)
+            outputs = self.config.get('output', DEFAULT_OUTPUT_FORMATS)
             try:
-                formatters = [get_formatter(output) for output in outputs]
+                formatters = output_formatters(outputs)
             except KeyError as ex:
                 sys.stderr.write("{0}: invalid output format '{1}'\n"
                                  .format(PACKAGE, ex.args[0]))
@@ -266,53 +486,466 @@ class CLI(object):
                         sender.login(smtp.get('user'), smtp.get('password'))
                     sender.send_message(message)
 
+    def open_export(self):
+        """
+        Open the journal export format input
+
+        :return: binary file object
+        """
+        if self.args.export == '-':
+            return sys.stdin.buffer
+
+        return open(self.args.export, 'rb')
+
+    def format(self, jfilter, stream, checkpoints=None, parallel=None):
+        """
+        Format entries, using worker processes or a pipeline of
+        threads if configured
+
+        :param jfilter: JournalFilter instance
+        :param stream: file-like object to write formatted entries to
+        :param checkpoints: LatestJournalEntries instance, or None
+        :param parallel: ParallelFilter instance for jfilter, with its
+                         worker processes started, or None
+        """
+        if self.args.last is not None:
+            jfilter.format_last(stream, self.args.last)
+        elif self.args.jobs is not None and self.args.jobs > 1:
+            if parallel is None:
+                parallel = ParallelFilter(jfilter, self.args.jobs)
+
+            parallel.format(stream, checkpoints=checkpoints)
+        elif self.config.get('pipeline'):
+            Pipeline(jfilter).format(stream, checkpoints=checkpoints)
+        else:
+            jfilter.format(stream, checkpoints=checkpoints)
+
+    def follow(self, entries, jfilter, history):
+        """
+        Respond to 'follow'
+
+        Wait for new entries, delivering each batch of them once the
+        interval or entry count is reached and saving the cursor
+        after it. This only returns by raising an exception, such as
+        KeyboardInterrupt.
+
+        :param entries: LatestJournalEntries instance
+        :param jfilter: JournalFilter instance reading from entries
+        :param history: ExclusionHistory instance
+        """
+        if self.args.jobs is not None and self.args.jobs > 1:
+            # Start the worker processes once, for every batch
+            parallel = ParallelFilter(jfilter, self.args.jobs)
+        else:
+            parallel = None
+
+        with parallel or contextlib.nullcontext():
+            while True:
+                entries.set_budget(max_entries=self.args.entries,
+                                   max_runtime=self.args.interval)
+
+                # Formatters keep state for flush(), so start each
+                # batch with new ones
+                jfilter.formatters = self.get_formatters()
+                if self.config.get('email') is None:
+                    self.format(jfilter, sys.stdout, parallel=parallel)
+                    sys.stdout.flush()
+                else:
+                    output_stream = io.StringIO()
+                    self.format(jfilter, output_stream, parallel=parallel)
+                    output = output_stream.getvalue()
+                    output_stream.close()
+                    self.send_email(output)
+
+                if not self.args.dry_run:
+                    entries.write_cursor()
+                    history.update(jfilter.default_exclusions,
+                                   evaluations=jfilter.evaluations)
+                    history.save()
+                    jfilter.reset_statistics()
+
+    def find_boot(self):
+        """
+        Find the boot chosen with --boot
+
+        :return: UUID or str, boot ID
+        """
+        try:
+            boot = BootIndex().find(self.args.boot)
+        except ValueError as ex:
+            sys.stderr.write("{0}: {1}\n".format(PACKAGE, ex))
+            sys.exit(1)
+
+        log.debug("boot %r: %s to %s", self.args.boot, boot.first, boot.last)
+        return boot.boot_id
+
+    def nothing_new(self):
+        """
+        Check for new entries before setting up to filter them
+
+        Only the last entry in the journal is read to find out.
+
+        :return: bool, whether there are no new entries to process
+        """
+        if (self.args.cmd is not None or self.args.export is not None or
+                self.args.b or self.args.boot is not None or
+                self.args.since is not None or self.args.until is not None or
+                self.args.last is not None):
+            # Not reading on from the bookmark
+            return False
+
+        cursors = []
+        for profile in self.profiles:
+            email = profile.config.get('email')
+            if email is not None and not email['suppress_empty']:
+                # An email is sent even with no entries
+                return False
+
+            cursor = read_cursor_file(profile.cursor_file)
+            if not cursor:
+                return False
+
+            cursors.append(cursor)
+
+        if not journal_unchanged(cursors):
+            return False
+
+        log.debug("no new entries")
+        return True
+
+    def push_down(self, formatters, rules):
+        """
+        Leave entries matching literal exclusions out of the journal
+        matches, where this gives the same results
+
+        :param formatters: list, EntryFormatter instances
+        :param rules: list, Rule instances selecting entries to read
+        :return: list, Rule instances
+        """
+        fields = self.config.get('pushdown-fields')
+        if not fields or self.args.cmd == 'stats':
+            # The statistics need every excluded entry
+            return rules
+
+        if any(formatter.FILTER_INCLUSIONS or formatter.FILTER_EXCLUSIONS
+               for formatter in formatters):
+            log.debug("not pushing down exclusions: some formatters "
+                      "have their own rules")
+            return rules
+
+        exclusions = [Exclusion(excl)
+                      for excl in self.config.get('exclusions', [])]
+        (rules, pushed) = push_down_exclusions(rules, exclusions, fields)
+        log.debug("pushed down %d of %d exclusions", len(pushed),
+                  len(exclusions))
+        return rules
+
+    def prune(self, reader, jfilter):
+        """
+        Prune the default exclusions which can't match any entry
+
+        :param reader: SelectiveReader instance
+        :param jfilter: JournalFilter instance
+        """
+        prune_fields = self.config.get('prune-fields')
+        if not prune_fields:
+            return
+
+        fields = set(field
+                     for exclusion in jfilter.default_exclusions
+                     for field in exclusion
+                     if field in prune_fields)
+        pruned = jfilter.prune(reader.unique_values(sorted(fields)))
+        log.debug("pruned %d of %d exclusions", len(pruned),
+                  len(jfilter.default_exclusions))
+
+    def backlog_footer(self, entries):
+        """
+        Describe any entries left for the next run
+
+        :param entries: LatestJournalEntries instance
+        :return: str, footer text or ''
+        """
+        if self.args.max_entries is None and self.args.max_runtime is None:
+            return ''
+
+        if not entries.stopped_early:
+            return ''
+
+        return BACKLOG_REMAINING_TEXT.format(entries.entries_read)
+
+    def get_filter(self, entries, formatters, default_inclusions, history):
+        """
+        Build the JournalFilter for this configuration
+
+        :param entries: iterator, providing journal entries
+        :param formatters: list, EntryFormatter instances
+        :param default_inclusions: list, dicts of field -> values
+        :param history: ExclusionHistory instance
+        :return: JournalFilter instance
+        """
+        exclusions = self.config.get('exclusions', [])
+        return JournalFilter(entries, formatters,
+                             default_inclusions=default_inclusions,
+                             default_exclusions=exclusions,
+                             engine=self.config.get('filter-engine',
+                                                    'indexed'),
+                             exclusion_hits=history.get_hits())
+
     def run(self):
+        if len(self.profiles) > 1:
+            self.run_profiles()
+            return
+
         if self.handle_options():
             return
 
+        if self.nothing_new():
+            return
+
         setlocale(LC_ALL, '')
         formatters = self.get_formatters()
-
-        if any(formatter.FILTER_INCLUSIONS is None
-               for formatter in formatters):
-            default_inclusions = self.config.get('inclusions')
+        (default_inclusions,
+         inclusions,
+         explicit_inclusions) = configured_inclusions(self.config, formatters)
+        reader_kwargs = {
+            'this_boot': self.args.b,
+            'log_level': self.log_level,
+            'inclusions': inclusions,
+            'explicit_inclusions': explicit_inclusions,
+            'lazy': True,
+            'data_threshold': self.config.get('data-threshold'),
+        }
+        # A past boot, a time range, the last few entries or another
+        # journal's entries are not where the bookmark leads, so it
+        # is left alone, as are the statistics
+        boot_id = None
+        if self.args.boot is not None:
+            boot_id = self.find_boot()
+
+        time_range = (self.args.since is not None or
+                      self.args.until is not None)
+        dry_run = (self.args.dry_run or boot_id is not None or time_range or
+                   self.args.last is not None or
+                   self.args.export is not None)
+
+        if self.args.export is not None:
+            reader = ExportReader(self.open_export(), **reader_kwargs)
+            source = reader
+            checkpoints = None
         else:
-            # None of our formatters need the inclusions from config
-            default_inclusions = None
+            rules = self.push_down(formatters,
+                                   inclusion_rules(self.log_level,
+                                                   inclusions,
+                                                   explicit_inclusions))
+            reader = SelectiveReader(lazy=True,
+                                     data_threshold=self.config.get(
+                                         'data-threshold'))
+            reader.add_rules(rules, this_boot=self.args.b, boot_id=boot_id)
+            if self.args.last is not None:
+                source = ReverseJournalEntries(reader=reader,
+                                               since=self.args.since,
+                                               until=self.args.until)
+                checkpoints = None
+            else:
+                source = LatestJournalEntries(
+                    cursor_file=self.cursor_file,
+                    reader=reader,
+                    dry_run=dry_run,
+                    seek_cursor=not (self.args.b or boot_id or time_range),
+                    checkpoint_entries=self.config.get('checkpoint-entries'),
+                    checkpoint_interval=self.config.get(
+                        'checkpoint-interval'),
+                    max_entries=self.args.max_entries,
+                    max_runtime=self.args.max_runtime,
+                    follow=self.args.cmd == 'follow',
+                    since=self.args.since,
+                    until=self.args.until)
+                checkpoints = source
+
+        history = ExclusionHistory.for_cursor_file(self.cursor_file)
+        with source as entries:
+            jfilter = self.get_filter(entries, formatters,
+                                      default_inclusions, history)
+            reader.set_fields(jfilter.get_fields())
+            if self.args.export is None and self.args.cmd != 'follow':
+                # Values first appearing while following would be
+                # missed
+                self.prune(reader, jfilter)
 
-        if default_inclusions:
-            inclusions = default_inclusions[:]
-        else:
-            inclusions = []
-
-        explicit_inclusions = []
-        for formatter in formatters:
-            if formatter.FILTER_INCLUSIONS is not None:
-                explicit_inclusions.extend(formatter.FILTER_INCLUSIONS)
-
-        reader = SelectiveReader(this_boot=self.args.b,
-                                 log_level=self.log_level,
-                                 inclusions=inclusions,
-                                 explicit_inclusions=explicit_inclusions)
-        with LatestJournalEntries(cursor_file=self.cursor_file,
-                                  reader=reader,
-                                  dry_run=self.args.dry_run,
-                                  seek_cursor=not self.args.b) as entries:
-            exclusions = self.config.get('exclusions', [])
-            jfilter = JournalFilter(entries, formatters,
-                                    default_inclusions=default_inclusions,
-                                    default_exclusions=exclusions)
             if self.args.cmd == 'stats':
                 self.show_stats(jfilter)
+            elif self.args.cmd == 'follow':
+                self.follow(entries, jfilter, history)
             elif self.config.get('email') is None:
-                jfilter.format(sys.stdout)
+                self.format(jfilter, sys.stdout, checkpoints=checkpoints)
+                sys.stdout.write(self.backlog_footer(source))
             else:
+                # Nothing is delivered until the email is sent, so
+                # there are no checkpoints
                 output_stream = io.StringIO()
-                jfilter.format(output_stream)
+                self.format(jfilter, output_stream)
+                output_stream.write(self.backlog_footer(source))
                 output = output_stream.getvalue()
                 output_stream.close()
                 self.send_email(output)
 
+        if not dry_run:
+            history.update(jfilter.default_exclusions,
+                           evaluations=jfilter.evaluations)
+            history.save()
+
+    def run_profiles(self):
+        """
+        Process several profiles in one pass over the journal
+
+        The journal is read once, selecting the entries any profile
+        wants, and each entry is given to the JournalFilter of each
+        profile which wants it. Each profile has its own cursor
+        bookmark file and its own output.
+        """
+        exit_now = self.handle_options()
+        if exit_now and self.args.cmd != 'reset':
+            return
+
+        for profile in self.profiles[1:]:
+            profile.handle_options()
+
+        if exit_now:
+            return
+
+        cursor_files = [profile.cursor_file for profile in self.profiles]
+        if len(set(cursor_files)) < len(cursor_files):
+            sys.stderr.write("{0}: each profile needs its own cursor-file\n"
+                             .format(PACKAGE))
+            sys.exit(1)
+
+        if self.nothing_new():
+            return
+
+        setlocale(LC_ALL, '')
+        profile_formatters = []
+        profile_inclusions = []
+        profile_rules = []
+        for profile in self.profiles:
+            formatters = profile.get_formatters()
+            (default_inclusions,
+             inclusions,
+             explicit_inclusions) = configured_inclusions(profile.config,
+                                                          formatters)
+            profile_formatters.append(formatters)
+            profile_inclusions.append(default_inclusions)
+            profile_rules.append(inclusion_rules(
+                log_level=profile.log_level,
+                inclusions=inclusions,
+                explicit_inclusions=explicit_inclusions))
+
+        if all(profile_rules):
+            rules = [rule for rules in profile_rules for rule in rules]
+        else:
+            # Some profile wants every entry
+            rules = []
+
+        # Each profile only wants the entries it would have read
+        # by itself
+        selections = [self.get_selection(rules) for rules in profile_rules]
+
+        thresholds = [profile.config.get('data-threshold')
+                      for profile in self.profiles]
+        if None in thresholds:
+            data_threshold = None
+        else:
+            data_threshold = max(thresholds)
+
+        reader = SelectiveReader(lazy=True, data_threshold=data_threshold)
+        reader.add_rules(rules, this_boot=self.args.b)
+        histories = [ExclusionHistory.for_cursor_file(cursor_file)
+                     for cursor_file in cursor_files]
+        with MultiCursorEntries(cursor_files, reader=reader,
+                                dry_run=self.args.dry_run,
+                                seek_cursor=not self.args.b) as entries:
+            jfilters = [profile.get_filter(entries, formatters,
+                                           default_inclusions, history)
+                        for (profile, formatters, default_inclusions, history)
+                        in zip(self.profiles, profile_formatters,
+                               profile_inclusions, histories)]
+            fields = set()
+            for jfilter in jfilters:
+                jfilter_fields = jfilter.get_fields()
+                if jfilter_fields is None:
+                    fields = None
+                    break
+
+                fields.update(jfilter_fields)
+
+            if fields is not None:
+                # Each profile's selection is tested against the entry
+                # too
+                for selection in selections:
+                    if selection is not None:
+                        for inclusion in selection:
+                            fields.update(inclusion.keys())
+
+            reader.set_fields(fields)
+            for profile, jfilter in zip(self.profiles, jfilters):
+                profile.prune(reader, jfilter)
+
+            streams = [io.StringIO() for profile in self.profiles]
+            try:
+                for entry in entries:
+                    for index, active in enumerate(entries.active):
+                        if not active:
+                            continue
+
+                        selection = selections[index]
+                        if (selection is not None and
+                                selection.first_match(entry) is None):
+                            continue
+
+                        jfilters[index].format_entry(streams[index], entry)
+            finally:
+                for jfilter, stream in zip(jfilters, streams):
+                    jfilter.flush(stream)
+
+            for profile, stream in zip(self.profiles, streams):
+                output = stream.getvalue()
+                stream.close()
+                if profile.config.get('email') is None:
+                    sys.stdout.write(output)
+                else:
+                    profile.send_email(output)
+
+        if not self.args.dry_run:
+            for jfilter, history in zip(jfilters, histories):
+                history.update(jfilter.default_exclusions,
+                               evaluations=jfilter.evaluations)
+                history.save()
+
+    @staticmethod
+    def get_selection(rules):
+        """
+        Build inclusion rules matching the entries selected by reader rules
+
+        :param rules: list, Rule instances, or empty for all entries
+        :return: RuleSet instance, or None for all entries
+        """
+        if not rules:
+            return None
+
+        inclusions = []
+        for rule in rules:
+            inclusion = dict(rule.inclusion)
+            if rule.log_level is not None:
+                if 'PRIORITY' in inclusion:
+                    # The journal allows either set of priorities
+                    inclusions.append(Inclusion(inclusion))
+
+                inclusion['PRIORITY'] = rule.log_level
+
+            inclusions.append(Inclusion(inclusion))
+
+        return RuleSet(inclusions)
+
 
 def run():
     signal.signal(signal.SIGPIPE, signal.SIG_DFL)
@@ -320,7 +953,7 @@ def run():
         CLI().run()
     except KeyboardInterrupt:
         pass
-    except IOError as ex:
+    except (IOError, ExportFormatError) as ex:
         sys.stderr.write("{0}: {1}\n".format(PACKAGE, ex))
         sys.exit(1)
     except ConfigError:
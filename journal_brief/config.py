@@ -18,6 +18,7 @@ Copyright (c) 2015, 2020 Tim Waugh <tim@cyberelk.net>
 
 import errno
 from journal_brief import list_formatters
+from journal_brief.filter import RuleSet
 from journal_brief.constants import CONFIG_DIR, PACKAGE, PRIORITY_MAP
 from logging import getLogger
 import os
@@ -112,12 +113,19 @@ def load_config(config_file):
 
 class Config(dict):
     ALLOWED_KEYWORDS = {
+        'checkpoint-entries',
+        'checkpoint-interval',
         'cursor-file',
+        'data-threshold',
         'debug',
         'exclusions',
+        'filter-engine',
         'inclusions',
         'output',
+        'pipeline',
         'priority',
+        'prune-fields',
+        'pushdown-fields',
         'email',
     }
 
@@ -147,14 +155,20 @@ class Config(dict):
                        if isinstance(prio, str)]
         valid_prios.sort()
         for errors in [self.validate_allowed_keywords(),
+                       self.validate_checkpoint(),
                        self.validate_cursor_file(),
+                       self.validate_data_threshold(),
                        self.validate_debug(),
+                       self.validate_filter_engine(),
                        self.validate_inclusions_or_exclusions(valid_prios,
                                                               'exclusions'),
                        self.validate_inclusions_or_exclusions(valid_prios,
                                                               'inclusions'),
                        self.validate_output(),
+                       self.validate_pipeline(),
                        self.validate_priority(valid_prios),
+                       self.validate_field_list('prune-fields'),
+                       self.validate_field_list('pushdown-fields'),
                        self.validate_email()]:
             for error in errors:
                 yield error
@@ -164,6 +178,25 @@ class Config(dict):
             yield SemanticError('unexpected keyword', unexpected_key,
                                 {unexpected_key: self[unexpected_key]})
 
+    def validate_checkpoint(self):
+        if 'checkpoint-entries' in self:
+            entries = self['checkpoint-entries']
+            if (not isinstance(entries, int) or
+                    isinstance(entries, bool) or
+                    entries < 1):
+                yield SemanticError('expected positive integer',
+                                    'checkpoint-entries',
+                                    {'checkpoint-entries': entries})
+
+        if 'checkpoint-interval' in self:
+            interval = self['checkpoint-interval']
+            if (not isinstance(interval, (int, float)) or
+                    isinstance(interval, bool) or
+                    interval <= 0):
+                yield SemanticError('expected positive number',
+                                    'checkpoint-interval',
+                                    {'checkpoint-interval': interval})
+
     def validate_cursor_file(self):
         if 'cursor-file' not in self:
             return
@@ -173,6 +206,17 @@ class Config(dict):
             yield SemanticError('expected string', 'cursor-file',
                                 {'cursor-file': self['cursor-file']})
 
+    def validate_data_threshold(self):
+        if 'data-threshold' not in self:
+            return
+
+        threshold = self['data-threshold']
+        if (not isinstance(threshold, int) or
+                isinstance(threshold, bool) or
+                threshold < 1):
+            yield SemanticError('expected positive integer', 'data-threshold',
+                                {'data-threshold': threshold})
+
     def validate_debug(self):
         if 'debug' not in self:
             return
@@ -182,6 +226,34 @@ class Config(dict):
             yield SemanticError('expected bool', 'debug',
                                 {'debug': self['debug']})
 
+    def validate_pipeline(self):
+        if 'pipeline' not in self:
+            return
+
+        if not isinstance(self['pipeline'], bool):
+            yield SemanticError('expected bool', 'pipeline',
+                                {'pipeline': self['pipeline']})
+
+    def validate_field_list(self, key):
+        if key not in self:
+            return
+
+        fields = self[key]
+        if (not isinstance(fields, list) or
+                not all(isinstance(field, str) and field
+                        for field in fields)):
+            yield SemanticError('expected list of field names', key,
+                                {key: fields})
+
+    def validate_filter_engine(self):
+        if 'filter-engine' not in self:
+            return
+
+        if self['filter-engine'] not in RuleSet.ENGINES:
+            yield SemanticError('invalid filter engine, must be in %s' %
+                                list(RuleSet.ENGINES), 'filter-engine',
+                                {'filter-engine': self['filter-engine']})
+
     def validate_email(self):
         ALLOWED_EMAIL_KEYWORDS = {
             'bcc',
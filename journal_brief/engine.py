@@ -0,0 +1,245 @@
+"""
+Copyright (c) 2026 Tim Waugh <tim@cyberelk.net>
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+
+from journal_brief.config import Config
+from journal_brief.constants import PRIORITY_MAP
+from journal_brief.export import ExportReader
+from journal_brief.filter import FilterRuleSets, JournalFilter
+from journal_brief.format import get_formatter
+from journal_brief.journal_brief import (inclusion_rules,
+                                         LatestJournalEntries,
+                                         SelectiveReader)
+import journal_brief.format.config   # registers class; # noqa: F401
+import journal_brief.format.short    # registers class; # noqa: F401
+import journal_brief.format.json     # registers class; # noqa: F401
+import journal_brief.format.reboot   # registers class; # noqa: F401
+import journal_brief.format.login    # registers class; # noqa: F401
+import journal_brief.format.systemd  # registers class; # noqa: F401
+from logging import getLogger
+
+
+log = getLogger(__name__)
+
+DEFAULT_OUTPUT_FORMATS = ('reboot', 'short')
+
+
+def output_formatters(outputs):
+    """
+    Build new formatters for the output formats
+
+    :param outputs: list, output format names
+    :return: list, EntryFormatter instances
+    :raises KeyError: for an unknown output format
+    """
+    return [get_formatter(output) for output in outputs]
+
+
+def configured_log_level(config):
+    """
+    Get the priority level configured
+
+    :param config: Config or InstanceConfig instance
+    :return: int, LOG_* priority level, or None for every priority
+    """
+    priority = config.get('priority')
+    if priority:
+        return int(PRIORITY_MAP[priority])
+
+    return None
+
+
+def configured_inclusions(config, formatters):
+    """
+    Get the inclusion rules selecting entries for the formatters
+
+    :param config: Config or InstanceConfig instance
+    :param formatters: list, EntryFormatter instances
+    :return: tuple, (default inclusions for JournalFilter,
+             inclusions and explicit inclusions for the reader)
+    """
+    if any(formatter.FILTER_INCLUSIONS is None
+           for formatter in formatters):
+        default_inclusions = config.get('inclusions')
+    else:
+        # None of our formatters need the inclusions from config
+        default_inclusions = None
+
+    explicit_inclusions = []
+    for formatter in formatters:
+        if formatter.FILTER_INCLUSIONS is not None:
+            explicit_inclusions.extend(formatter.FILTER_INCLUSIONS)
+
+    return (default_inclusions,
+            list(default_inclusions or []),
+            explicit_inclusions)
+
+
+class BriefEngine(object):
+    """
+    A configuration compiled once, for producing any number of briefs
+
+    The configuration is read and validated, and its filter rules
+    built and indexed, only when the engine is created. Each brief
+    shares these and has only its own formatters, and its own counts
+    of exclusion hits, so briefs for many journals or cursor files
+    can be produced cheaply in one process.
+
+      >>> engine = BriefEngine(Config('journal-brief.conf'))
+      >>> for path in journal_paths:
+      ...     engine.brief(sys.stdout,
+      ...                  reader=engine.reader(path=path),
+      ...                  cursor_file=path + '.cursor')
+
+    The engine is not changed by producing briefs, so it can be
+    shared between threads as long as each brief has its own reader.
+    """
+
+    def __init__(self, config=None, output=None, exclusion_hits=None):
+        """
+        Constructor
+
+        :param config: Config instance, or None to read the default
+                       configuration file
+        :param output: list, output format names, or None for those
+                       configured
+        :param exclusion_hits: dict, Exclusion fingerprint -> hits in
+                               previous runs, to test the most
+                               frequently matching default exclusions
+                               first
+        """
+        if config is None:
+            config = Config()
+
+        self.config = config
+        self.output = tuple(output or
+                            config.get('output', DEFAULT_OUTPUT_FORMATS))
+        formatters = self.get_formatters()
+        self.log_level = configured_log_level(config)
+
+        # For the reader, selecting the entries to filter
+        (default_inclusions,
+         self.inclusions,
+         self.explicit_inclusions) = configured_inclusions(config, formatters)
+        self.rules = tuple(inclusion_rules(self.log_level,
+                                           self.inclusions,
+                                           self.explicit_inclusions))
+
+        # For each JournalFilter, shared by all briefs
+        self.rule_sets = FilterRuleSets(
+            formatters,
+            default_inclusions=default_inclusions,
+            default_exclusions=config.get('exclusions', []),
+            engine=config.get('filter-engine', 'indexed'),
+            exclusion_hits=exclusion_hits)
+        self.fields = self.filter(iter([]), formatters).get_fields()
+
+    def get_formatters(self):
+        """
+        Build new formatters for a brief
+
+        :return: list, EntryFormatter instances
+        """
+        return output_formatters(self.output)
+
+    def reader(self, this_boot=None, **kwargs):
+        """
+        Get a journal reader selecting the entries for a brief
+
+        :param this_boot: bool, process messages from this boot
+        :param kwargs: passed to systemd.journal.Reader, for instance
+                       path or files to read another journal
+        :return: SelectiveReader instance
+        """
+        reader = SelectiveReader(lazy=True,
+                                 fields=self.fields,
+                                 data_threshold=self.config.get(
+                                     'data-threshold'),
+                                 **kwargs)
+        reader.add_rules(list(self.rules), this_boot=this_boot)
+        return reader
+
+    def export_reader(self, stream, this_boot=None, converters=None):
+        """
+        Get a reader selecting the entries for a brief from journal
+        export format data
+
+        :param stream: binary file object to read from
+        :param this_boot: bool, process messages from this boot
+        :param converters: dict, field -> callable, in addition to
+                           systemd.journal.DEFAULT_CONVERTERS
+        :return: ExportReader instance
+        """
+        return ExportReader(stream,
+                            log_level=self.log_level,
+                            this_boot=this_boot,
+                            inclusions=self.inclusions,
+                            explicit_inclusions=self.explicit_inclusions,
+                            lazy=True,
+                            fields=self.fields,
+                            data_threshold=self.config.get('data-threshold'),
+                            converters=converters)
+
+    def filter(self, entries, formatters=None):
+        """
+        Get a JournalFilter using the compiled rules
+
+        :param entries: iterator, providing journal entries
+        :param formatters: list, EntryFormatter instances, or None for
+                           new ones
+        :return: JournalFilter instance
+        """
+        if formatters is None:
+            formatters = self.get_formatters()
+
+        return JournalFilter(entries, formatters, rule_sets=self.rule_sets)
+
+    def brief(self, stream, reader=None, cursor_file=None, dry_run=False):
+        """
+        Write a brief of the journal entries to a stream
+
+        With a cursor file, only entries since the last brief using it
+        are included, and the cursor file is then updated.
+
+        :param stream: file-like object to write the brief to
+        :param reader: SelectiveReader or ExportReader instance from
+                       this engine, or None for the local journal
+        :param cursor_file: str, filename of cursor bookmark file, or
+                            None to include every entry from the reader
+        :param dry_run: bool, whether to leave the cursor file unchanged
+        :return: JournalFilter instance, with statistics for the brief
+        """
+        if reader is None:
+            reader = self.reader()
+
+        if cursor_file is None:
+            jfilter = self.filter(reader)
+            jfilter.format(stream)
+            return jfilter
+
+        source = LatestJournalEntries(cursor_file=cursor_file,
+                                      reader=reader,
+                                      dry_run=dry_run,
+                                      checkpoint_entries=self.config.get(
+                                          'checkpoint-entries'),
+                                      checkpoint_interval=self.config.get(
+                                          'checkpoint-interval'))
+        with source as entries:
+            jfilter = self.filter(entries)
+            jfilter.format(stream, checkpoints=source)
+
+        return jfilter
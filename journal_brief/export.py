@@ -0,0 +1,631 @@
+"""
+Copyright (c) 2026 Tim Waugh <tim@cyberelk.net>
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+
+from collections.abc import Iterator
+from journal_brief.journal_brief import (EntryReader,
+                                         LazyJournalEntry,
+                                         TruncatedValue)
+from logging import getLogger
+import struct
+from systemd import journal
+import uuid
+
+
+log = getLogger(__name__)
+
+# Where the kernel reports the ID of the current boot
+BOOT_ID_PATH = '/proc/sys/kernel/random/boot_id'
+
+
+class ExportFormatError(Exception):
+    pass
+
+
+class ExportReader(EntryReader, Iterator):
+    """
+    Read journal entries in the journal export format
+
+    This is the format written by 'journalctl -o export'. Entries are
+    read from the stream one at a time and returned just as
+    systemd.journal.Reader returns them, and matches are added using
+    the same methods.
+
+    Each field is either a line of the form FIELD=value, or else the
+    field name on a line of its own followed by the size of the value
+    as a 64-bit little-endian integer, the value, and a newline. Each
+    entry ends with an empty line.
+    """
+
+    # Fields of at most this size are always read in full, even when
+    # there is a smaller data threshold
+    MIN_LINE_SIZE = 256
+
+    # Size of reads from the stream
+    READ_SIZE = 1 << 20
+
+    # Most field name sequences to remember
+    MAX_LAYOUTS = 1024
+
+    # Fields always kept
+    ADDRESS_FIELDS = {'__CURSOR',
+                      '__REALTIME_TIMESTAMP',
+                      '__MONOTONIC_TIMESTAMP',
+                      '_BOOT_ID'}
+
+    def __init__(self, stream, log_level=None, this_boot=None,
+                 inclusions=None, explicit_inclusions=None, lazy=False,
+                 fields=None, data_threshold=None, converters=None):
+        """
+        Constructor
+
+        :param stream: binary file object to read from
+        :param log_level: int, LOG_* priority level
+        :param this_boot: bool, process messages from this boot
+        :param inclusions: dict, field -> values, PRIORITY may use value
+                           instead of list
+        :param explicit_inclusions: dict, field -> values, but
+                                    log_level is not applied to any of
+                                    these
+        :param lazy: bool, return LazyJournalEntry instances rather than
+                     dicts, only converting fields when used
+        :param fields: iterable, names of the only fields to read, or
+                       None to read all fields
+        :param data_threshold: int, size in bytes of the largest
+                               FIELD=value data to read in full;
+                               larger values are truncated and
+                               returned as TruncatedValue instances
+        :param converters: dict, field -> callable, in addition to
+                           systemd.journal.DEFAULT_CONVERTERS
+        """
+        super(ExportReader, self).__init__()
+        self.stream = stream
+        self.converters = journal.DEFAULT_CONVERTERS.copy()
+        if converters is not None:
+            self.converters.update(converters)
+
+        # Field names seen so far, as bytes -> str, or None for
+        # fields not wanted
+        self.field_names = {}
+
+        # Sequences of field names seen so far, as tuple of bytes ->
+        # tuple of str or None, as for field_names
+        self.layouts = {}
+
+        # Data read from the stream but not yet parsed, from offset
+        self.buffer = bytearray()
+        self.offset = 0
+
+        # Matches, combined as for sd_journal_add_match(): all of
+        # these disjunctions must match, and a disjunction matches
+        # if one of its terms does. A term maps field names to the
+        # set of allowed values, and matches if each field has one
+        # of them.
+        self.matches = [[{}]]
+
+        # Fields to keep (or None for all), worked out from fields
+        # and matches when reading starts
+        self.wanted = None
+        self.prepared = False
+
+        self.lazy = lazy
+        self.set_fields(fields)
+        self.max_data_size = data_threshold
+        self.add_inclusions(log_level=log_level,
+                            this_boot=this_boot,
+                            inclusions=inclusions,
+                            explicit_inclusions=explicit_inclusions)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __next__(self):
+        entry = self.get_next()
+        if not entry:
+            raise StopIteration
+
+        return entry
+
+    def close(self):
+        self.stream.close()
+
+    def set_fields(self, fields):
+        super(ExportReader, self).set_fields(fields)
+        self.prepared = False
+
+    def add_match(self, *args, **kwargs):
+        """
+        Add a match, as for systemd.journal.Reader
+
+        :param args: str or bytes, FIELD=value
+        :param kwargs: field -> value
+        """
+        matches = list(args)
+        matches.extend('{0}={1}'.format(field, value)
+                       for field, value in kwargs.items())
+        term = self.matches[-1][-1]
+        for match in matches:
+            if isinstance(match, str):
+                match = match.encode()
+
+            field, sep, value = match.partition(b'=')
+            if not sep:
+                raise ValueError("invalid match {0!r}".format(match))
+
+            term.setdefault(field.decode(), set()).add(value)
+
+        self.prepared = False
+
+    def add_disjunction(self):
+        if self.matches[-1][-1]:
+            self.matches[-1].append({})
+
+    def add_conjunction(self):
+        if any(self.matches[-1]):
+            self.matches.append([{}])
+
+    def flush_matches(self):
+        self.matches = [[{}]]
+        self.prepared = False
+
+    def log_level(self, level):
+        if 0 <= level <= 7:
+            for priority in range(level + 1):
+                self.add_match(PRIORITY="%d" % priority)
+        else:
+            raise ValueError("Log level must be 0 <= level <= 7")
+
+    def this_boot(self, bootid=None):
+        if bootid is None:
+            with open(BOOT_ID_PATH, 'rt') as fp:
+                bootid = uuid.UUID(fp.read().strip()).hex
+
+        self.add_match(_BOOT_ID=bootid)
+
+    def prepare(self):
+        """
+        Work out which fields to keep and which matches to test
+        """
+        self.match_terms = []
+        for disjunction in self.matches:
+            terms = [list(term.items()) for term in disjunction if term]
+            if terms:
+                self.match_terms.append(terms)
+
+        if self.fields is None:
+            self.wanted = None
+        else:
+            self.wanted = set(self.fields) | self.ADDRESS_FIELDS
+            for terms in self.match_terms:
+                for term in terms:
+                    self.wanted.update(field for field, values in term)
+
+        self.field_names = {}
+        self.layouts = {}
+        self.prepared = True
+
+    def field_name(self, name):
+        """
+        Decode a field name, if the field is wanted
+
+        :param name: bytes, field name
+        :return: str, field name, or None to ignore this field
+        """
+        field = name.decode()
+        if field.startswith('__') and field not in self.ADDRESS_FIELDS:
+            # Other address fields are not provided by
+            # systemd.journal.Reader
+            return None
+
+        if self.wanted is not None and field not in self.wanted:
+            return None
+
+        return field
+
+    def entry_matches(self, entry):
+        """
+        Test the unconverted fields of an entry against the matches
+
+        :param entry: dict, field -> bytes value (or list of them)
+        :return: bool, whether the entry matches
+        """
+        for terms in self.match_terms:
+            for term in terms:
+                for field, values in term:
+                    value = entry.get(field)
+                    if isinstance(value, list):
+                        if values.isdisjoint(value):
+                            break
+                    elif value not in values:
+                        break
+                else:
+                    # This term matches
+                    break
+            else:
+                # No term matches
+                return False
+
+        return True
+
+    def skip(self, size):
+        """
+        Skip over data in the stream
+
+        :param size: int, number of bytes to skip
+        """
+        read = self.stream.read
+        while size > 0:
+            data = read(min(size, self.READ_SIZE))
+            if not data:
+                raise ExportFormatError("unexpected end of stream")
+
+            size -= len(data)
+
+    def skip_line(self):
+        """
+        Skip the rest of a line
+        """
+        readline = self.stream.readline
+        while True:
+            data = readline(self.READ_SIZE)
+            if not data or data.endswith(b'\n'):
+                return
+
+    def read_entry(self):
+        """
+        Read the fields of the next entry, without converting them
+
+        :return: dict, field -> bytes value (or list of them), or
+                 None at the end of the stream
+        """
+        if self.max_data_size is None:
+            return self.read_buffered_entry()
+
+        # Large fields must be skipped rather than read in full
+        return self.read_entry_lines()
+
+    def fill(self, size=0):
+        """
+        Read more of the stream into the buffer
+
+        :param size: int, number of bytes needed
+        :return: bool, whether any more could be read
+        """
+        data = self.stream.read(max(size, self.READ_SIZE))
+        if not data:
+            return False
+
+        # The buffer grows in place, so that filling it a piece at a
+        # time for a large entry does not copy it each time
+        del self.buffer[:self.offset]
+        self.offset = 0
+        self.buffer += data
+        return True
+
+    def buffered(self, size):
+        """
+        Make sure there is enough data in the buffer
+
+        :param size: int, number of bytes needed after the offset
+        :return: bool, whether there is enough
+        """
+        while len(self.buffer) - self.offset < size:
+            if not self.fill(size - (len(self.buffer) - self.offset)):
+                return False
+
+        return True
+
+    def get_field(self, name):
+        """
+        Look up a field name
+
+        :param name: bytes, field name
+        :return: str, field name, or None to ignore this field
+        """
+        try:
+            return self.field_names[name]
+        except KeyError:
+            field = self.field_names[name] = self.field_name(name)
+            return field
+
+    def read_buffered_entry(self):
+        """
+        Read an entry from the buffer, filling it as needed
+
+        Entries without binary fields are split into fields in one
+        go, and the field names are looked up by the sequence of
+        names rather than one at a time.
+
+        :return: dict, field -> bytes value (or list of them), or
+                 None at the end of the stream
+        """
+        # How far past the offset has been searched for the end of
+        # the entry
+        searched = 0
+        while True:
+            buffer = self.buffer
+            offset = self.offset
+            if not searched:
+                while buffer.startswith(b'\n', offset):
+                    # Empty line between entries
+                    offset += 1
+
+                self.offset = offset
+
+            end = buffer.find(b'\n\n', offset + searched)
+            if end == -1:
+                # Only the last byte may be part of the end of the
+                # entry, so the search resumes there after filling
+                searched = max(len(buffer) - offset - 1, 0)
+                if self.fill():
+                    continue
+
+                if offset >= len(buffer):
+                    return None
+
+                # The last entry need not be followed by an empty line
+                end = len(buffer)
+                if buffer.endswith(b'\n'):
+                    end -= 1
+
+            lines = bytes(buffer[offset:end]).split(b'\n')
+            try:
+                raw = dict([line.split(b'=', 1) for line in lines])
+            except ValueError:
+                # This entry has a binary field
+                return self.read_binary_entry()
+
+            self.offset = end + 2
+            if len(raw) != len(lines):
+                # A field has several values
+                entry = {}
+                for line in lines:
+                    name, value = line.split(b'=', 1)
+                    self.add_value(entry, self.get_field(name), value)
+
+                entry.pop(None, None)
+                return entry
+
+            names = tuple(raw)
+            try:
+                fields = self.layouts[names]
+            except KeyError:
+                if len(self.layouts) >= self.MAX_LAYOUTS:
+                    self.layouts.clear()
+
+                fields = tuple(self.get_field(name) for name in names)
+                self.layouts[names] = fields
+
+            # Fields not wanted all have None as their name
+            entry = dict(zip(fields, raw.values()))
+            entry.pop(None, None)
+            return entry
+
+    def read_binary_entry(self):
+        """
+        Read an entry which may have binary fields from the buffer
+
+        :return: dict, field -> bytes value (or list of them)
+        """
+        entry = {}
+        searched = 0
+        while True:
+            newline = self.buffer.find(b'\n', self.offset + searched)
+            if newline == -1:
+                searched = len(self.buffer) - self.offset
+                if self.fill():
+                    continue
+
+                if self.offset >= len(self.buffer):
+                    break
+
+                newline = len(self.buffer)
+
+            searched = 0
+            line = bytes(self.buffer[self.offset:newline])
+            self.offset = newline + 1
+            if not line:
+                break
+
+            eq = line.find(b'=')
+            if eq != -1:
+                self.add_value(entry, self.get_field(line[:eq]),
+                               line[eq + 1:])
+                continue
+
+            if not self.buffered(8):
+                raise ExportFormatError("unexpected end of stream")
+
+            size = struct.unpack_from('<Q', self.buffer, self.offset)[0]
+            if not self.buffered(8 + size + 1):
+                raise ExportFormatError("unexpected end of stream")
+
+            start = self.offset + 8
+            end = start + size
+            if self.buffer[end:end + 1] != b'\n':
+                raise ExportFormatError("missing newline after "
+                                        "{0}".format(line.decode()))
+
+            self.offset = end + 1
+            self.add_value(entry, self.get_field(line),
+                           bytes(self.buffer[start:end]))
+
+        entry.pop(None, None)
+        return entry
+
+    @staticmethod
+    def add_value(entry, field, value):
+        """
+        Add a field value to an entry, making a list if it is repeated
+        """
+        try:
+            existing = entry[field]
+        except KeyError:
+            entry[field] = value
+        else:
+            if isinstance(existing, list):
+                existing.append(value)
+            else:
+                entry[field] = [existing, value]
+
+    def read_entry_lines(self):  # noqa: C901
+        """
+        Read an entry a line at a time, truncating large fields
+
+        :return: dict, field -> bytes value (or list of them), or
+                 None at the end of the stream
+        """
+        readline = self.stream.readline
+        read = self.stream.read
+        max_data_size = self.max_data_size
+        line_size = max(max_data_size, self.MIN_LINE_SIZE) + 1
+
+        entry = {}
+        while True:
+            line = readline(line_size)
+            if not line:
+                # End of stream
+                return entry or None
+
+            if line == b'\n':
+                if entry:
+                    return entry
+
+                continue
+
+            if line.endswith(b'\n'):
+                complete = True
+                line = line[:-1]
+            else:
+                complete = False
+
+            eq = line.find(b'=')
+            if eq == -1:
+                # Binary field
+                if not complete:
+                    raise ExportFormatError("invalid field name")
+
+                name = line
+                header = read(8)
+                if len(header) != 8:
+                    raise ExportFormatError("unexpected end of stream")
+
+                size = struct.unpack('<Q', header)[0]
+            else:
+                name = line[:eq]
+
+            field = self.get_field(name)
+            if eq == -1:
+                if field is None:
+                    self.skip(size + 1)
+                    continue
+
+                if len(field) + 1 + size >= max_data_size:
+                    keep = max(max_data_size - len(field) - 1, 0)
+                    value = read(keep)
+                    self.skip(size - keep)
+                else:
+                    value = read(size)
+                    if len(value) != size:
+                        raise ExportFormatError("unexpected end of stream")
+
+                if read(1) != b'\n':
+                    raise ExportFormatError("missing newline after "
+                                            "{0}".format(field))
+            else:
+                if not complete:
+                    self.skip_line()
+
+                if field is None:
+                    continue
+
+                value = line[eq + 1:]
+
+            self.add_value(entry, field, self.truncate_value(field, value))
+
+    def get_next(self, skip=1):
+        """
+        Return the next matching entry
+
+        :param skip: int, return the skip-th matching entry
+        :return: dict (or LazyJournalEntry), empty at end of stream
+        """
+        if skip < 1:
+            raise ValueError("can only move forwards in an export stream")
+
+        if not self.prepared:
+            self.prepare()
+
+        while True:
+            entry = self.read_entry()
+            if entry is None:
+                return {}
+
+            if self.match_terms and not self.entry_matches(entry):
+                continue
+
+            skip -= 1
+            if not skip:
+                break
+
+        # Address fields are given as systemd.journal.Reader gives them
+        if '__CURSOR' in entry:
+            entry['__CURSOR'] = entry['__CURSOR'].decode()
+
+        if '__REALTIME_TIMESTAMP' in entry:
+            entry['__REALTIME_TIMESTAMP'] = int(entry['__REALTIME_TIMESTAMP'])
+
+        if '__MONOTONIC_TIMESTAMP' in entry:
+            monotonic = int(entry.pop('__MONOTONIC_TIMESTAMP'))
+            try:
+                boot_id = bytes.fromhex(entry['_BOOT_ID'].decode())
+            except (KeyError, AttributeError, ValueError):
+                log.debug("no boot ID for monotonic timestamp")
+            else:
+                entry['__MONOTONIC_TIMESTAMP'] = (monotonic, boot_id)
+
+        return self._convert_entry(entry)
+
+    def get_previous(self, skip=1):
+        raise ValueError("can only move forwards in an export stream")
+
+    def _convert_field(self, key, value):
+        if isinstance(value, TruncatedValue):
+            return value
+
+        convert = self.converters.get(key, bytes.decode)
+        try:
+            return convert(value)
+        except ValueError:
+            return value
+
+    def _convert_entry(self, entry):
+        if self.lazy:
+            return LazyJournalEntry(entry, self._convert_field)
+
+        result = {}
+        for field, value in entry.items():
+            if isinstance(value, list):
+                result[field] = [self._convert_field(field, item)
+                                 for item in value]
+            else:
+                result[field] = self._convert_field(field, value)
+
+        return result
@@ -16,8 +16,13 @@ Copyright (c) 2015 Tim Waugh <tim@cyberelk.net>
 ## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
 """
 
-from collections import namedtuple
+from bisect import bisect_left
+from collections import Counter, namedtuple
+import copy
+import datetime
+import hashlib
 from journal_brief.constants import PRIORITY_MAP
+import json
 from logging import getLogger
 import re
 from systemd import journal
@@ -34,6 +39,31 @@ ExclusionStatistics = namedtuple('ExclusionStatistics', ['hits', 'exclusion'])
 FilterRules = namedtuple('FilterRules', ['inclusions', 'exclusions'])
 
 
+# Regular expression constructs which would behave differently, or
+# not compile, once the pattern is combined with others in an
+# alternation: backreferences, named groups, conditionals, and global
+# inline flags
+UNMERGEABLE_PATTERN = re.compile(r'\\[1-9]|\\g<|\(\?P|\(\?\(|\(\?[aiLmsux]+\)')
+
+
+def can_merge_pattern(pattern):
+    """
+    Check whether a regular expression can be merged into an alternation
+
+    :param pattern: str, regular expression pattern
+    :return: bool
+    """
+    if UNMERGEABLE_PATTERN.search(pattern):
+        return False
+
+    try:
+        re.compile(pattern)
+    except re.error:
+        return False
+
+    return True
+
+
 def coerce_to_UUID(x):
     if isinstance(x, UUID):
         return x
@@ -87,10 +117,102 @@ class FilterRule(dict):
                          indent=2,
                          default_flow_style=False)
 
+    def regexp_pattern(self, match):
+        """
+        Get the regular expression pattern a match value represents
+
+        :param match: match value for a field
+        :return: str, pattern, or None if it is a literal value
+        """
+        return None
+
+    def fingerprint(self):
+        """
+        Get a stable identifier for the rule's fields and match values
+
+        :return: str, hex digest
+        """
+        canonical = {field: [str(match) for match in matches]
+                     for field, matches in self.items()}
+        as_json = json.dumps(canonical, sort_keys=True)
+        return hashlib.sha1(as_json.encode('utf-8')).hexdigest()
+
+    def copy(self):
+        """
+        Get a new rule of the same class with the same match values
+
+        :return: FilterRule instance
+        """
+        return copy.copy(self)
+
+    def may_match_values(self, field, values):
+        """
+        Check whether the rule could match an entry, given every value
+        one of its fields has
+
+        :param field: str, field name
+        :param values: set, all the values of the field
+        :return: bool, False if the rule can't match any entry
+        """
+        for index, match in enumerate(self[field]):
+            if self.regexp_pattern(match) is None:
+                if match in values:
+                    return True
+            elif any(self.value_matches(field, index, match, value)
+                     for value in values):
+                return True
+
+        return False
+
+    def may_overlap(self, other):
+        """
+        Check whether an entry could match both this rule and another
+
+        This is conservative: False is only returned when no entry can
+        match both, because for some field they have in common the
+        literal values of one cannot match any value of the other.
+
+        :param other: FilterRule instance
+        :return: bool
+        """
+        for field in set(self) & set(other):
+            literals = ([], [])
+            patterns = ([], [])
+            for side, rule in enumerate((self, other)):
+                for match in rule[field]:
+                    pattern = rule.regexp_pattern(match)
+                    if pattern is None:
+                        literals[side].append(match)
+                    else:
+                        patterns[side].append(re.compile(pattern))
+
+            if patterns[0] and patterns[1]:
+                continue
+
+            if any(literal in literals[1] for literal in literals[0]):
+                continue
+
+            if any(regexp.match(literal)
+                   for side in (0, 1)
+                   for regexp in patterns[side]
+                   for literal in literals[1 - side]
+                   if isinstance(literal, str)):
+                continue
+
+            return False
+
+        return True
+
     def value_matches(self, field, index, match, value):
         return match == value
 
-    def matches(self, entry):
+    def fields_match(self, entry):
+        """
+        Check whether every field matches one of its possible values
+
+        :param entry: dict, journal entry
+        :return: bool, whether the entry matches this rule
+        """
         for field, matches in self.items():
             if not any(self.value_matches(field, index, match, entry.get(field))
                        for index, match in enumerate(matches)):
@@ -99,6 +221,9 @@ class FilterRule(dict):
 
         return True
 
+    def matches(self, entry):
+        return self.fields_match(entry)
+
 
 class Inclusion(FilterRule):
     """
@@ -154,12 +279,36 @@ class Exclusion(FilterRule):
             log.debug("%s=%r", field, matches)
 
         self.hits = 0
+        # __REALTIME_TIMESTAMP of last excluded entry, as read
+        self.last_hit_value = None
         self.regexp = {}  # field -> index -> compiled regexp
         self.comment = comment
 
     def __repr__(self):
         return "Exclusion(%s)" % super(Exclusion, self).__repr__()
 
+    @property
+    def last_hit(self):
+        """
+        __REALTIME_TIMESTAMP of the last excluded entry, or None
+        """
+        if isinstance(self.last_hit_value, int):
+            # Not yet converted: microseconds since the epoch
+            return datetime.datetime.fromtimestamp(self.last_hit_value /
+                                                   1000000)
+
+        return self.last_hit_value
+
+    @last_hit.setter
+    def last_hit(self, value):
+        self.last_hit_value = value
+
+    def copy(self):
+        rule = super(Exclusion, self).copy()
+        rule.hits = 0
+        rule.last_hit = None
+        return rule
+
     def __str__(self):
         ret = ''
         if self.comment:
@@ -168,6 +317,15 @@ class Exclusion(FilterRule):
         ret += super(Exclusion, self).__str__()
         return ret
 
+    def regexp_pattern(self, match):
+        try:
+            if match.startswith('/') and match.endswith('/'):
+                return match[1:-1]
+        except AttributeError:
+            pass
+
+        return None
+
     def value_matches(self, field, index, match, value):
         try:
             regexp = self.regexp[field][index]
@@ -175,15 +333,11 @@ class Exclusion(FilterRule):
                 log.debug('using cached regexp for %s[%d]:%s',
                           field, index, match)
         except KeyError:
-            try:
-                if match.startswith('/') and match.endswith('/'):
-                    pattern = match[1:-1]
-                    log.debug('compiling pattern %r', pattern)
-                    regexp = re.compile(pattern)
-                else:
-                    regexp = None
-                    log.debug('%r is not a regex', match)
-            except AttributeError:
+            pattern = self.regexp_pattern(match)
+            if pattern is not None:
+                log.debug('compiling pattern %r', pattern)
+                regexp = re.compile(pattern)
+            else:
                 regexp = None
                 log.debug('%r is not a regex', match)
 
@@ -199,15 +353,590 @@ class Exclusion(FilterRule):
 
         return super(Exclusion, self).value_matches(field, index, match, value)
 
+    def hit(self, entry):
+        """
+        Count an entry excluded by this rule
+
+        :param entry: dict, journal entry
+        """
+        log.debug("excluding entry")
+        self.hits += 1
+
+        # Only the timestamp is kept, before any formatter changes it
+        # and without converting it for a lazy entry
+        raw = getattr(entry, 'raw', entry)
+        self.last_hit_value = raw.get('__REALTIME_TIMESTAMP')
+
     def matches(self, entry):
-        matched = super(Exclusion, self).matches(entry)
+        matched = self.fields_match(entry)
         if matched:
-            log.debug("excluding entry")
-            self.hits += 1
+            self.hit(entry)
 
         return matched
 
 
+class RuleSet(object):
+    """
+    An ordered collection of filter rules, indexed by match value
+
+    Rules are tested in order and the position of the first one to
+    match an entry is reported.
+
+      >>> rules = RuleSet([Exclusion({'MESSAGE': ['one', 'two']}),
+      ...                  Exclusion({'MESSAGE': ['/t/']})])
+      >>> rules.first_match({'MESSAGE': 'three'})
+      1
+
+    Each rule is indexed on one of its fields, if it can be, so that
+    only the rules which can possibly match an entry need to be tested
+    against it. Literal match values go into a hash index from the
+    value to the rules, and the regular expressions for each field are
+    merged into a single alternation whose matching group identifies
+    the first rule it came from. Rules with no suitable field are
+    tested against every entry.
+
+    Alternatively the rules can be compiled into a Python function
+    which tests each of them in turn (the 'compiled' engine), or each
+    rule can test the entry itself (the 'reference' engine).
+
+      >>> rules = RuleSet(rules, engine='compiled')
+      >>> rules.first_match({'MESSAGE': 'three'})
+      1
+
+    Weights can be given to have the rules tested in a different
+    order, heaviest first. The rule reported is still the first in the
+    original order to match, but when a heavy rule matches, only those
+    earlier rules which could also match the same entry and have not
+    yet been tested need to be tested.
+
+    Rules known not to match any entry can be pruned, so that they are
+    never tested but keep their positions.
+
+      >>> rules = rules.prune({'MESSAGE': {'one', 'two'}})
+      >>> rules.pruned
+      frozenset({1})
+    """
+
+    ENGINES = ('indexed', 'compiled', 'reference')
+
+    def __init__(self, rules=None, engine='indexed', weights=None,
+                 pruned=None):
+        """
+        Constructor
+
+        :param rules: iterable, FilterRule instances
+        :param engine: str, how to find matching rules, from ENGINES
+        :param weights: list, number for each rule, higher to test sooner
+        :param pruned: iterable, positions of rules never to test
+        """
+        if engine not in self.ENGINES:
+            raise ValueError("unknown engine %r" % engine)
+
+        self.rules = list(rules or [])
+        self.engine = engine
+        self.pruned = frozenset(pruned or [])
+
+        positions = [position for position in range(len(self.rules))
+                     if position not in self.pruned]
+        if weights:
+            assert len(weights) == len(self.rules)
+            self.order = sorted(positions,
+                                key=lambda position: -weights[position])
+        else:
+            self.order = positions
+
+        self.reordered = self.order != positions
+        self.rank = [None] * len(self.rules)
+        for rank, position in enumerate(self.order):
+            self.rank[position] = rank
+
+        # position -> earlier positions tested later which could
+        # match the same entries
+        self.overlaps = {}
+
+        self.literal_index = {}  # field -> value -> [position, ...]
+
+        # field -> (compiled regexp, group -> position,
+        #           [position, ...])
+        self.regexp_index = {}
+        self.unindexed = []  # positions of rules not indexed
+
+        if engine == 'indexed':
+            self.build_index()
+            self.matcher = self.indexed_first_match
+        elif engine == 'compiled':
+            self.compiled = RuleCompiler(self.rules, self.order).compile()
+            self.matcher = self.compiled_first_match
+        else:
+            self.matcher = self.reference_first_match
+
+    def build_index(self):
+        """
+        Index each rule on one of its fields
+        """
+
+        # Prefer indexing on fields with only literal values, then on
+        # the fields most rules share, so that fewer lookups are
+        # needed for each entry
+        indexable = [self.indexable_fields(rule) for rule in self.rules]
+        field_use = Counter(field
+                            for fields in indexable
+                            for field in fields)
+        alternatives = {}  # field -> [(pattern, position), ...]
+        for position, fields in enumerate(indexable):
+            if position in self.pruned:
+                continue
+
+            if not fields:
+                self.unindexed.append(position)
+                continue
+
+            rule = self.rules[position]
+            field = max(fields, key=lambda field: (fields[field],
+                                                   field_use[field]))
+            for match in rule[field]:
+                pattern = rule.regexp_pattern(match)
+                if pattern is None:
+                    index = self.literal_index.setdefault(field, {})
+                    positions = index.setdefault(match, [])
+                    if not positions or positions[-1] != position:
+                        positions.append(position)
+                else:
+                    alternatives.setdefault(field, []).append((pattern,
+                                                               position))
+
+        for field, patterns in alternatives.items():
+            # Each pattern is wrapped in a group of its own. That is
+            # the last group to close when the pattern matches, so
+            # the match's lastindex identifies the rule.
+            groups = [None]
+            for pattern, position in patterns:
+                groups.append(position)
+                groups.extend([None] * re.compile(pattern).groups)
+
+            regexp = re.compile('|'.join('({0})'.format(pattern)
+                                         for pattern, position in patterns))
+            positions = sorted(set(position
+                                   for pattern, position in patterns))
+            self.regexp_index[field] = (regexp, groups, positions)
+
+        log.debug("indexed %d rules on %r, %d unindexed",
+                  len(self.order) - len(self.unindexed),
+                  list(set(self.literal_index) | set(self.regexp_index)),
+                  len(self.unindexed))
+
+    @staticmethod
+    def indexable_fields(rule):
+        """
+        Find the fields a rule can be indexed on
+
+        A field can be indexed if each of its match values is either
+        a literal value or a regular expression which can be merged
+        with others into a single alternation.
+
+        :param rule: FilterRule instance
+        :return: dict, field -> bool (whether all values are literal)
+        """
+        fields = {}
+        for field, matches in rule.items():
+            patterns = [rule.regexp_pattern(match) for match in matches]
+            if all(pattern is None or can_merge_pattern(pattern)
+                   for pattern in patterns):
+                fields[field] = all(pattern is None for pattern in patterns)
+
+        return fields
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __getitem__(self, position):
+        return self.rules[position]
+
+    def __repr__(self):
+        return "RuleSet(%r)" % self.rules
+
+    def copy(self):
+        """
+        Get a copy sharing this one's index, with copies of the rules
+
+        The copy finds matches in the same way but counts hits in its
+        own rules.
+
+        :return: RuleSet instance
+        """
+        # Not copy.copy(), which would use __reduce__() and so build
+        # the index again
+        rule_set = RuleSet.__new__(RuleSet)
+        rule_set.__dict__.update(self.__dict__)
+        rule_set.rules = [rule.copy() for rule in self.rules]
+        rule_set.matcher = getattr(rule_set, self.matcher.__name__)
+        return rule_set
+
+    def __reduce__(self):
+        # The indexes and compiled code are built again when unpickled
+        weights = [0 if rank is None else -rank for rank in self.rank]
+        return (RuleSet, (self.rules, self.engine, weights, self.pruned))
+
+    def prune(self, unique_values):
+        """
+        Get a rule set which won't test rules that can't match
+
+        A rule can't match if one of its fields can't match any of the
+        values that field has.
+
+        :param unique_values: dict, field -> set of all values it has
+        :return: RuleSet instance, sharing these rules
+        """
+        pruned = set(self.pruned)
+        for position, rule in enumerate(self.rules):
+            if any(not rule.may_match_values(field, values)
+                   for field, values in unique_values.items()
+                   if field in rule):
+                pruned.add(position)
+
+        if pruned == self.pruned:
+            return self
+
+        weights = [0 if rank is None else -rank for rank in self.rank]
+        return RuleSet(self.rules, engine=self.engine, weights=weights,
+                       pruned=pruned)
+
+    def candidates(self, entry):
+        """
+        Find the rules which might match an entry
+
+        :param entry: dict, journal entry
+        :return: set, positions of rules to test
+        """
+        positions = set(self.unindexed)
+        for field, index in self.literal_index.items():
+            try:
+                found = index.get(entry.get(field))
+            except TypeError:
+                # Unhashable, e.g. a list for a field with several
+                # values, so cannot be equal to any literal value
+                continue
+
+            if found:
+                positions.update(found)
+
+        for field, (regexp, groups, indexed) in self.regexp_index.items():
+            value = entry.get(field)
+            if not isinstance(value, str):
+                # Can't regexp match against a non-string value
+                continue
+
+            match = regexp.match(value)
+            if match is None:
+                continue
+
+            # The first rule whose pattern matches is known, but if it
+            # has other fields which don't match then later rules
+            # with matching patterns might be the ones to match
+            position = groups[match.lastindex]
+            if len(self.rules[position]) > 1:
+                positions.update(indexed[bisect_left(indexed, position):])
+            else:
+                positions.add(position)
+
+        return positions
+
+    def first_match(self, entry):
+        """
+        Find the first rule matching an entry
+
+        :param entry: dict, journal entry
+        :return: int, position of the matching rule, or None
+        """
+        return self.matcher(entry)
+
+    def earlier_overlaps(self, position):
+        """
+        Find the rules which must be tested after one has matched
+
+        :param position: int, position of the matching rule
+        :return: list, positions of earlier rules tested later which
+                 could also match, in order
+        """
+        try:
+            return self.overlaps[position]
+        except KeyError:
+            rule = self.rules[position]
+            rank = self.rank[position]
+            overlaps = [earlier for earlier in range(position)
+                        if earlier not in self.pruned and
+                        self.rank[earlier] > rank and
+                        self.rules[earlier].may_overlap(rule)]
+            self.overlaps[position] = overlaps
+            return overlaps
+
+    def earliest_match(self, entry, position, candidates=None):
+        """
+        Find the first rule in the original order matching an entry
+
+        :param entry: dict, journal entry
+        :param position: int, position of a matching rule
+        :param candidates: set, positions of rules which might match
+        :return: int, position of the first matching rule
+        """
+        if candidates is None:
+            earlier = self.earlier_overlaps(position)
+        else:
+            rank = self.rank[position]
+            earlier = sorted(candidate for candidate in candidates
+                             if candidate < position and
+                             self.rank[candidate] > rank)
+
+        for candidate in earlier:
+            if self.rules[candidate].fields_match(entry):
+                return candidate
+
+        return position
+
+    def indexed_first_match(self, entry):
+        candidates = self.candidates(entry)
+        if not self.reordered:
+            for position in sorted(candidates):
+                if self.rules[position].fields_match(entry):
+                    return position
+
+            return None
+
+        for position in sorted(candidates, key=self.rank.__getitem__):
+            if self.rules[position].fields_match(entry):
+                return self.earliest_match(entry, position, candidates)
+
+        return None
+
+    def compiled_first_match(self, entry):
+        position = self.compiled(entry)
+        if position is not None and self.reordered:
+            return self.earliest_match(entry, position)
+
+        return position
+
+    def reference_first_match(self, entry):
+        for position in self.order:
+            if self.rules[position].fields_match(entry):
+                if self.reordered:
+                    return self.earliest_match(entry, position)
+
+                return position
+
+        return None
+
+
+class RuleCompiler(object):
+    """
+    Generate a Python function to find the first rule matching an entry
+
+    The function tests each rule in turn using inline comparisons
+    against constants and prebound regexp match methods, rather than
+    interpreting the rules. Each field is fetched from the entry once,
+    just before the first rule needing it.
+    """
+
+    def __init__(self, rules, order=None):
+        """
+        Constructor
+
+        :param rules: list, FilterRule instances
+        :param order: list, positions of rules in the order to test them
+        """
+        self.rules = rules
+        if order is None:
+            order = range(len(rules))
+
+        self.order = order
+        self.namespace = {}  # name -> constant or regexp match method
+        self.fields = {}  # field -> variable name
+        self.strings = set()  # fields with a string-only variable
+
+    def constant(self, prefix, value):
+        name = '{0}{1}'.format(prefix, len(self.namespace))
+        self.namespace[name] = value
+        return name
+
+    def fetch(self, field, lines):
+        """
+        Get the variable name for a field, fetching it if necessary
+
+        :param field: str, field name
+        :param lines: list, source lines to add the fetch to
+        :return: str, variable name
+        """
+        try:
+            return self.fields[field]
+        except KeyError:
+            var = 'v{0}'.format(len(self.fields))
+            self.fields[field] = var
+            lines.append('    {0} = get({1!r})'.format(var, field))
+            return var
+
+    def fetch_string(self, field, lines):
+        """
+        Get the variable name for a field if it is a string, else None
+
+        Regular expressions can't match against non-string values.
+        """
+        var = self.fetch(field, lines)
+        if field not in self.strings:
+            self.strings.add(field)
+            lines.append('    s{0} = {0} if isinstance({0}, str) '
+                         'else None'.format(var))
+
+        return 's' + var
+
+    def field_condition(self, rule, field, lines):
+        """
+        Build the expression for one field of a rule matching
+        """
+        literals = []
+        terms = []
+        for match in rule[field]:
+            pattern = rule.regexp_pattern(match)
+            if pattern is None:
+                literals.append(match)
+                continue
+
+            var = self.fetch_string(field, lines)
+            regexp = self.constant('m', re.compile(pattern).match)
+            terms.append('({0} is not None and {1}({0}) is not None)'
+                         .format(var, regexp))
+
+        if literals:
+            var = self.fetch(field, lines)
+            if len(literals) == 1:
+                const = self.constant('c', literals[0])
+                terms.insert(0, '{0} == {1}'.format(const, var))
+            else:
+                const = self.constant('c', tuple(literals))
+                terms.insert(0, '{0} in {1}'.format(var, const))
+
+        if not terms:
+            return 'False'
+
+        return '({0})'.format(' or '.join(terms))
+
+    def source(self):
+        """
+        Generate the function's source code
+
+        :return: str, Python source
+        """
+        lines = ['def first_match(entry):',
+                 '    get = entry.get']
+        for position in self.order:
+            rule = self.rules[position]
+            conditions = [self.field_condition(rule, field, lines)
+                          for field in rule]
+            lines.append('    if {0}:'.format(' and '.join(conditions) or
+                                              'True'))
+            lines.append('        return {0}'.format(position))
+
+        lines.append('    return None')
+        return '\n'.join(lines) + '\n'
+
+    def compile(self):
+        """
+        Compile the generated function
+
+        :return: function, taking an entry and returning the position
+                 of the first matching rule, or None
+        """
+        source = self.source()
+        log.debug("compiled rules:\n%s", source)
+        code = compile(source, '<rules>', 'exec')
+        exec(code, self.namespace)
+        return self.namespace['first_match']
+
+
+class FilterRuleSets(object):
+    """
+    The filter rules for a list of formatters, built once
+
+    Building and indexing the rules is the costly part of setting up
+    a JournalFilter. The same rule sets can be shared by any number of
+    JournalFilter instances, each counting exclusion hits in its own
+    copy.
+    """
+
+    def __init__(self,
+                 formatters,
+                 default_inclusions=None,
+                 default_exclusions=None,
+                 engine='indexed',
+                 exclusion_hits=None):
+        """
+        Constructor
+
+        :param formatters: list, EntryFormatter instances
+        :param default_inclusions: list, dicts of field -> values for inclusion
+        :param default_exclusions: list, dicts of field -> values for exclusion
+        :param engine: str, how to find matching rules, from RuleSet.ENGINES
+        :param exclusion_hits: dict, Exclusion fingerprint -> hits in
+                               previous runs, to test the most
+                               frequently matching default exclusions
+                               first
+        """
+        self.filter_rules = {}
+        default_inclusions = RuleSet((Inclusion(incl)
+                                      for incl in default_inclusions or []),
+                                     engine=engine)
+        default_exclusions = [Exclusion(excl)
+                              for excl in default_exclusions or []]
+        if exclusion_hits:
+            weights = [exclusion_hits.get(excl.fingerprint(), 0)
+                       for excl in default_exclusions]
+        else:
+            weights = None
+
+        self.default_exclusions = RuleSet(default_exclusions,
+                                          engine=engine,
+                                          weights=weights)
+
+        for formatter in formatters:
+            name = formatter.FORMAT_NAME
+            if formatter.FILTER_INCLUSIONS or formatter.FILTER_EXCLUSIONS:
+                inclusions = RuleSet((Inclusion(incl)
+                                      for incl in formatter.FILTER_INCLUSIONS or []),
+                                     engine=engine)
+                exclusions = RuleSet((Exclusion(excl)
+                                      for excl in formatter.FILTER_EXCLUSIONS or []),
+                                     engine=engine)
+            else:
+                inclusions = default_inclusions
+                exclusions = self.default_exclusions
+
+            rules = FilterRules(inclusions=inclusions,
+                                exclusions=exclusions)
+            self.filter_rules[name] = rules
+
+    def copy(self):
+        """
+        Get rule sets sharing these indexes, with no hits counted
+
+        :return: FilterRuleSets instance
+        """
+        rule_sets = copy.copy(self)
+        rule_sets.default_exclusions = self.default_exclusions.copy()
+        rule_sets.filter_rules = {}
+        for name, rules in self.filter_rules.items():
+            if rules.exclusions is self.default_exclusions:
+                exclusions = rule_sets.default_exclusions
+            else:
+                exclusions = rules.exclusions.copy()
+
+            rule_sets.filter_rules[name] = FilterRules(
+                inclusions=rules.inclusions,
+                exclusions=exclusions)
+
+        return rule_sets
+
+
 class JournalFilter(object):
     """
     Apply filter rules to journal entries for a list of formatters
@@ -229,7 +958,10 @@ class JournalFilter(object):
                  iterator,
                  formatters,
                  default_inclusions=None,
-                 default_exclusions=None):
+                 default_exclusions=None,
+                 engine='indexed',
+                 exclusion_hits=None,
+                 rule_sets=None):
         """
         Constructor
 
@@ -237,65 +969,220 @@ class JournalFilter(object):
         :param formatters: list, EntryFormatter instances
         :param default_inclusions: list, dicts of field -> values for inclusion
         :param default_exclusions: list, dicts of field -> values for exclusion
+        :param engine: str, how to find matching rules, from RuleSet.ENGINES
+        :param exclusion_hits: dict, Exclusion fingerprint -> hits in
+                               previous runs, to test the most
+                               frequently matching default exclusions
+                               first
+        :param rule_sets: FilterRuleSets instance, already built for
+                          these formatters, to use instead of the
+                          other rule parameters
         """
         super(JournalFilter, self).__init__()
         self.iterator = iterator
         self.formatters = formatters
-        self.filter_rules = {}
 
-        default_inclusions = [Inclusion(incl)
-                              for incl in default_inclusions or []]
-        self.default_exclusions = [Exclusion(excl)
-                                   for excl in default_exclusions or []]
+        # Number of entries tested against the default exclusions
+        self.evaluations = 0
 
-        # Initialise filters
-        for formatter in formatters:
-            name = formatter.FORMAT_NAME
-            if formatter.FILTER_INCLUSIONS or formatter.FILTER_EXCLUSIONS:
-                inclusions = [Inclusion(incl)
-                              for incl in formatter.FILTER_INCLUSIONS or []]
-                exclusions = [Exclusion(excl)
-                              for excl in formatter.FILTER_EXCLUSIONS or []]
-            else:
-                inclusions = default_inclusions
-                exclusions = self.default_exclusions
+        if rule_sets is None:
+            rule_sets = FilterRuleSets(formatters,
+                                       default_inclusions=default_inclusions,
+                                       default_exclusions=default_exclusions,
+                                       engine=engine,
+                                       exclusion_hits=exclusion_hits)
+        else:
+            rule_sets = rule_sets.copy()
 
-            rules = FilterRules(inclusions=inclusions,
-                                exclusions=exclusions)
-            self.filter_rules[name] = rules
+        self.default_exclusions = rule_sets.default_exclusions
+        self.filter_rules = rule_sets.filter_rules
+
+    def get_fields(self):
+        """
+        Get the journal fields needed to filter and format entries
+
+        :return: set, field names, or None if all fields are needed
+        """
+        fields = set()
+        for formatter in self.formatters:
+            if formatter.FIELDS is None:
+                return None
+
+            fields.update(formatter.FIELDS)
+
+        rule_sets = [self.default_exclusions]
+        for rules in self.filter_rules.values():
+            rule_sets.extend([rules.inclusions, rules.exclusions])
+
+        for rule_set in rule_sets:
+            for rule in rule_set:
+                fields.update(rule.keys())
+
+        return fields
+
+    def prune(self, unique_values):
+        """
+        Stop testing the default exclusions which can't match any entry
+
+        Pruned exclusions are still reported, with no hits.
+
+        :param unique_values: dict, field -> set of every value it has
+        :return: list, Exclusion instances pruned
+        """
+        default_exclusions = self.default_exclusions.prune(unique_values)
+        for name, rules in self.filter_rules.items():
+            if rules.exclusions is self.default_exclusions:
+                self.filter_rules[name] = FilterRules(
+                    inclusions=rules.inclusions,
+                    exclusions=default_exclusions)
+
+        self.default_exclusions = default_exclusions
+        return [default_exclusions[position]
+                for position in sorted(default_exclusions.pruned)]
+
+    def format(self, stream, checkpoints=None):
+        """
+        Format the entries from the iterator, writing them to a stream
+
+        :param stream: file-like object to write formatted entries to
+        :param checkpoints: LatestJournalEntries instance, to save its
+        cursor from time to time once the output so far is flushed
+        """
+        if (checkpoints is not None and
+                not all(formatter.STREAMING
+                        for formatter in self.formatters)):
+            # Some output is only written by flush(), so progress
+            # can only be saved at the end
+            log.debug("not checkpointing: output is not streamed")
+            checkpoints = None
 
-    def format(self, stream):
         try:
             for entry in self.iterator:
-                default_excl = None
-                for formatter in self.formatters:
-                    rules = self.filter_rules[formatter.FORMAT_NAME]
-                    inclusions = rules.inclusions
-                    if inclusions and not any(inclusion.matches(entry)
-                                              for inclusion in inclusions):
-                        # Doesn't match an inclusion rule
-                        continue
-
-                    if default_excl is None:
-                        # Only match against the default exclusions
-                        # once per message, for efficiency and for
-                        # better statistics gathering
-                        default_excl = any(excl.matches(entry)
-                                           for excl in self.default_exclusions)
-
-                    exclusions = rules.exclusions
-                    if exclusions is self.default_exclusions and default_excl:
-                        # No special rules, matches a default exclusion rule
-                        continue
-
-                    if any(excl.matches(entry) for excl in exclusions):
-                        # Matches one of the formatter's exclusion rules
-                        continue
+                self.format_entry(stream, entry)
+                if checkpoints is not None and checkpoints.checkpoint_due():
+                    # The output for every entry so far has been
+                    # written
+                    stream.flush()
+                    checkpoints.checkpoint()
+        finally:
+            self.flush(stream)
+
+    def flush(self, stream):
+        """
+        Write any closing output from the formatters
+
+        :param stream: file-like object to write to
+        """
+        for formatter in self.formatters:
+            stream.write(formatter.flush() or '')
+
+    def format_last(self, stream, count):
+        """
+        Format the last entries the rules allow, oldest first
+
+        The iterator must provide entries newest first, and is only
+        read until count entries allowed by some formatter are found.
 
+        :param stream: file-like object to write formatted entries to
+        :param count: int, number of entries to write
+        """
+        found = []
+        try:
+            for entry in self.iterator:
+                formatters = self.accepting_formatters(entry)
+                if formatters:
+                    found.append((entry, formatters))
+                    if len(found) >= count:
+                        break
+
+            for entry, formatters in reversed(found):
+                for formatter in formatters:
                     stream.write(formatter.format(entry) or '')
         finally:
-            for formatter in self.formatters:
-                stream.write(formatter.flush() or '')
+            self.flush(stream)
+
+    def format_entry(self, stream, entry, first_default_exclusion=None):
+        """
+        Write a single entry to the stream using each formatter whose
+        rules allow it
+
+        :param stream: file-like object to write formatted entry to
+        :param entry: dict, journal entry
+        :param first_default_exclusion: function returning the
+            position of the first default exclusion matching the
+            entry, or None, when this is found some other way
+        """
+        for formatter in self.accepting_formatters(
+                entry, first_default_exclusion=first_default_exclusion):
+            stream.write(formatter.format(entry) or '')
+
+    def accepting_formatters(self, entry, first_default_exclusion=None):
+        """
+        Find the formatters whose rules allow an entry
+
+        :param entry: dict, journal entry
+        :param first_default_exclusion: as for format_entry()
+        :return: list, EntryFormatter instances
+        """
+        accepting = []
+        default_excl = None
+        for formatter in self.formatters:
+            rules = self.filter_rules[formatter.FORMAT_NAME]
+            inclusions = rules.inclusions
+            if (inclusions and
+                    inclusions.first_match(entry) is None):
+                # Doesn't match an inclusion rule
+                continue
+
+            if default_excl is None:
+                # Only match against the default exclusions once per
+                # message, for efficiency and for better statistics
+                # gathering
+                default_excl = self.excluded(self.default_exclusions,
+                                             entry,
+                                             first_match=first_default_exclusion)
+                self.evaluations += 1
+
+            exclusions = rules.exclusions
+            if exclusions is self.default_exclusions:
+                if default_excl:
+                    # No special rules, matches a default exclusion
+                    # rule
+                    continue
+            elif self.excluded(exclusions, entry):
+                # Matches one of the formatter's exclusion rules
+                continue
+
+            accepting.append(formatter)
+
+        return accepting
+
+    @staticmethod
+    def excluded(exclusions, entry, first_match=None):
+        """
+        Check an entry against exclusion rules, counting the hit
+
+        :param exclusions: RuleSet, Exclusion instances
+        :param entry: dict, journal entry
+        :param first_match: function to use instead of
+                            exclusions.first_match()
+        :return: bool, whether the entry is excluded
+        """
+        position = (first_match or exclusions.first_match)(entry)
+        if position is None:
+            return False
+
+        exclusions[position].hit(entry)
+        return True
+
+    def reset_statistics(self):
+        """
+        Start counting exclusion hits and evaluations again
+        """
+        self.evaluations = 0
+        for exclusion in self.default_exclusions:
+            exclusion.hits = 0
+            exclusion.last_hit = None
 
     def get_statistics(self):
         """
@@ -308,3 +1195,78 @@ class JournalFilter(object):
                  for excl in self.default_exclusions]
         stats.sort(reverse=True, key=lambda stat: stat.hits)
         return stats
+
+
+def push_down_exclusions(rules, exclusions, fields):
+    """
+    Leave the values some exclusions match out of the journal matches
+
+    The journal can't match entries whose field doesn't have some
+    value, but where a rule selecting entries to read lists the
+    values a field may have, the values a literal exclusion of that
+    field matches can be dropped from the list. Those entries are then
+    never read.
+
+    This only applies to exclusions with one field and no regular
+    expressions, and fields with one value in each entry.
+
+    :param rules: list, Rule instances selecting the entries to read
+    :param exclusions: iterable, Exclusion instances applying to every
+                       entry read
+    :param fields: iterable, names of fields to push exclusions down for
+    :return: tuple, (list of Rule instances, list of Exclusion
+             instances pushed down into at least one rule)
+    """
+    excluded = {}  # field -> {value: [Exclusion, ...]}
+    for exclusion in exclusions:
+        if len(exclusion) != 1:
+            continue
+
+        field = next(iter(exclusion))
+        matches = exclusion[field]
+        if (field not in fields or field == 'PRIORITY' or
+                any(exclusion.regexp_pattern(match) is not None
+                    for match in matches)):
+            continue
+
+        for match in matches:
+            excluded.setdefault(field, {}).setdefault(match, []).append(
+                exclusion)
+
+    pushed = []
+    new_rules = []
+    for rule in rules:
+        inclusion = dict(rule.inclusion)
+        matches_nothing = False
+        for field, values in excluded.items():
+            matches = inclusion.get(field)
+            if not matches or not isinstance(matches, list):
+                continue
+
+            # Compare the values as the exclusion does
+            converted = Inclusion({field: matches})[field]
+            remaining = []
+            for match, value in zip(matches, converted):
+                if value in values:
+                    for exclusion in values[value]:
+                        if not any(exclusion is other for other in pushed):
+                            pushed.append(exclusion)
+                else:
+                    remaining.append(match)
+
+            inclusion[field] = remaining
+            if not remaining:
+                matches_nothing = True
+
+        if not matches_nothing:
+            new_rules.append(rule._replace(inclusion=inclusion))
+
+    if rules and not new_rules:
+        # Every entry would be excluded, but no rules would mean
+        # reading every entry
+        return (rules, [])
+
+    for exclusion in pushed:
+        log.debug("pushed down exclusion %r", dict(exclusion))
+
+    return (new_rules, pushed)
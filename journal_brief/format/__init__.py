@@ -16,12 +16,16 @@ Copyright (c) 2015 Tim Waugh <tim@cyberelk.net>
 ## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
 """
 
+from journal_brief.journal_brief import TruncatedValue
 import logging
 
 
 log = logging.getLogger(__name__)
 FORMATTERS = {}
 
+# Appended to field values which were too large to be read in full
+TRUNCATED_MARKER = ' [...]'
+
 
 def list_formatters():
     return list(FORMATTERS.keys())
@@ -34,12 +38,33 @@ def get_formatter(name, *args, **kwargs):
     return FORMATTERS[name](*args, **kwargs)
 
 
+def mark_truncated(value):
+    """
+    Show when a field value has been truncated
+
+    :param value: field value
+    :return: value, with TRUNCATED_MARKER appended if it was truncated
+    """
+    if isinstance(value, TruncatedValue):
+        return value + TRUNCATED_MARKER
+
+    return value
+
+
 class RegisteredFormatter(type):
     """
     Metaclass for EntryFormatter, registering for use with get_formatter()
     """
     def __new__(meta, name, bases, class_dict):
         cls = type.__new__(meta, name, bases, class_dict)
+        if 'FIELDS' not in class_dict:
+            # Fields used by a base class are not enough
+            cls.FIELDS = None
+
+        if 'STREAMING' not in class_dict:
+            # Output may be kept back for flush()
+            cls.STREAMING = False
+
         FORMATTERS[class_dict['FORMAT_NAME']] = cls
         return cls
 
@@ -69,6 +94,21 @@ class EntryFormatter(object, metaclass=RegisteredFormatter):
     # The PRIORITY field is allowed to be a single value rather than a
     # list, just like in the config file.
 
+    # The journal fields used by format(), or None if it needs all of
+    # them. Only these fields (and those used by the filter rules)
+    # are read from the journal. The __CURSOR, __REALTIME_TIMESTAMP
+    # and __MONOTONIC_TIMESTAMP fields are always available. This is
+    # None for a formatter which does not set it, even if it is
+    # derived from one which does.
+    FIELDS = ['MESSAGE']
+
+    # Whether format() returns all the output for each entry, rather
+    # than keeping some back for flush(). Progress through the journal
+    # is only saved part-way through a run if every formatter in use
+    # streams its output. This is False for a formatter which does
+    # not set it, even if it is derived from one which does.
+    STREAMING = True
+
     def format(self, entry):
         """
         Format a single journal entry.
@@ -76,7 +116,7 @@ class EntryFormatter(object, metaclass=RegisteredFormatter):
         :param entry: dict, entry to format
         :return: str, formatted entry including any newline required
         """
-        return entry['MESSAGE'] + '\n'
+        return mark_truncated(entry['MESSAGE']) + '\n'
 
     def flush(self):
         """
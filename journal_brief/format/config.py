@@ -131,6 +131,8 @@ class Debriefer(EntryFormatter):
     """
 
     FORMAT_NAME = 'config'
+    FIELDS = None
+    STREAMING = False
 
     # One of these must be included in each rule
     DEFINITIVE_FIELDS = {
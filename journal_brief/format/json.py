@@ -33,6 +33,8 @@ class JSONEntryFormatter(EntryFormatter):
     """
 
     FORMAT_NAME = 'json'
+    FIELDS = None
+    STREAMING = True
     JSON_DUMPS_KWARGS = {}
 
     def format(self, entry):
@@ -69,4 +71,5 @@ class JSONPrettyEntryFormatter(JSONEntryFormatter):
     """
 
     FORMAT_NAME = 'json-pretty'
+    STREAMING = True
     JSON_DUMPS_KWARGS = {'indent': 8}
@@ -27,6 +27,8 @@ class LoginFormatter(EntryFormatter):
     """
 
     FORMAT_NAME = "login"
+    FIELDS = ['USER_ID']
+    STREAMING = False
     FILTER_INCLUSIONS = [
         {
             # New session
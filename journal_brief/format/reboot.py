@@ -31,6 +31,8 @@ class RebootFormatter(EntryFormatter):
     """
 
     FORMAT_NAME = 'reboot'
+    FIELDS = ['_BOOT_ID']
+    STREAMING = True
 
     def __init__(self, *args, **kwargs):
         super(RebootFormatter, self).__init__(*args, **kwargs)
@@ -16,7 +16,7 @@ Copyright (c) 2015 Tim Waugh <tim@cyberelk.net>
 ## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
 """
 
-from journal_brief.format import EntryFormatter
+from journal_brief.format import EntryFormatter, mark_truncated
 import logging
 
 
@@ -31,6 +31,9 @@ class ShortEntryFormatter(EntryFormatter):
     FORMAT_NAME = 'short'
     FORMAT = '{__REALTIME_TIMESTAMP} {_HOSTNAME} {SYSLOG_IDENTIFIER}: {MESSAGE}\n'
     TIMESTAMP_FORMAT = '%b %d %T'
+    FIELDS = ['__REALTIME_TIMESTAMP', '_HOSTNAME', 'SYSLOG_IDENTIFIER',
+              'MESSAGE', '_COMM', '_PID', 'SYSLOG_PID']
+    STREAMING = True
 
     def format_timestamp(self, entry, field):
         """
@@ -53,6 +56,9 @@ class ShortEntryFormatter(EntryFormatter):
 
         self.format_timestamp(entry, '__REALTIME_TIMESTAMP')
 
+        if 'MESSAGE' in entry:
+            entry['MESSAGE'] = mark_truncated(entry['MESSAGE'])
+
         if '_HOSTNAME' not in entry:
             entry['_HOSTNAME'] = 'localhost'
 
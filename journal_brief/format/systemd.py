@@ -27,6 +27,8 @@ class SystemdFormatter(EntryFormatter):
     """
 
     FORMAT_NAME = "systemd"
+    FIELDS = ['MESSAGE', 'UNIT']
+    STREAMING = False
     FILTER_INCLUSIONS = [
         {
             # New session
@@ -0,0 +1,176 @@
+"""
+Copyright (c) 2026 Tim Waugh <tim@cyberelk.net>
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+
+from collections import namedtuple
+import datetime
+import errno
+import json
+from logging import getLogger
+import os
+import time
+
+
+log = getLogger(__name__)
+
+# Statistics about an exclusion filter rule over all previous runs
+HistoricalStatistics = namedtuple('HistoricalStatistics',
+                                  ['hits', 'evaluations', 'last_hit',
+                                   'exclusion'])
+
+
+class ExclusionHistory(object):
+    """
+    Exclusion rule statistics accumulated over previous runs
+
+    For each exclusion rule this records how many entries it excluded,
+    when it last excluded one, and how many entries were tested
+    against the exclusions while it was in use.
+
+    These are stored as JSON next to the cursor bookmark file, keyed
+    by the fingerprint of each exclusion rule so that they follow the
+    rule if the exclusions are reordered.
+    """
+
+    VERSION = 1
+    SUFFIX = '.history'
+
+    def __init__(self, path):
+        """
+        Constructor
+
+        :param path: str, filename of history file
+        """
+        self.path = path
+        # fingerprint -> {'hits': int,
+        #                 'evaluations': int,
+        #                 'last_hit': float, seconds since the epoch}
+        self.exclusions = {}
+        try:
+            with open(self.path, "rt") as fp:
+                history = json.load(fp)
+        except IOError as ex:
+            if ex.errno != errno.ENOENT:
+                raise
+        except ValueError:
+            log.warning("ignoring invalid history file %r", self.path)
+        else:
+            if (isinstance(history, dict) and
+                    history.get('version') == self.VERSION and
+                    isinstance(history.get('exclusions'), dict)):
+                self.exclusions = {
+                    fingerprint: record
+                    for fingerprint, record in history['exclusions'].items()
+                    if isinstance(record, dict)
+                }
+            else:
+                log.warning("ignoring history file %r", self.path)
+
+    @classmethod
+    def for_cursor_file(cls, cursor_file):
+        """
+        Get the history stored alongside a cursor bookmark file
+
+        :param cursor_file: str, filename of cursor bookmark file
+        :return: ExclusionHistory instance
+        """
+        return cls(cursor_file + cls.SUFFIX)
+
+    def get_hits(self):
+        """
+        Get the total hits for each exclusion from previous runs
+
+        :return: dict, fingerprint -> int
+        """
+        return {fingerprint: record.get('hits', 0)
+                for fingerprint, record in self.exclusions.items()}
+
+    def get_statistics(self, exclusions):
+        """
+        Get the statistics for exclusion rules
+
+        :param exclusions: iterable, Exclusion instances
+        :return: list, HistoricalStatistics instances, most hits first
+        """
+        stats = []
+        for exclusion in exclusions:
+            record = self.exclusions.get(exclusion.fingerprint(), {})
+            last_hit = record.get('last_hit')
+            if last_hit is not None:
+                last_hit = datetime.datetime.fromtimestamp(last_hit)
+
+            stats.append(HistoricalStatistics(record.get('hits', 0),
+                                              record.get('evaluations', 0),
+                                              last_hit,
+                                              exclusion))
+
+        stats.sort(reverse=True, key=lambda stat: stat.hits)
+        return stats
+
+    def update(self, exclusions, evaluations=0):
+        """
+        Add the statistics from this run
+
+        Exclusions no longer in use are forgotten.
+
+        :param exclusions: iterable, Exclusion instances
+        :param evaluations: int, entries tested against the exclusions
+        """
+        now = time.time()
+        updated = {}
+        for exclusion in exclusions:
+            fingerprint = exclusion.fingerprint()
+            try:
+                record = updated[fingerprint]
+            except KeyError:
+                record = dict(self.exclusions.get(fingerprint, {}))
+                record['evaluations'] = (record.get('evaluations', 0) +
+                                         evaluations)
+                updated[fingerprint] = record
+
+            record['hits'] = record.get('hits', 0) + exclusion.hits
+            if exclusion.hits:
+                if isinstance(exclusion.last_hit, datetime.datetime):
+                    last_hit = exclusion.last_hit.timestamp()
+                else:
+                    last_hit = now
+
+                record['last_hit'] = max(last_hit,
+                                         record.get('last_hit', last_hit))
+
+        self.exclusions = updated
+
+    def save(self):
+        """
+        Write the history file, replacing any existing one
+
+        The directory for it is created if needed.
+        """
+        path = os.path.dirname(self.path)
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+        history = {
+            'version': self.VERSION,
+            'exclusions': self.exclusions,
+        }
+
+        temp_path = self.path + '.tmp'
+        with open(temp_path, "wt") as fp:
+            json.dump(history, fp, sort_keys=True)
+
+        os.replace(temp_path, self.path)
@@ -17,24 +17,705 @@ Copyright (c) 2015, 2020 Tim Waugh <tim@cyberelk.net>
 """
 
 from collections import namedtuple
-from collections.abc import Iterator
+from collections.abc import Iterator, MutableMapping
+import datetime
 import errno
 from journal_brief.constants import PRIORITY_MAP
 from logging import getLogger
 import os
 from systemd import journal
+import time
 
 
 log = getLogger(__name__)
 
 
-class SelectiveReader(journal.Reader):
+class TruncatedValue(str):
+    """
+    The start of a journal field value too large to be read in full
+    """
+    pass
+
+
+class LazyJournalEntry(MutableMapping):
+    """
+    Journal entry which only converts field values when they are used
+
+    Field values are kept as read from the journal and each is
+    converted (to str, int, datetime.datetime, uuid.UUID, etc) the
+    first time it is looked up. Entries which are excluded after
+    looking at only a few fields are then cheap to discard.
+    """
+
+    __slots__ = ('raw', 'converted', 'convert')
+
+    def __init__(self, raw, convert):
+        """
+        Constructor
+
+        :param raw: dict, field -> unconverted value (or list of values)
+        :param convert: callable, (field, value) -> converted value
+        """
+        self.raw = raw
+        self.converted = {}
+        self.convert = convert
+
+    def __getitem__(self, field):
+        try:
+            return self.converted[field]
+        except KeyError:
+            pass
+
+        value = self.raw[field]
+        if isinstance(value, list):
+            value = [self.convert(field, item) for item in value]
+        else:
+            value = self.convert(field, value)
+
+        self.converted[field] = value
+        return value
+
+    def __setitem__(self, field, value):
+        self.raw[field] = value
+        self.converted[field] = value
+
+    def __delitem__(self, field):
+        del self.raw[field]
+        self.converted.pop(field, None)
+
+    def __contains__(self, field):
+        return field in self.raw
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __repr__(self):
+        return "{0}({1!r})".format(self.__class__.__name__, dict(self))
+
+
+# A journal entry selection: entries matching 'inclusion' and, unless
+# it is None, at or below priority 'log_level'
+Rule = namedtuple('Rule', ('log_level', 'inclusion'))
+
+
+def inclusion_rules(log_level=None, inclusions=None, explicit_inclusions=None):
+    """
+    Get the rules selecting journal entries to read
+
+    :param log_level: int, LOG_* priority level
+    :param inclusions: dict, field -> values, PRIORITY may use value
+                       instead of list
+    :param explicit_inclusions: dict, field -> values, but log_level
+                                is not applied to any of these
+    :return: list, Rule instances, any of which an entry must match;
+             empty if all entries are selected
+    """
+    assert not inclusions or isinstance(inclusions, list)
+    assert not explicit_inclusions or isinstance(explicit_inclusions, list)
+
+    # 'inclusions' use 'log_level' for each disjunct
+    rules = [Rule(log_level=log_level, inclusion=inclusion)
+             for inclusion in inclusions or []]
+
+    # 'explicit_inclusions' don't. This is to allow output
+    # formatters to specify their own explicit inclusions rules
+    # without needing to set PRIORITY.
+    rules += [Rule(log_level=None, inclusion=inclusion)
+              for inclusion in explicit_inclusions or []]
+
+    if not rules and log_level is not None:
+        rules = [Rule(log_level=log_level, inclusion={})]
+
+    return rules
+
+
+def priorities(log_level):
+    """
+    Get the PRIORITY values at or above a log level
+
+    :param log_level: int, LOG_* priority level
+    :return: list, str values
+    """
+    if not 0 <= log_level <= 7:
+        raise ValueError("Log level must be 0 <= level <= 7")
+
+    return [str(priority) for priority in range(log_level + 1)]
+
+
+def rule_term(rule):
+    """
+    Get the journal match term for a rule
+
+    A term matches entries having one of its values for every field.
+    As in the journal, matches for the same field are alternatives, so
+    a rule's log level adds to any PRIORITY values it includes.
+
+    :param rule: Rule instance
+    :return: dict, field -> frozenset of str values
+    """
+    assert isinstance(rule.inclusion, dict)
+    term = {}
+
+    def add(field, values):
+        if values:
+            term[field] = term.get(field, frozenset()) | frozenset(values)
+
+    for field, matches in rule.inclusion.items():
+        if field == 'PRIORITY':
+            try:
+                this_log_level = int(PRIORITY_MAP[matches])
+            except (AttributeError, TypeError):
+                pass
+            else:
+                # These are equivalent:
+                # - PRIORITY: 3
+                # - PRIORITY: err
+                # - PRIORITY: [0, 1, 2, 3]
+                # - PRIORITY: [emerg, alert, crit, err]
+                add(field, priorities(this_log_level))
+                continue
+
+        assert isinstance(matches, list)
+        values = []
+        for match in matches:
+            if field == 'PRIORITY':
+                try:
+                    match = PRIORITY_MAP[match]
+                except (AttributeError, TypeError):
+                    pass
+
+            values.append(str(match))
+
+        add(field, values)
+
+    if rule.log_level is not None:
+        add('PRIORITY', priorities(rule.log_level))
+
+    return term
+
+
+def term_subsumes(term, other):
+    """
+    Check whether a term matches every entry another term matches
+
+    :param term: dict, field -> frozenset of str values
+    :param other: dict, field -> frozenset of str values
+    :return: bool
+    """
+    return all(field in other and other[field] <= values
+               for field, values in term.items())
+
+
+def merge_terms(term, other):
+    """
+    Merge two terms differing in the values of at most one field
+
+    :param term: dict, field -> frozenset of str values
+    :param other: dict, field -> frozenset of str values
+    :return: dict, matching the entries either term matches, or None
+             if they can't be merged
+    """
+    if set(term) != set(other):
+        return None
+
+    differing = [field for field in term if term[field] != other[field]]
+    if len(differing) > 1:
+        return None
+
+    merged = dict(term)
+    for field in differing:
+        merged[field] = term[field] | other[field]
+
+    return merged
+
+
+def match_expression(rules):
+    """
+    Get normalised journal matches for entries matching any of some rules
+
+    Terms which differ in the values of only one field are merged,
+    terms matching only entries another term matches are removed, and
+    fields with the same values in every term are moved out into a
+    term which every entry must also match.
+
+    :param rules: list, Rule instances
+    :return: tuple, (dict, common term, list of dicts, terms any of
+             which an entry must also match; empty if any will do)
+    """
+    terms = [rule_term(rule) for rule in rules]
+    changed = True
+    while changed:
+        changed = False
+        kept = []
+        for index, term in enumerate(terms):
+            if any(term_subsumes(other, term) and
+                   (earlier < index or not term_subsumes(term, other))
+                   for earlier, other in enumerate(terms)
+                   if earlier != index):
+                changed = True
+            else:
+                kept.append(term)
+
+        terms = kept
+        for index, term in enumerate(terms):
+            for later in range(index + 1, len(terms)):
+                merged = merge_terms(term, terms[later])
+                if merged is not None:
+                    terms[index] = merged
+                    del terms[later]
+                    changed = True
+                    break
+
+            if changed:
+                break
+
+    if not terms:
+        return ({}, [])
+
+    common = {field: values for field, values in terms[0].items()
+              if all(term.get(field) == values for term in terms[1:])}
+    terms = [{field: values for field, values in term.items()
+              if field not in common}
+             for term in terms]
+    if not all(terms):
+        # Some term matches every entry the common term does
+        terms = []
+
+    return (common, terms)
+
+
+def describe_matches(common, terms, this_boot=None, boot_id=None):
+    """
+    Describe journal matches for logging
+
+    :param common: dict, field -> set of str values
+    :param terms: list, dicts of field -> set of str values
+    :param this_boot: bool, whether this boot's ID is also matched
+    :param boot_id: UUID or str, another boot ID also matched
+    :return: str
+    """
+    def describe(term):
+        return ' and '.join('{0}={1}'.format(field,
+                                             '|'.join(sorted(term[field])))
+                            for field in sorted(term))
+
+    conjuncts = []
+    if common:
+        conjuncts.append(describe(common))
+
+    if boot_id is not None:
+        conjuncts.append('_BOOT_ID={0}'.format(getattr(boot_id, 'hex',
+                                                       boot_id)))
+    elif this_boot:
+        conjuncts.append('_BOOT_ID=<this boot>')
+
+    if len(terms) > 1:
+        disjuncts = ['({0})'.format(describe(term)) for term in terms]
+        conjuncts.append('({0})'.format(' or '.join(disjuncts)))
+    elif terms:
+        conjuncts.append(describe(terms[0]))
+
+    return ' and '.join(conjuncts) or 'all entries'
+
+
+def read_cursor_file(cursor_file):
+    """
+    Read a cursor bookmark file
+
+    :param cursor_file: str, filename of cursor bookmark file
+    :return: str, cursor, or None if there is no bookmark file
+    """
+    try:
+        with open(cursor_file, "rt") as fp:
+            return fp.read()
+    except IOError as ex:
+        if ex.errno == errno.ENOENT:
+            return None
+
+        raise
+
+
+def write_cursor_file(cursor_file, cursor):
+    """
+    Replace a cursor bookmark file
+
+    The new cursor is written to a temporary file which is synced to
+    disk before being renamed over the bookmark file, so that the
+    bookmark file is never left incomplete. The directory is then
+    synced so that the rename is not lost in a crash.
+
+    :param cursor_file: str, filename of cursor bookmark file
+    :param cursor: str, cursor
+    """
+    path = os.path.dirname(cursor_file)
+    try:
+        os.makedirs(path)
+    except OSError as ex:
+        if ex.errno == errno.EEXIST and os.path.isdir(path):
+            pass
+        else:
+            raise
+
+    temp_path = cursor_file + '.tmp'
+    with open(temp_path, "wt") as fp:
+        fp.write(cursor)
+        fp.flush()
+        os.fsync(fp.fileno())
+
+    os.replace(temp_path, cursor_file)
+    fd = os.open(path or os.curdir, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def tail_cursor():
+    """
+    Find the cursor of the last entry in the journal
+
+    :return: str, cursor, or '' if the journal is empty
+    """
+    # use an unfiltered Reader to find the current 'tail' of the
+    # journal
+    reader = journal.Reader()
+    reader.seek_tail()
+    fields = reader.get_previous()
+    reader.close()
+    if fields:
+        return fields['__CURSOR']
+
+    return ''
+
+
+def catch_up(reader):
+    """
+    Find the end of the journal once a reader has run out of entries
+
+    The reader may select only some entries, in which case the end of
+    the journal can be beyond the last entry it returned. Bookmarks
+    moved on to the end of the journal let the next run find out
+    quickly that there is nothing new (see journal_unchanged()).
+
+    :param reader: systemd.journal.Reader or SelectiveReader instance,
+                   which has returned no more entries
+    :return: tuple, (str cursor of the last entry in the journal, or
+             '' to leave the bookmarks where they are, dict entry
+             added to the journal meanwhile and selected by the reader
+             or an empty dict)
+    """
+    if not getattr(reader, 'selective', False):
+        # Every entry was read, so the bookmarks are at the end already
+        return ('', {})
+
+    tail = tail_cursor()
+
+    # Any entry for the reader added before the tail was found is
+    # read now, so that the bookmarks do not pass over it
+    fields = reader.get_next()
+    if fields:
+        return ('', fields)
+
+    return (tail, fields)
+
+
+def journal_unchanged(cursors, reader=None):
+    """
+    Check whether the journal ends at some bookmarks
+
+    Only the last entry in the journal is read, so this is a quick
+    way to find out that no entries have been added since then.
+
+    :param cursors: list, str cursors of bookmarks
+    :param reader: systemd.journal.Reader instance, with no matches
+    :return: bool, whether each bookmark is at the last entry
+    """
+    if reader is None:
+        # use an unfiltered Reader, as tail_cursor() does
+        journal_reader = journal.Reader()
+    else:
+        journal_reader = reader
+
+    try:
+        journal_reader.seek_tail()
+        if not journal_reader.get_previous():
+            return False
+
+        return all(journal_reader.test_cursor(cursor) for cursor in cursors)
+    finally:
+        if reader is None:
+            journal_reader.close()
+
+
+def parse_cursor(cursor):
+    """
+    Get the location of an entry from its cursor
+
+    :param cursor: str, journal cursor
+    :return: dict, field -> str, from the cursor's fields: 's' (sequence
+             number ID), 'i' (sequence number), 'b' (boot ID), 'm'
+             (monotonic timestamp) and 't' (realtime timestamp)
+    """
+    location = dict(item.split('=', 1) for item in cursor.split(';')
+                    if '=' in item)
+    if 't' not in location:
+        raise ValueError("invalid cursor {0!r}".format(cursor))
+
+    return location
+
+
+def cursor_precedes(cursor, other):
+    """
+    Check whether the entry at a cursor comes before another
+
+    Entries are ordered by sequence number when they have the same
+    sequence number ID, by monotonic timestamp when from the same boot,
+    and otherwise by realtime timestamp, as the journal does.
+
+    :param cursor: str, journal cursor
+    :param other: str, journal cursor
+    :return: bool
+    """
+    loc = parse_cursor(cursor)
+    other_loc = parse_cursor(other)
+    for id_field, position_field in [('s', 'i'), ('b', 'm')]:
+        if (loc.get(id_field) is not None and
+                loc.get(id_field) == other_loc.get(id_field) and
+                position_field in loc and position_field in other_loc):
+            return (int(loc[position_field], 16) <
+                    int(other_loc[position_field], 16))
+
+    return int(loc['t'], 16) < int(other_loc['t'], 16)
+
+
+def bookmark_exists(cursor):
+    """
+    Check whether the entry at a bookmark is still in the journal
+
+    :param cursor: str, journal cursor
+    :return: bool
+    """
+    # use an unfiltered Reader, as the bookmarked entry may not be
+    # selected by the matches in use
+    reader = journal.Reader()
+    try:
+        reader.seek_cursor(cursor)
+        return bool(reader.get_next()) and reader.test_cursor(cursor)
+    finally:
+        reader.close()
+
+
+def seek_bookmark(reader, cursor):
+    """
+    Move a reader past the entry at a bookmark
+
+    If the reader does not land on the bookmarked entry, the entry it
+    lands on is the first new one. This happens when the reader's
+    matches don't select the bookmarked entry, and when the entry is
+    no longer in the journal, for instance because the journal file it
+    was in has been removed. In that case the gap is reported, and if
+    the entry landed on is earlier than the bookmark, the reader is
+    moved to the first entry after the bookmark's realtime timestamp
+    instead.
+
+    :param reader: systemd.journal.Reader instance
+    :param cursor: str, journal cursor
+    :return: dict, first entry after the bookmark if it has been
+             read, or None
+    """
+    log.debug("Seeking to %s", cursor)
+    reader.seek_cursor(cursor)
+    fields = reader.get_next()
+    if not fields or reader.test_cursor(cursor):
+        return None
+
+    if bookmark_exists(cursor):
+        log.debug("bookmarked entry not selected")
+        return fields
+
+    try:
+        bookmark = parse_cursor(cursor)
+        if cursor_precedes(fields['__CURSOR'], cursor):
+            realtime = int(bookmark['t'], 16) + 1
+            log.debug("Seeking to realtime %d", realtime)
+            reader.seek_realtime(realtime)
+            fields = reader.get_next()
+            if not fields:
+                log.warning("bookmarked entry not found, and no later entries")
+                return None
+
+        location = parse_cursor(fields['__CURSOR'])
+    except (KeyError, ValueError):
+        log.warning("bookmarked entry not found")
+        return fields
+
+    seconds = (int(location['t'], 16) - int(bookmark['t'], 16)) / 1000000
+    if ('i' in bookmark and 'i' in location and
+            bookmark.get('s') == location.get('s')):
+        skipped = int(location['i'], 16) - int(bookmark['i'], 16) - 1
+        log.warning("bookmarked entry not found, continuing %d entries "
+                    "(%.1f seconds) later", skipped, seconds)
+    else:
+        log.warning("bookmarked entry not found, continuing %.1f seconds "
+                    "later", seconds)
+
+    return fields
+
+
+class EntryReader(object):
+    """
+    Inclusion matches and field handling for journal entry readers
+
+    Classes using this must provide the match methods of
+    systemd.journal.Reader: add_match(), add_disjunction(),
+    log_level() and this_boot().
+    """
+
+    # Whether matches have been added, so that only some entries are read
+    selective = False
+
+    def add_inclusions(self, log_level=None, this_boot=None,
+                       inclusions=None, explicit_inclusions=None):
+        """
+        Add matches for inclusion rules
+
+        :param log_level: int, LOG_* priority level
+        :param this_boot: bool, process messages from this boot
+        :param inclusions: dict, field -> values, PRIORITY may use value
+                           instead of list
+        :param explicit_inclusions: dict, field -> values, but
+                                    log_level is not applied to any of
+                                    these
+        """
+        self.add_rules(inclusion_rules(log_level=log_level,
+                                       inclusions=inclusions,
+                                       explicit_inclusions=explicit_inclusions),
+                       this_boot=this_boot)
+
+    def add_rules(self, rules, this_boot=None, boot_id=None):
+        """
+        Add matches for entries matching any of some rules
+
+        :param rules: list, Rule instances, or empty for all entries
+        :param this_boot: bool, process messages from this boot
+        :param boot_id: UUID or str, process messages from this boot
+                        instead
+        """
+        log.debug("setting inclusion filters:")
+        if rules:
+            self.set_filter_rules(rules, this_boot=this_boot,
+                                  boot_id=boot_id)
+            self.selective = True
+        elif self.add_boot_match(this_boot, boot_id):
+            self.selective = True
+
+        log.debug("no more inclusion filters")
+
+    def add_boot_match(self, this_boot=None, boot_id=None):
+        """
+        Add a match for entries from one boot, if wanted
+
+        :param this_boot: bool, process messages from this boot
+        :param boot_id: UUID or str, process messages from this boot
+                        instead
+        :return: bool, whether a match was added
+        """
+        if boot_id is not None:
+            log.debug("this_boot(%r)", boot_id)
+            self.this_boot(boot_id)
+        elif this_boot:
+            log.debug("this_boot()")
+            self.this_boot()
+        else:
+            return False
+
+        return True
+
+    def set_fields(self, fields):
+        """
+        Only read some fields from each entry
+
+        Only the first value of a field with several values is read.
+
+        :param fields: iterable, field names, or None to read all fields
+        """
+        if fields is None:
+            self.fields = None
+        else:
+            # The address fields are always read separately
+            self.fields = sorted(field for field in set(fields)
+                                 if not field.startswith('__'))
+            log.debug("reading fields: %s", ", ".join(self.fields))
+
+    def truncate_value(self, field, value):
+        """
+        Handle a field value which may have been truncated
+
+        The journal's data threshold is only a hint, so values are
+        also truncated here. Values which have been truncated are
+        decoded as far as possible.
+
+        :param field: str, field name
+        :param value: bytes, field value
+        :return: bytes or TruncatedValue instance
+        """
+        if not isinstance(value, bytes) or field.startswith('__'):
+            # Address fields are never truncated
+            return value
+
+        size = max(self.max_data_size - len(field) - 1, 0)
+        if len(value) < size:
+            return value
+
+        log.debug("%s truncated at %d bytes", field, size)
+        return TruncatedValue(value[:size].decode(errors='replace'))
+
+    def set_filter_rules(self, rules, this_boot=None, boot_id=None):
+        """
+        Add normalised matches for entries matching any of some rules
+
+        :param rules: list, Rule instances
+        :param this_boot: bool, process messages from this boot
+        :param boot_id: UUID or str, process messages from this boot
+                        instead
+        """
+        (common, terms) = match_expression(rules)
+        log.debug("journal matches: %s",
+                  describe_matches(common, terms, this_boot, boot_id))
+        self.add_term(common)
+        boot_match = self.add_boot_match(this_boot, boot_id)
+        if terms:
+            if common or boot_match:
+                self.add_conjunction()
+
+            for index, term in enumerate(terms):
+                if index:
+                    self.add_disjunction()
+
+                self.add_term(term)
+
+    def add_term(self, term):
+        """
+        Add matches for entries with one of some values for each field
+
+        :param term: dict, field -> set of str values
+        """
+        for field in sorted(term):
+            for value in sorted(term[field]):
+                self.add_match(**{str(field): value})
+
+
+class SelectiveReader(EntryReader, journal.Reader):
     """
     A Reader instance with matches applied
     """
 
     def __init__(self, log_level=None, this_boot=None, inclusions=None,
-                 explicit_inclusions=None):
+                 explicit_inclusions=None, lazy=False, fields=None,
+                 data_threshold=None, **kwargs):
         """Constructor
 
         :param log_level: int, LOG_* priority level
@@ -44,83 +725,94 @@ class SelectiveReader(journal.Reader):
         :param explicit_inclusions: dict, field -> values, but
                                     log_level is not applied to any of
                                     these
+        :param lazy: bool, return LazyJournalEntry instances rather than
+                     dicts, only converting fields when used
+        :param fields: iterable, names of the only fields to read, or
+                       None to read all fields
+        :param data_threshold: int, size in bytes of the largest
+                               FIELD=value data to read in full;
+                               larger values are truncated and
+                               returned as TruncatedValue instances
+        :param kwargs: passed to systemd.journal.Reader, for instance
+                       path or files to read another journal
 
         """
-        super(SelectiveReader, self).__init__()
+        super(SelectiveReader, self).__init__(**kwargs)
+        self.lazy = lazy
+        self.set_fields(fields)
+        self.max_data_size = data_threshold
+        if data_threshold is not None:
+            log.debug("data_threshold = %r", data_threshold)
+            self.data_threshold = data_threshold
 
-        log.debug("setting inclusion filters:")
-        assert not inclusions or isinstance(inclusions, list)
-        assert not explicit_inclusions or isinstance(explicit_inclusions, list)
+        self.add_inclusions(log_level=log_level,
+                            this_boot=this_boot,
+                            inclusions=inclusions,
+                            explicit_inclusions=explicit_inclusions)
 
-        Rule = namedtuple('Rule', ('log_level', 'inclusion'))
+    def get_next(self, skip=1):
+        if self.fields is None:
+            return super(SelectiveReader, self).get_next(skip)
 
-        # 'inclusions' use 'log_level' for each disjunct
-        rules = [Rule(log_level=log_level, inclusion=inclusion)
-                 for inclusion in inclusions or []]
+        if not self._next(skip):
+            return {}
 
-        # 'explicit_inclusions' don't. This is to allow output
-        # formatters to specify their own explicit inclusions rules
-        # without needing to set PRIORITY.
-        rules += [Rule(log_level=None, inclusion=inclusion)
-                  for inclusion in explicit_inclusions or []]
+        entry = {}
+        for field in self.fields:
+            try:
+                entry[field] = self._get(field)
+            except KeyError:
+                pass
 
-        if rules:
-            self.set_filter_rules(rules, this_boot=this_boot)
-        else:
-            if this_boot:
-                log.debug("this_boot()")
-                self.this_boot()
+        entry['__REALTIME_TIMESTAMP'] = self._get_realtime()
+        entry['__MONOTONIC_TIMESTAMP'] = self._get_monotonic()
+        entry['__CURSOR'] = self._get_cursor()
+        return self._convert_entry(entry)
 
-            if log_level is not None:
-                log.debug("log_level(%r)", log_level)
-                self.log_level(log_level)
+    def unique_values(self, fields):
+        """
+        Find every value some fields have anywhere in the journal
 
-        log.debug("no more inclusion filters")
+        Fields with values which may have been cut short by the data
+        threshold are left out.
 
-    def process_rule(self, rule, this_boot):  # noqa: C901
-        assert isinstance(rule.inclusion, dict)
-        for field, matches in rule.inclusion.items():
-            if field == 'PRIORITY':
-                try:
-                    this_log_level = int(PRIORITY_MAP[matches])
-                except (AttributeError, TypeError):
-                    pass
-                else:
-                    # These are equivalent:
-                    # - PRIORITY: 3
-                    # - PRIORITY: err
-                    # - PRIORITY: [0, 1, 2, 3]
-                    # - PRIORITY: [emerg, alert, crit, err]
-                    log.debug("log_level(%r)", this_log_level)
-                    self.log_level(this_log_level)
+        :param fields: iterable, field names
+        :return: dict, field -> set of values
+        """
+        unique_values = {}
+        for field in fields:
+            values = self.query_unique(field)
+            if self.max_data_size is not None:
+                size = self.max_data_size - len(field) - 1
+                if any(len(value) >= size for value in values
+                       if isinstance(value, (str, bytes))):
+                    log.debug("%s values may be truncated", field)
                     continue
 
-            assert isinstance(matches, list)
-            for match in matches:
-                if field == 'PRIORITY':
-                    try:
-                        match = PRIORITY_MAP[match]
-                    except (AttributeError, TypeError):
-                        pass
+            log.debug("%s has %d values", field, len(values))
+            unique_values[field] = values
 
-                log.debug("%s=%s", field, match)
-                self.add_match(**{str(field): str(match)})
+        return unique_values
 
-        if this_boot:
-            log.debug("this_boot()")
-            self.this_boot()
+    def _convert_field(self, key, value):
+        if isinstance(value, TruncatedValue):
+            return value
+
+        return super(SelectiveReader, self)._convert_field(key, value)
 
-        if rule.log_level is not None:
-            log.debug("log_level(%r)", rule.log_level)
-            self.log_level(rule.log_level)
+    def _convert_entry(self, entry):
+        if self.max_data_size is not None:
+            for field, value in entry.items():
+                if isinstance(value, list):
+                    entry[field] = [self.truncate_value(field, item)
+                                    for item in value]
+                else:
+                    entry[field] = self.truncate_value(field, value)
 
-    def set_filter_rules(self, rules, this_boot=None):
-        for index, rule in enumerate(rules):
-            if index:
-                log.debug("-or-")
-                self.add_disjunction()
+        if not self.lazy:
+            return super(SelectiveReader, self)._convert_entry(entry)
 
-            self.process_rule(rule, this_boot)
+        return LazyJournalEntry(entry, self._convert_field)
 
 
 class LatestJournalEntries(Iterator):
@@ -129,7 +821,9 @@ class LatestJournalEntries(Iterator):
     """
 
     def __init__(self, cursor_file=None, reader=None, dry_run=False,
-                 seek_cursor=True):
+                 seek_cursor=True, checkpoint_entries=None,
+                 checkpoint_interval=None, max_entries=None,
+                 max_runtime=None, follow=False, since=None, until=None):
         """
         Constructor
 
@@ -137,45 +831,51 @@ class LatestJournalEntries(Iterator):
         :param reader: systemd.journal.Reader instance
         :param dry_run: bool, whether to update the cursor file
         :param seek_cursor: bool, whether to seek to bookmark first
+        :param checkpoint_entries: int, entries between checkpoints
+        :param checkpoint_interval: float, seconds between checkpoints
+        :param max_entries: int, entries to read before stopping
+        :param max_runtime: float, seconds to read for before stopping
+        :param follow: bool, whether to wait for new entries at the end
+        of the journal until max_entries or max_runtime runs out
+        :param since: datetime, seek to this time instead of to bookmark
+        :param until: datetime, stop at the first entry after this time
         """
         super(LatestJournalEntries, self).__init__()
 
+        self.set_budget(max_entries=max_entries, max_runtime=max_runtime)
+
         self.cursor_file = cursor_file
-        try:
-            with open(self.cursor_file, "rt") as fp:
-                self.cursor = fp.read()
-        except IOError as ex:
-            if ex.errno == errno.ENOENT:
-                self.cursor = None
-            else:
-                raise
+        self.cursor = read_cursor_file(self.cursor_file)
 
         if reader is None:
             reader = journal.Reader()
 
+        if since is not None:
+            log.debug("Seeking to %s", since)
+            reader.seek_realtime(since)
+            seek_cursor = False
+
+        # The first new entry, if already read
+        self.pending = None
         if self.cursor:
             if seek_cursor:
-                log.debug("Seeking to %s", self.cursor)
-                reader.seek_cursor(self.cursor)
-                reader.get_next()
+                self.pending = seek_bookmark(reader, self.cursor)
         elif not dry_run:
-            # use an unfiltered Reader to find the current 'tail'
-            # of the journal and store that as the initial cursor
-            # when the cursor file could not be found; this avoids
-            # reading through the entire journal again on the next
-            # run if the inclusions and exclusions result in zero
+            # store the current 'tail' of the journal as the initial
+            # cursor when the cursor file could not be found; this
+            # avoids reading through the entire journal again on the
+            # next run if the inclusions and exclusions result in zero
             # matching entries during this run
-            temp_reader = journal.Reader()
-            temp_reader.seek_tail()
-            fields = temp_reader.get_previous()
-            if fields:
-                self.cursor = fields['__CURSOR']
-            else:
-                self.cursor = ''
-            temp_reader.close()
+            self.cursor = tail_cursor()
 
         self.reader = reader
         self.dry_run = dry_run
+        self.checkpoint_entries = checkpoint_entries
+        self.checkpoint_interval = checkpoint_interval
+        self.unsaved_entries = 0
+        self.last_checkpoint = time.monotonic()
+        self.follow = follow
+        self.until = until
 
     def __enter__(self):
         return self
@@ -189,24 +889,321 @@ class LatestJournalEntries(Iterator):
         if self.dry_run:
             return
 
-        path = os.path.dirname(self.cursor_file)
-        try:
-            os.makedirs(path)
-        except OSError as ex:
-            if ex.errno == errno.EEXIST and os.path.isdir(path):
-                pass
-            else:
-                raise
+        self.write_cursor()
+
+    def write_cursor(self):
+        """
+        Replace the cursor bookmark file with the current cursor
+        """
+        write_cursor_file(self.cursor_file, self.cursor)
+
+    def set_budget(self, max_entries=None, max_runtime=None):
+        """
+        Limit the entries returned from now on
+
+        :param max_entries: int, entries to read before stopping
+        :param max_runtime: float, seconds to read for before stopping
+        """
+        self.max_entries = max_entries
+        self.entries_read = 0
+        if max_runtime is None:
+            self.deadline = None
+        else:
+            self.deadline = time.monotonic() + max_runtime
+
+        # Whether iteration stopped because max_entries or max_runtime
+        # ran out, rather than at the end of the journal
+        self.stopped_early = False
 
-        with open(self.cursor_file, "wt") as fp:
-            fp.write(self.cursor)
+    def checkpoint_due(self):
+        """
+        Check whether enough progress has been made for a checkpoint
+
+        :return: bool, whether checkpoint() should be called
+        """
+        if self.dry_run or not self.unsaved_entries:
+            return False
+
+        if (self.checkpoint_entries is not None and
+                self.unsaved_entries >= self.checkpoint_entries):
+            return True
+
+        return (self.checkpoint_interval is not None and
+                (time.monotonic() - self.last_checkpoint >=
+                 self.checkpoint_interval))
+
+    def checkpoint(self, cursor=None):
+        """
+        Save the cursor of the last entry returned
+
+        Only call this once the output for all entries returned so
+        far has been delivered: if the run is interrupted, the next
+        run starts after this entry.
+
+        :param cursor: str, cursor of an earlier entry to save instead,
+                       when only the output up to that entry has been
+                       delivered
+        """
+        log.debug("Checkpoint after %d entries", self.unsaved_entries)
+        write_cursor_file(self.cursor_file,
+                          self.cursor if cursor is None else cursor)
+        self.unsaved_entries = 0
+        self.last_checkpoint = time.monotonic()
 
     def __next__(self):
-        fields = self.reader.get_next()
-        if not fields:
+        if (self.max_entries is not None and
+                self.entries_read >= self.max_entries):
+            # Stop without returning another entry, leaving the cursor
+            # at the last entry returned. The next entry is kept for
+            # later, and only if there is one is this stopping early.
+            if self.pending is None:
+                self.pending = self.reader.get_next()
+                if not self.pending and not self.follow:
+                    self.pending = self.move_to_end()
+
+            if self.pending and not self.after_until(self.pending):
+                self.stop_early()
+
+            self.pending = None
+            raise StopIteration
+
+        while True:
+            if (self.deadline is not None and
+                    time.monotonic() >= self.deadline):
+                self.stop_early()
+
+            if self.pending is None:
+                fields = self.reader.get_next()
+            else:
+                fields = self.pending
+                self.pending = None
+
+            if fields:
+                break
+
+            if not self.follow:
+                fields = self.move_to_end()
+                if fields:
+                    break
+
+                raise StopIteration
+
+            if self.deadline is None:
+                timeout = None
+            else:
+                timeout = max(self.deadline - time.monotonic(), 0)
+
+            log.debug("waiting for new entries (timeout=%r)", timeout)
+            self.reader.wait(timeout)
+
+        if self.after_until(fields):
+            # Entries are in time order, so there are no more to come
+            log.debug("stopping at %s", fields['__REALTIME_TIMESTAMP'])
             raise StopIteration
 
         if '__CURSOR' in fields:
             self.cursor = fields['__CURSOR']
 
+        self.entries_read += 1
+        self.unsaved_entries += 1
+        return fields
+
+    def after_until(self, fields):
+        """
+        Check whether an entry is later than the time range
+
+        :param fields: dict, journal entry
+        :return: bool, whether the entry is after until
+        """
+        return (self.until is not None and
+                fields.get('__REALTIME_TIMESTAMP', self.until) > self.until)
+
+    def move_to_end(self):
+        """
+        Move the bookmark on to the end of the journal once the reader
+        has run out of entries
+
+        :return: dict, entry for the reader added meanwhile, or empty
+        """
+        if self.dry_run:
+            return {}
+
+        (tail, fields) = catch_up(self.reader)
+        if tail:
+            log.debug("moving bookmark on to the end of the journal")
+            self.cursor = tail
+
+        return fields
+
+    def stop_early(self):
+        """
+        Stop iterating because max_entries or max_runtime ran out
+        """
+        log.debug("stopping early after %d entries", self.entries_read)
+        self.stopped_early = True
+        raise StopIteration
+
+
+class ReverseJournalEntries(Iterator):
+    """
+    Iterate backwards over journal entries, newest first
+
+    The cursor bookmark is not used.
+    """
+
+    def __init__(self, reader=None, since=None, until=None):
+        """
+        Constructor
+
+        :param reader: systemd.journal.Reader instance
+        :param since: datetime, stop at the first entry before this time
+        :param until: datetime, start at the last entry up to this time
+        """
+        super(ReverseJournalEntries, self).__init__()
+
+        if reader is None:
+            reader = journal.Reader()
+
+        if until is None:
+            reader.seek_tail()
+        else:
+            # Entries at exactly this time are before the position
+            # found for a microsecond later
+            log.debug("Seeking to %s", until)
+            reader.seek_realtime(until + datetime.timedelta(microseconds=1))
+
+        self.reader = reader
+        self.since = since
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def __next__(self):
+        fields = self.reader.get_previous()
+        if not fields:
+            raise StopIteration
+
+        if (self.since is not None and
+                fields.get('__REALTIME_TIMESTAMP', self.since) < self.since):
+            log.debug("stopping at %s", fields['__REALTIME_TIMESTAMP'])
+            raise StopIteration
+
+        return fields
+
+
+class MultiCursorEntries(Iterator):
+    """
+    Iterate once over new journal entries for several cursor bookmarks
+
+    Entries are read from the earliest bookmark onwards. Each bookmark
+    becomes active once the entry it refers to has been passed, and
+    the bookmarks which are active are moved on to each entry read.
+    """
+
+    def __init__(self, cursor_files, reader=None, dry_run=False,
+                 seek_cursor=True):
+        """
+        Constructor
+
+        :param cursor_files: list, str filenames of cursor bookmark files
+        :param reader: systemd.journal.Reader instance
+        :param dry_run: bool, whether to update the cursor files
+        :param seek_cursor: bool, whether to seek to a bookmark first
+        """
+        super(MultiCursorEntries, self).__init__()
+
+        self.cursor_files = cursor_files
+        self.cursors = [read_cursor_file(cursor_file)
+                        for cursor_file in cursor_files]
+
+        if reader is None:
+            reader = journal.Reader()
+
+        # Bookmarks not yet passed, index -> cursor
+        self.pending = {}
+        # The first entry after the earliest bookmark, if already read
+        self.first = None
+        if seek_cursor and all(self.cursors):
+            earliest = self.cursors[0]
+            for cursor in self.cursors[1:]:
+                if cursor_precedes(cursor, earliest):
+                    earliest = cursor
+
+            self.first = seek_bookmark(reader, earliest)
+            self.pending = {index: cursor
+                            for index, cursor in enumerate(self.cursors)
+                            if cursor != earliest}
+        elif seek_cursor:
+            # Some bookmark files could not be found so read from the
+            # start, as LatestJournalEntries does
+            self.pending = {index: cursor
+                            for index, cursor in enumerate(self.cursors)
+                            if cursor}
+
+        if not dry_run and not all(self.cursors):
+            tail = tail_cursor()
+            self.cursors = [cursor or tail for cursor in self.cursors]
+
+        # Whether the entry last returned comes after each bookmark
+        self.active = [index not in self.pending
+                       for index in range(len(cursor_files))]
+        self.passed = []
+        self.reader = reader
+        self.dry_run = dry_run
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # if an exception was thrown by the code using this
+        # context manager, don't update the cursors
+        if exc_type is not None:
+            return
+
+        if self.dry_run:
+            return
+
+        for cursor_file, cursor in zip(self.cursor_files, self.cursors):
+            write_cursor_file(cursor_file, cursor)
+
+    def __next__(self):
+        if self.first is None:
+            fields = self.reader.get_next()
+        else:
+            fields = self.first
+            self.first = None
+
+        if not fields and not self.dry_run:
+            (tail, fields) = catch_up(self.reader)
+            if tail:
+                log.debug("moving bookmarks on to the end of the journal")
+                self.cursors = [tail] * len(self.cursors)
+
+        if not fields:
+            raise StopIteration
+
+        for index in self.passed:
+            # The previous entry was the bookmarked one
+            self.active[index] = True
+
+        self.passed = []
+        cursor = fields.get('__CURSOR')
+        if cursor is None:
+            return fields
+
+        for index, pending in list(self.pending.items()):
+            if cursor == pending:
+                self.passed.append(index)
+                del self.pending[index]
+            elif cursor_precedes(pending, cursor):
+                self.active[index] = True
+                del self.pending[index]
+
+        for index, active in enumerate(self.active):
+            if active:
+                self.cursors[index] = cursor
+
         return fields
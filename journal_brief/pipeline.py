@@ -0,0 +1,201 @@
+"""
+Copyright (c) 2026 Tim Waugh <tim@cyberelk.net>
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+
+from collections import namedtuple
+from logging import getLogger
+import queue
+import threading
+
+
+log = getLogger(__name__)
+
+# Marks the end of the entries or output in a queue
+END = object()
+
+# An exception raised by the reader thread, passed to the filter stage
+Failure = namedtuple('Failure', ['exception'])
+
+
+class OutputChunk(object):
+    """
+    Collects the output written while formatting one entry
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(data)
+
+    def getvalue(self):
+        return ''.join(self.parts)
+
+
+class Pipeline(object):
+    """
+    Read, filter and write journal entries in separate threads
+
+    A reader thread takes entries from the JournalFilter's iterator
+    and puts them on a bounded queue. The calling thread filters and
+    formats them, putting the output for each on a second bounded
+    queue. A writer thread takes the output from that queue and
+    writes it to the stream. When either queue is full, the stage
+    filling it waits, so only a limited number of entries are ever
+    read ahead of those written.
+
+    Reading from the journal, filtering and writing can then overlap.
+    Output is written in the same order as without a pipeline.
+    """
+
+    QUEUE_SIZE = 256
+
+    # How often to check whether to stop while waiting for a full
+    # queue, in seconds
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, jfilter, queue_size=None):
+        """
+        Constructor
+
+        :param jfilter: JournalFilter instance
+        :param queue_size: int, entries each queue can hold
+        """
+        self.jfilter = jfilter
+        self.queue_size = queue_size or self.QUEUE_SIZE
+        self.stopping = threading.Event()
+        self.write_error = None
+
+    def put(self, items, item):
+        """
+        Add to a queue, waiting for room unless the pipeline is stopping
+
+        :param items: queue.Queue instance
+        :param item: object to add
+        :return: bool, whether it was added
+        """
+        while not self.stopping.is_set():
+            try:
+                items.put(item, timeout=self.POLL_INTERVAL)
+            except queue.Full:
+                continue
+
+            return True
+
+        return False
+
+    def read(self, entries):
+        """
+        Reader thread: queue entries from the iterator
+
+        :param entries: queue.Queue instance
+        """
+        try:
+            for entry in self.jfilter.iterator:
+                if not self.put(entries, entry):
+                    return
+        except BaseException as ex:
+            self.put(entries, Failure(ex))
+        finally:
+            self.put(entries, END)
+
+    def write(self, output, stream, checkpoints):
+        """
+        Writer thread: write queued output
+
+        :param output: queue.Queue instance, (str, cursor) tuples
+        :param stream: file-like object to write to
+        :param checkpoints: LatestJournalEntries instance, or None
+        """
+        while True:
+            item = output.get()
+            if item is END:
+                return
+
+            if self.write_error is not None:
+                # Keep taking output so that the filter stage does not
+                # wait for room forever
+                continue
+
+            (data, cursor) = item
+            try:
+                stream.write(data)
+                if (checkpoints is not None and cursor is not None and
+                        checkpoints.checkpoint_due()):
+                    # The output up to this entry has been written
+                    stream.flush()
+                    checkpoints.checkpoint(cursor)
+            except BaseException as ex:
+                self.write_error = ex
+
+    def format(self, stream, checkpoints=None):
+        """
+        Format the entries from the JournalFilter's iterator
+
+        :param stream: file-like object to write formatted entries to
+        :param checkpoints: LatestJournalEntries instance, to save its
+        cursor from time to time once the output so far is written
+        """
+        jfilter = self.jfilter
+        if (checkpoints is not None and
+                not all(formatter.STREAMING
+                        for formatter in jfilter.formatters)):
+            log.debug("not checkpointing: output is not streamed")
+            checkpoints = None
+
+        entries = queue.Queue(self.queue_size)
+        output = queue.Queue(self.queue_size)
+        reader = threading.Thread(target=self.read, args=(entries,),
+                                  name='journal-brief-reader', daemon=True)
+        writer = threading.Thread(target=self.write,
+                                  args=(output, stream, checkpoints),
+                                  name='journal-brief-writer', daemon=True)
+        self.stopping.clear()
+        self.write_error = None
+        reader.start()
+        writer.start()
+        finished = False
+        try:
+            while self.write_error is None:
+                entry = entries.get()
+                if entry is END:
+                    finished = True
+                    break
+
+                if isinstance(entry, Failure):
+                    raise entry.exception
+
+                chunk = OutputChunk()
+                jfilter.format_entry(chunk, entry)
+                output.put((chunk.getvalue(), entry.get('__CURSOR')))
+        finally:
+            try:
+                chunk = OutputChunk()
+                jfilter.flush(chunk)
+                output.put((chunk.getvalue(), None))
+            finally:
+                output.put(END)
+                writer.join()
+                if finished:
+                    reader.join()
+                else:
+                    # The reader thread stops once it next has an
+                    # entry to queue
+                    self.stopping.set()
+
+        if self.write_error is not None:
+            raise self.write_error
@@ -16,11 +16,19 @@ Copyright (c) 2015, 2020 Tim Waugh <tim@cyberelk.net>
 ## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
 """
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from flexmock import flexmock
 from journal_brief.cli.constants import (EMAIL_SUPPRESS_EMPTY_TEXT,
-                                         EMAIL_DRY_RUN_SEPARATOR)
-from journal_brief.cli.main import CLI
+                                         EMAIL_DRY_RUN_SEPARATOR,
+                                         BACKLOG_REMAINING_TEXT)
+from journal_brief import SelectiveReader
+from journal_brief.boots import Boot
+from journal_brief.cli.main import CLI, parse_time
+import journal_brief.cli.main
+import journal_brief.parallel
+from journal_brief.filter import Exclusion
+from journal_brief.history import ExclusionHistory
+from journal_brief.journal_brief import Rule
 import json
 import logging
 import os
@@ -52,11 +60,23 @@ def build_config_and_cursor(tmp_path):
             yield write_config
 
 
+# Reads only the fields asked for
+SELECTIVE_GET_NEXT = SelectiveReader.get_next
+
+
+@pytest.fixture(autouse=True)
+def whole_entries(monkeypatch):
+    # Entries are provided by mocking journal.Reader.get_next(), so
+    # don't read individual fields
+    monkeypatch.delattr(SelectiveReader, 'get_next')
+
+
 @pytest.fixture
 def missing_or_empty_cursor():
+    # Also used to move the bookmark on past entries not selected
     (flexmock(journal.Reader)
         .should_receive('seek_tail')
-        .once())
+        .at_least().once())
     (flexmock(journal.Reader)
         .should_receive('get_previous')
         .and_return({'__CURSOR': '0'}))
@@ -99,6 +119,322 @@ class TestCLI(object):
         assert not err
         assert len(out.splitlines()) == 2
 
+    def test_max_entries(self, capsys, build_config_and_cursor, missing_or_empty_cursor):
+        (flexmock(journal.Reader, add_match=None, add_disjunction=None)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1', 'MESSAGE': 'message1'})
+            .and_return({'__CURSOR': '2', 'MESSAGE': 'message2'})
+            .and_return({'__CURSOR': '3', 'MESSAGE': 'message3'})
+            .and_return({}))
+
+        (configfile, cursorfile) = build_config_and_cursor()
+        cli = CLI(args=['--conf', configfile.name, '-o', 'cat',
+                        '--max-entries', '2'])
+        cli.run()
+
+        (out, err) = capsys.readouterr()
+        assert not err
+        assert out == 'message1\nmessage2\n' + BACKLOG_REMAINING_TEXT.format(2)
+        with open(cursorfile.name, 'rt') as fp:
+            assert fp.read() == '2'
+
+    def test_max_entries_at_end(self, capsys, build_config_and_cursor,
+                                missing_or_empty_cursor):
+        (flexmock(journal.Reader, add_match=None, add_disjunction=None)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1', 'MESSAGE': 'message1'})
+            .and_return({'__CURSOR': '2', 'MESSAGE': 'message2'})
+            .and_return({})
+            .and_return({}))
+
+        (configfile, cursorfile) = build_config_and_cursor()
+        cli = CLI(args=['--conf', configfile.name, '-o', 'cat',
+                        '--max-entries', '2'])
+        cli.run()
+
+        # No backlog is left
+        (out, err) = capsys.readouterr()
+        assert not err
+        assert out == 'message1\nmessage2\n'
+
+    def test_follow(self, capsys, build_config_and_cursor, missing_or_empty_cursor):
+        (flexmock(journal.Reader, add_match=None, add_disjunction=None)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1', 'MESSAGE': 'message1'})
+            .and_return({'__CURSOR': '2', 'MESSAGE': 'message2'})
+            .and_return({'__CURSOR': '3', 'MESSAGE': 'message3'})
+            .and_return({}))
+        (flexmock(journal.Reader)
+            .should_receive('wait')
+            .and_raise(KeyboardInterrupt))
+
+        (configfile, cursorfile) = build_config_and_cursor({
+            'output': 'cat',
+            'exclusions': [{'MESSAGE': ['message2']}],
+        })
+        cli = CLI(args=['--conf', configfile.name,
+                        'follow', '--entries', '2'])
+        with pytest.raises(KeyboardInterrupt):
+            cli.run()
+
+        # The second batch was interrupted, so the cursor and history
+        # are only saved for the first
+        (out, err) = capsys.readouterr()
+        assert out == 'message1\nmessage3\n'
+        with open(cursorfile.name, 'rt') as fp:
+            assert fp.read() == '2'
+
+        history = ExclusionHistory.for_cursor_file(cursorfile.name)
+        stats = history.get_statistics([Exclusion({'MESSAGE': ['message2']})])
+        assert stats[0].hits == 1
+        assert stats[0].evaluations == 2
+
+    def test_follow_jobs(self, capsys, build_config_and_cursor,
+                         missing_or_empty_cursor):
+        (flexmock(journal.Reader, add_match=None, add_disjunction=None)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1', 'MESSAGE': 'message1'})
+            .and_return({'__CURSOR': '2', 'MESSAGE': 'message2'})
+            .and_return({'__CURSOR': '3', 'MESSAGE': 'message3'})
+            .and_return({}))
+        (flexmock(journal.Reader)
+            .should_receive('wait')
+            .and_raise(KeyboardInterrupt))
+
+        # The worker processes are started once for every batch
+        pools = []
+        executor = journal_brief.parallel.ProcessPoolExecutor
+        (flexmock(journal_brief.parallel)
+            .should_receive('ProcessPoolExecutor')
+            .replace_with(lambda *args, **kwargs:
+                          pools.append(executor(*args, **kwargs)) or
+                          pools[-1]))
+
+        (configfile, cursorfile) = build_config_and_cursor({
+            'output': 'cat',
+            'exclusions': [{'MESSAGE': ['message2']}],
+        })
+        cli = CLI(args=['--conf', configfile.name, '--jobs', '2',
+                        'follow', '--entries', '2'])
+        with pytest.raises(KeyboardInterrupt):
+            cli.run()
+
+        # The second batch was interrupted while reading ahead
+        (out, err) = capsys.readouterr()
+        assert out == 'message1\n'
+        assert len(pools) == 1
+
+    def test_profiles(self, capsys, tmp_path):
+        def cursor(n):
+            return 's=1;i={0};b=2;m={0};t={0};x=0'.format(n)
+
+        confs = []
+        for name, n, config in [('a', 1, {'output': 'cat'}),
+                                ('b', 2, {'output': 'cat',
+                                          'priority': 'err'})]:
+            cursor_file = tmp_path / (name + '.cursor')
+            cursor_file.write_text(cursor(n))
+            config['cursor-file'] = str(cursor_file)
+            conf = tmp_path / (name + '.conf')
+            conf.write_text(yaml.dump(config))
+            confs.extend(['--conf', str(conf)])
+
+        (flexmock(journal.Reader)
+            .should_receive('seek_cursor')
+            .with_args(cursor(1))
+            .once())
+        # The journal has new entries after both bookmarks, and the
+        # earliest bookmark is found
+        flexmock(journal.Reader).should_receive('seek_tail')
+        (flexmock(journal.Reader)
+            .should_receive('get_previous')
+            .and_return({'__CURSOR': cursor(4)}))
+        (flexmock(journal.Reader)
+            .should_receive('test_cursor')
+            .replace_with(lambda bookmark: bookmark == cursor(1)))
+        (flexmock(journal.Reader, add_match=None, add_disjunction=None)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': cursor(1), 'MESSAGE': 'message1',
+                         'PRIORITY': '3'})
+            .and_return({'__CURSOR': cursor(2), 'MESSAGE': 'message2',
+                         'PRIORITY': '3'})
+            .and_return({'__CURSOR': cursor(3), 'MESSAGE': 'message3',
+                         'PRIORITY': '6'})
+            .and_return({'__CURSOR': cursor(4), 'MESSAGE': 'message4',
+                         'PRIORITY': '3'})
+            .and_return({}))
+        # Profile a wants every entry, so the journal is not filtered
+        # and profile b's priority is only checked here
+        (flexmock(journal.Reader)
+            .should_receive('log_level')
+            .never())
+
+        cli = CLI(args=confs)
+        cli.run()
+
+        (out, err) = capsys.readouterr()
+        assert not err
+        assert out == 'message2\nmessage3\nmessage4\nmessage4\n'
+        for name in ['a', 'b']:
+            assert (tmp_path / (name + '.cursor')).read_text() == cursor(4)
+
+    def test_profiles_fields(self, capsys, tmp_path, monkeypatch):
+        # Only the fields each profile needs are read, through
+        # SelectiveReader.get_next()
+        monkeypatch.setattr(SelectiveReader, 'get_next', SELECTIVE_GET_NEXT)
+
+        def cursor(n):
+            return 's=1;i={0};b=2;m={0};t={0};x=0'.format(n)
+
+        confs = []
+        for name, config in [('a', {'output': 'cat'}),
+                             ('b', {'output': 'cat', 'priority': 'err'})]:
+            cursor_file = tmp_path / (name + '.cursor')
+            cursor_file.write_text(cursor(1))
+            config['cursor-file'] = str(cursor_file)
+            conf = tmp_path / (name + '.conf')
+            conf.write_text(yaml.dump(config))
+            confs.extend(['--conf', str(conf)])
+
+        entries = [{'__CURSOR': cursor(1), 'MESSAGE': 'seen', 'PRIORITY': '3'},
+                   {'__CURSOR': cursor(2), 'MESSAGE': 'disk on fire',
+                    'PRIORITY': '3'},
+                   {'__CURSOR': cursor(3), 'MESSAGE': 'info', 'PRIORITY': '6'}]
+        position = [-1]
+        read = []
+
+        def next_entry(skip=1):
+            position[0] += skip
+            return position[0] < len(entries)
+
+        def get(field):
+            read.append(field)
+            return entries[position[0]][field]
+
+        flexmock(journal.Reader, add_match=None, add_disjunction=None,
+                 seek_cursor=None, seek_tail=None)
+        # Before reading, the position is -1: the tail
+        (flexmock(journal.Reader)
+            .should_receive('test_cursor')
+            .replace_with(lambda bookmark:
+                          bookmark == entries[position[0]]['__CURSOR']))
+        (flexmock(journal.Reader)
+            .should_receive('get_previous')
+            .and_return(entries[-1]))
+        flexmock(journal.Reader).should_receive('_next').replace_with(
+            next_entry)
+        flexmock(journal.Reader).should_receive('_get').replace_with(get)
+        flexmock(journal.Reader, _get_realtime=1, _get_monotonic=2)
+        (flexmock(journal.Reader)
+            .should_receive('_get_cursor')
+            .replace_with(lambda: entries[position[0]]['__CURSOR']))
+        (flexmock(journal.Reader)
+            .should_receive('_convert_field')
+            .replace_with(lambda field, value: value))
+        # Seeking to the bookmark happens before the fields are chosen
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .replace_with(lambda skip=1:
+                          entries[position[0]] if next_entry(skip) else {})
+            .once())
+
+        cli = CLI(args=confs)
+        cli.run()
+
+        (out, err) = capsys.readouterr()
+        assert out == 'disk on fire\ninfo\ndisk on fire\n'
+        assert set(read) == {'MESSAGE', 'PRIORITY'}
+
+    def test_get_selection(self):
+        assert CLI.get_selection([]) is None
+        selection = CLI.get_selection([
+            Rule(log_level=3, inclusion={'UNIT': ['a']}),
+            Rule(log_level=3, inclusion={'UNIT': ['b'], 'PRIORITY': [6]}),
+            Rule(log_level=None, inclusion={'UNIT': ['c']}),
+        ])
+        for entry, expected in [({'UNIT': 'a', 'PRIORITY': '3'}, True),
+                                ({'UNIT': 'a', 'PRIORITY': '4'}, False),
+                                ({'UNIT': 'b', 'PRIORITY': '6'}, True),
+                                ({'UNIT': 'b', 'PRIORITY': '2'}, True),
+                                ({'UNIT': 'b', 'PRIORITY': '5'}, False),
+                                ({'UNIT': 'c', 'PRIORITY': '7'}, True)]:
+            assert (selection.first_match(entry) is not None) == expected
+
+    def test_profiles_cursor_file(self, tmp_path):
+        conf = tmp_path / 'journal-brief.conf'
+        conf.write_text('output: cat\n')
+        cli = CLI(args=['--conf', str(conf), '--conf', str(conf)])
+        with pytest.raises(SystemExit):
+            cli.run()
+
+    @pytest.mark.parametrize('args', [
+        ['--max-entries', '0'],
+        ['--jobs', '0'],
+        ['--max-runtime', '-1'],
+        ['--max-entries', '1', '--export', '-'],
+        ['--export', '-', 'follow'],
+        ['--max-runtime', '1', 'follow'],
+        ['follow', '--interval', '0'],
+        ['follow', '--entries', '0'],
+        ['--conf', 'a', '--conf', 'b', 'stats'],
+        ['--conf', 'a', '--conf', 'b', '--export', '-'],
+        ['--conf', 'a', '--conf', 'b', '--boot', '-1'],
+        ['-b', '--boot', '0'],
+        ['--boot', '1', '--export', '-'],
+        ['--boot', '1', 'follow'],
+        ['--since', 'sometime'],
+        ['--since', 'today', '--until', 'yesterday'],
+        ['--since', 'today', '--export', '-'],
+        ['--until', 'now', 'follow'],
+        ['--conf', 'a', '--conf', 'b', '--since', 'today'],
+        ['--last', '0'],
+        ['--last', '1', '--export', '-'],
+        ['--last', '1', 'stats'],
+        ['--last', '1', '--jobs', '2'],
+        ['--conf', 'a', '--conf', 'b', '--last', '1'],
+    ])
+    def test_bad_budget(self, args):
+        with pytest.raises(SystemExit):
+            CLI.get_args(args)
+
+    def test_pipeline(self, capsys, build_config_and_cursor, missing_or_empty_cursor):
+        (flexmock(journal.Reader, add_match=None, add_disjunction=None)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1', 'MESSAGE': 'message1'})
+            .and_return({'__CURSOR': '2', 'MESSAGE': 'message2'})
+            .and_return({}))
+
+        (configfile, cursorfile) = build_config_and_cursor({
+            'output': 'cat',
+            'pipeline': True,
+        })
+        cli = CLI(args=['--conf', configfile.name])
+        cli.run()
+
+        (out, err) = capsys.readouterr()
+        assert not err
+        assert out == 'message1\nmessage2\n'
+        with open(cursorfile.name, 'rt') as fp:
+            assert fp.read() == '2'
+
+    def test_jobs(self, capsys, build_config_and_cursor, missing_or_empty_cursor):
+        (flexmock(journal.Reader, add_match=None, add_disjunction=None)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1', 'MESSAGE': 'message1'})
+            .and_return({'__CURSOR': '2', 'MESSAGE': 'message2'})
+            .and_return({}))
+
+        (configfile, cursorfile) = build_config_and_cursor({
+            'output': 'cat',
+            'exclusions': [{'MESSAGE': ['/.*1/']}],
+        })
+        cli = CLI(args=['--conf', configfile.name, '--jobs', '2'])
+        cli.run()
+
+        (out, err) = capsys.readouterr()
+        assert not err
+        assert out == 'message2\n'
+
     def test_dry_run(self, build_config_and_cursor):
         (flexmock(journal.Reader, add_match=None, add_disjunction=None)
             .should_receive('get_next')
@@ -123,7 +459,10 @@ class TestCLI(object):
             .and_return({'__CURSOR': final_cursor,
                          '__REALTIME_TIMESTAMP': datetime.now(),
                          'MESSAGE': 'message'})
+            .and_return({})
             .and_return({}))
+        flexmock(journal.Reader, seek_tail=None,
+                 get_previous={'__CURSOR': final_cursor})
 
         (configfile, cursorfile) = build_config_and_cursor()
         cursorfile.write(final_cursor)
@@ -133,12 +472,189 @@ class TestCLI(object):
         cursorfile.seek(0)
         assert cursorfile.read() == final_cursor
 
-    def test_log_level(self, build_config_and_cursor, missing_or_empty_cursor):
+    def test_boot(self, capsys, build_config_and_cursor):
+        boots = flexmock(find=lambda boot: Boot('b2', 1, 2))
+        flexmock(journal_brief.cli.main).should_receive('BootIndex').and_return(boots)
         flexmock(journal.Reader, add_match=None, add_disjunction=None)
         (flexmock(journal.Reader)
-            .should_receive('log_level')
-            .with_args(journal.LOG_ERR)
+            .should_receive('this_boot')
+            .with_args('b2')
             .once())
+        flexmock(journal.Reader).should_receive('seek_cursor').never()
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '2',
+                         '__REALTIME_TIMESTAMP': datetime.now(),
+                         'MESSAGE': 'message'})
+            .and_return({}))
+
+        (configfile, cursorfile) = build_config_and_cursor()
+        cursorfile.write('1')
+        cursorfile.flush()
+        cli = CLI(args=['--conf', configfile.name, '--boot', '-1'])
+        cli.run()
+        (out, err) = capsys.readouterr()
+        assert 'message' in out
+
+        # The bookmark and statistics are left alone
+        with open(cursorfile.name, 'rt') as fp:
+            assert fp.read() == '1'
+
+        assert not os.path.exists(cursorfile.name + ExclusionHistory.SUFFIX)
+
+    def test_time_range(self, capsys, build_config_and_cursor):
+        flexmock(journal.Reader, add_match=None, add_disjunction=None)
+        since = datetime(2026, 1, 1, 2, 0)
+        (flexmock(journal.Reader)
+            .should_receive('seek_realtime')
+            .with_args(since)
+            .once())
+        flexmock(journal.Reader).should_receive('seek_cursor').never()
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '2',
+                         '__REALTIME_TIMESTAMP': since,
+                         'MESSAGE': 'inside'})
+            .and_return({'__CURSOR': '3',
+                         '__REALTIME_TIMESTAMP': datetime(2026, 1, 1, 5, 0),
+                         'MESSAGE': 'outside'})
+            .and_return({}))
+
+        (configfile, cursorfile) = build_config_and_cursor()
+        cursorfile.write('1')
+        cursorfile.flush()
+        cli = CLI(args=['--conf', configfile.name, '-o', 'cat',
+                        '--since', '2026-01-01 02:00',
+                        '--until', '2026-01-01 04:00'])
+        cli.run()
+        (out, err) = capsys.readouterr()
+        assert out == 'inside\n'
+        with open(cursorfile.name, 'rt') as fp:
+            assert fp.read() == '1'
+
+    def test_last(self, capsys, build_config_and_cursor):
+        flexmock(journal.Reader, add_match=None, add_disjunction=None)
+        flexmock(journal.Reader).should_receive('seek_tail').once()
+        flexmock(journal.Reader).should_receive('seek_cursor').never()
+        (flexmock(journal.Reader)
+            .should_receive('get_previous')
+            .and_return({'__CURSOR': '4', 'MESSAGE': 'message 4'})
+            .and_return({'__CURSOR': '3', 'MESSAGE': 'exclude'})
+            .and_return({'__CURSOR': '2', 'MESSAGE': 'message 2'})
+            .and_return({'__CURSOR': '1', 'MESSAGE': 'message 1'})
+            .and_return({}))
+
+        (configfile, cursorfile) = build_config_and_cursor(
+            'exclusions:\n- MESSAGE: [exclude]\n')
+        cursorfile.write('0')
+        cursorfile.flush()
+        cli = CLI(args=['--conf', configfile.name, '-o', 'cat',
+                        '--last', '2'])
+        cli.run()
+        (out, err) = capsys.readouterr()
+        assert out == 'message 2\nmessage 4\n'
+        with open(cursorfile.name, 'rt') as fp:
+            assert fp.read() == '0'
+
+        assert not os.path.exists(cursorfile.name + ExclusionHistory.SUFFIX)
+
+    def test_no_boot(self, capsys, build_config_and_cursor):
+        boots = flexmock(find=lambda boot: Boot('b2', 1, 2))
+        boots.should_receive('find').and_raise(ValueError("no boot '5'"))
+        flexmock(journal_brief.cli.main).should_receive('BootIndex').and_return(boots)
+        (configfile, cursorfile) = build_config_and_cursor()
+        cli = CLI(args=['--conf', configfile.name, '--boot', '5'])
+        with pytest.raises(SystemExit):
+            cli.run()
+
+        (out, err) = capsys.readouterr()
+        assert "no boot '5'" in err
+
+    @pytest.mark.parametrize(('args', 'config', 'nothing_new'), [
+        ([], None, True),
+        ([], {'email': {'command': 'true', 'from': 'F', 'to': 'T'}}, True),
+        ([], {'email': {'command': 'true', 'from': 'F', 'to': 'T',
+                        'suppress_empty': False}}, False),
+        (['-b'], None, False),
+        (['stats'], None, False),
+        (['--last', '1'], None, False),
+    ])
+    def test_nothing_new(self, build_config_and_cursor, args, config,
+                         nothing_new):
+        (configfile, cursorfile) = build_config_and_cursor(config)
+        cursorfile.write('1')
+        cursorfile.flush()
+        flexmock(journal.Reader).should_receive('seek_tail')
+        (flexmock(journal.Reader)
+            .should_receive('get_previous')
+            .and_return({'__CURSOR': '1'}))
+        (flexmock(journal.Reader)
+            .should_receive('test_cursor')
+            .with_args('1')
+            .and_return(True))
+        cli = CLI(args=['--conf', configfile.name] + args)
+        cli.handle_options()
+        assert cli.nothing_new() == nothing_new
+
+    def test_nothing_new_run(self, capsys, build_config_and_cursor):
+        (configfile, cursorfile) = build_config_and_cursor()
+        cursorfile.write('1')
+        cursorfile.flush()
+        flexmock(journal.Reader).should_receive('seek_tail').once()
+        (flexmock(journal.Reader)
+            .should_receive('get_previous')
+            .and_return({'__CURSOR': '1'}))
+        flexmock(journal.Reader).should_receive('test_cursor').and_return(True)
+        flexmock(journal.Reader).should_receive('close')
+
+        # No rules are built, and the journal is not filtered
+        flexmock(CLI).should_receive('get_formatters').never()
+        flexmock(journal.Reader).should_receive('add_match').never()
+        flexmock(journal.Reader).should_receive('get_next').never()
+
+        cli = CLI(args=['--conf', configfile.name])
+        cli.run()
+        (out, err) = capsys.readouterr()
+        assert not out
+        assert not os.path.exists(cursorfile.name + ExclusionHistory.SUFFIX)
+
+    def test_nothing_new_filtered(self, capsys, build_config_and_cursor):
+        (configfile, cursorfile) = build_config_and_cursor({'priority': 'err'})
+        flexmock(journal.Reader, add_match=None, add_disjunction=None,
+                 seek_tail=None, close=None)
+
+        # The last entry in the journal, '2', is not selected
+        (flexmock(journal.Reader)
+            .should_receive('get_previous')
+            .and_return({'__CURSOR': '2'}))
+        (flexmock(journal.Reader)
+            .should_receive('test_cursor')
+            .replace_with(lambda cursor: cursor == '2'))
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1',
+                         '__REALTIME_TIMESTAMP': datetime.now(),
+                         'PRIORITY': 3,
+                         'MESSAGE': 'message'})
+            .and_return({})
+            .and_return({}))
+        CLI(args=['--conf', configfile.name, '-o', 'cat']).run()
+        (out, err) = capsys.readouterr()
+        assert out == 'message\n'
+        with open(cursorfile.name) as fp:
+            assert fp.read() == '2'
+
+        flexmock(journal.Reader).should_receive('get_next').never()
+        cli = CLI(args=['--conf', configfile.name, '-o', 'cat'])
+        assert cli.handle_options() is False
+        assert cli.nothing_new()
+
+    def test_log_level(self, build_config_and_cursor, missing_or_empty_cursor):
+        matches = []
+        flexmock(journal.Reader, add_disjunction=None)
+        (flexmock(journal.Reader)
+            .should_receive('add_match')
+            .replace_with(lambda **kwargs: matches.append(kwargs)))
         (flexmock(journal.Reader)
             .should_receive('get_next')
             .and_return({}))
@@ -146,6 +662,8 @@ class TestCLI(object):
         (configfile, cursorfile) = build_config_and_cursor()
         cli = CLI(args=['--conf', configfile.name, '-p', 'err'])
         cli.run()
+        assert matches == [{'PRIORITY': str(priority)}
+                           for priority in range(journal.LOG_ERR + 1)]
 
     def test_reset(self, build_config_and_cursor):
         (configfile, cursorfile) = build_config_and_cursor()
@@ -185,6 +703,98 @@ exclusions:
                                  "         1  {'MESSAGE': ['exclude']}",
                                  ""])
 
+    def test_prune_fields(self, capsys, build_config_and_cursor,
+                          missing_or_empty_cursor):
+        (flexmock(journal.Reader, add_match=None, add_disjunction=None)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1',
+                         '__REALTIME_TIMESTAMP': datetime.now(),
+                         'MESSAGE': 'exclude',
+                         'SYSLOG_IDENTIFIER': 'a'})
+            .and_return({}))
+        (flexmock(journal.Reader)
+            .should_receive('query_unique')
+            .with_args('SYSLOG_IDENTIFIER')
+            .and_return({'a'})
+            .once())
+
+        (configfile, cursorfile) = build_config_and_cursor("""
+prune-fields: [SYSLOG_IDENTIFIER, _SYSTEMD_UNIT]
+exclusions:
+- SYSLOG_IDENTIFIER: [b]
+- MESSAGE: [exclude]
+""")
+        cli = CLI(args=['--conf', configfile.name, 'stats'])
+        cli.run()
+
+        (out, err) = capsys.readouterr()
+        assert not err
+        assert out == "\n".join([" FREQUENCY  EXCLUSION",
+                                 "         1  {'MESSAGE': ['exclude']}",
+                                 "         0  {'SYSLOG_IDENTIFIER': ['b']}",
+                                 ""])
+
+    def test_history(self, build_config_and_cursor, missing_or_empty_cursor):
+        entry = {'__CURSOR': '1',
+                 '__REALTIME_TIMESTAMP': datetime.now(),
+                 'MESSAGE': 'exclude'}
+        (flexmock(journal.Reader, add_match=None, add_disjunction=None)
+            .should_receive('get_next')
+            .and_return(entry)
+            .and_return({})
+            .and_return(entry)
+            .and_return({}))
+
+        (configfile, cursorfile) = build_config_and_cursor("""
+exclusions:
+- MESSAGE: [exclude]
+""")
+        cli = CLI(args=['--conf', configfile.name, '--dry-run'])
+        cli.run()
+        assert not os.access(cursorfile.name + '.history', os.F_OK)
+
+        cli = CLI(args=['--conf', configfile.name])
+        cli.run()
+        with open(cursorfile.name + '.history') as fp:
+            history = json.load(fp)
+
+        assert [record['hits']
+                for record in history['exclusions'].values()] == [1]
+
+    def test_stats_history(self, capsys, build_config_and_cursor):
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .never())
+
+        (configfile, cursorfile) = build_config_and_cursor("""
+exclusions:
+- MESSAGE: [exclude]
+- MESSAGE: [include]
+""")
+        history = {
+            'version': 1,
+            'exclusions': {
+                Exclusion({'MESSAGE': ['exclude']}).fingerprint(): {
+                    'hits': 3,
+                    'evaluations': 7,
+                    'last_hit': datetime(2020, 1, 2, 3, 4, 5).timestamp(),
+                },
+            },
+        }
+        with open(cursorfile.name + '.history', 'wt') as fp:
+            json.dump(history, fp)
+
+        cli = CLI(args=['--conf', configfile.name, 'stats', '--history'])
+        cli.run()
+
+        (out, err) = capsys.readouterr()
+        assert not err
+        assert out == "\n".join([
+            " FREQUENCY   EVALUATED  LAST HIT         EXCLUSION",
+            "         3           7  Jan 02 03:04:05  {'MESSAGE': ['exclude']}",
+            "         0           0  never            {'MESSAGE': ['include']}",
+            ""])
+
     def test_debrief(self, capsys, build_config_and_cursor, missing_or_empty_cursor):
         entries = [
             {'__CURSOR': '1',
@@ -313,6 +923,67 @@ inclusions:
         # And nothing else
         assert len(watcher.calls) == 9
 
+    @pytest.mark.parametrize(('output', 'cmd', 'units'), [
+        ('cat', [], ['b.service']),
+        ('cat', ['stats'], ['a.service', 'b.service']),
+        ('reboot,cat', [], ['b.service']),
+        # The login formatter has its own rules
+        ('login,cat', [], ['a.service', 'b.service']),
+    ])
+    def test_pushdown_fields(self, build_config_and_cursor,
+                             missing_or_empty_cursor, output, cmd, units):
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({}))
+        watcher = Watcher()
+        (flexmock(journal.Reader)
+            .should_receive('add_match')
+            .replace_with(watcher.watch_call('add_match')))
+        (flexmock(journal.Reader)
+            .should_receive('add_disjunction')
+            .replace_with(watcher.watch_call('add_disjunction')))
+
+        (configfile, cursorfile) = build_config_and_cursor("""
+pushdown-fields: [_SYSTEMD_UNIT]
+inclusions:
+- _SYSTEMD_UNIT: [a.service, b.service]
+exclusions:
+- _SYSTEMD_UNIT: [a.service]
+""")
+        cli = CLI(args=['--conf', configfile.name, '-o', output] + cmd)
+        cli.run()
+        matches = [kwargs for (call, args, kwargs) in watcher.calls
+                   if call == 'add_match' and '_SYSTEMD_UNIT' in kwargs]
+        assert matches == [str({'_SYSTEMD_UNIT': unit}) for unit in units]
+
+    @pytest.mark.parametrize(('formats', 'fields'), [
+        ('reboot,cat', {'_BOOT_ID', 'MESSAGE',
+                        '_SYSTEMD_UNIT', 'SYSLOG_IDENTIFIER'}),
+        ('cat,json', None),
+    ])
+    def test_fields(self, build_config_and_cursor, missing_or_empty_cursor,
+                    formats, fields):
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({}))
+        calls = []
+        (flexmock(SelectiveReader)
+            .should_receive('set_fields')
+            .replace_with(calls.append))
+        flexmock(journal.Reader).should_receive('add_match')
+
+        (configfile, cursorfile) = build_config_and_cursor("""
+inclusions:
+- _SYSTEMD_UNIT: [myservice.service]
+exclusions:
+- SYSLOG_IDENTIFIER: [noisy]
+""")
+        cli = CLI(args=['--conf', configfile.name, '-o', formats])
+        cli.run()
+
+        # Once from the constructor, then once the filter is known
+        assert calls == [None, fields]
+
     def test_multiple_output_formats_cli(self, capsys, build_config_and_cursor, missing_or_empty_cursor):
         entry = {
             '__CURSOR': '1',
@@ -388,6 +1059,7 @@ output:
         (flexmock(journal.Reader, add_match=None, add_disjunction=None)
             .should_receive('get_next')
             .and_return(entry)
+            .and_return({})
             .and_return({}))
 
         (configfile, cursorfile) = build_config_and_cursor()
@@ -399,6 +1071,37 @@ output:
         assert not err
         assert out
 
+    def test_export(self, capsys, tmp_path, build_config_and_cursor):
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .never())
+        exportfile = tmp_path / 'export'
+        exportfile.write_bytes(b'__CURSOR=1\n'
+                               b'MESSAGE=include\n'
+                               b'\n'
+                               b'__CURSOR=2\n'
+                               b'MESSAGE=exclude\n'
+                               b'\n')
+
+        (configfile, cursorfile) = build_config_and_cursor("""
+exclusions:
+- MESSAGE: [exclude]
+""")
+        cli = CLI(args=['--conf', configfile.name,
+                        '--export', str(exportfile),
+                        '-o', 'cat'])
+        cli.run()
+
+        (out, err) = capsys.readouterr()
+        assert not err
+        assert out == 'include\n'
+
+        # The cursor bookmark is not used, nor are the statistics
+        # updated
+        cursorfile.seek(0)
+        assert not cursorfile.read()
+        assert not os.path.exists(cursorfile.name + ExclusionHistory.SUFFIX)
+
     def test_help_output(self, capsys):
         cli = CLI(args=['--help-output'])
         cli.run()
@@ -822,3 +1525,37 @@ class TestCLIEmailSMTP(TestCLIEmailBase):
 
         assert mocker.call.login(self.TEST_USER, self.TEST_PASSWORD) == self.smtp_context.method_calls[0]
         assert 'send_message' == self.smtp_context.method_calls[1][0]
+
+
+NOW = datetime(2026, 3, 4, 12, 30, 15)
+
+
+@pytest.mark.parametrize(('value', 'expected'), [
+    ('2026-01-02', datetime(2026, 1, 2)),
+    ('2026-01-02 03:04', datetime(2026, 1, 2, 3, 4)),
+    ('2026-01-02 03:04:05', datetime(2026, 1, 2, 3, 4, 5)),
+    ('02:00', datetime(2026, 3, 4, 2, 0)),
+    ('now', NOW),
+    ('today', datetime(2026, 3, 4)),
+    ('yesterday 02:00', datetime(2026, 3, 3, 2, 0)),
+    ('tomorrow 04:00:30', datetime(2026, 3, 5, 4, 0, 30)),
+    ('-2h', NOW - timedelta(hours=2)),
+    ('+30min', NOW + timedelta(minutes=30)),
+    ('-1d', NOW - timedelta(days=1)),
+    ('2h ago', NOW - timedelta(hours=2)),
+    ('30 min ago', NOW - timedelta(minutes=30)),
+])
+def test_parse_time(value, expected):
+    assert parse_time(value, now=NOW) == expected
+
+
+@pytest.mark.parametrize('args', [
+    ['--since', '2h ago'],
+    ['--since=-2h'],
+])
+def test_relative_time_args(args):
+    before = datetime.now()
+    since = CLI.get_args(args).since
+    after = datetime.now()
+    assert (before - timedelta(hours=2) <= since <=
+            after - timedelta(hours=2))
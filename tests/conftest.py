@@ -0,0 +1,60 @@
+"""
+Copyright (c) 2026 Tim Waugh <tim@cyberelk.net>
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+
+from io import StringIO
+import pytest
+
+
+class CheckpointRecorder(object):
+    """
+    Checkpoints wanted after every entry, recording the output so far
+    """
+
+    def __init__(self):
+        self.output = StringIO()
+        self.saved = []
+
+    def checkpoint_due(self):
+        return True
+
+    def checkpoint(self, cursor=None):
+        self.saved.append((cursor, self.output.getvalue()))
+
+
+@pytest.fixture
+def make_entries():
+    """
+    Factory for journal entries numbered from 0
+
+    Each entry has __CURSOR, __REALTIME_TIMESTAMP and MESSAGE fields
+    from its number, and any further fields given as callables
+    taking the number.
+    """
+    def entries(count, **fields):
+        return [dict({'__CURSOR': str(n),
+                      '__REALTIME_TIMESTAMP': n,
+                      'MESSAGE': 'message {0}'.format(n)},
+                     **{field: value(n) for field, value in fields.items()})
+                for n in range(count)]
+
+    return entries
+
+
+@pytest.fixture
+def checkpoints():
+    return CheckpointRecorder()
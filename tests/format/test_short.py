@@ -18,6 +18,7 @@ Copyright (c) 2015 Tim Waugh <tim@cyberelk.net>
 
 from datetime import datetime, timezone, timedelta
 from journal_brief.format import get_formatter
+from journal_brief.journal_brief import TruncatedValue
 import journal_brief.format.short  # registers class; # noqa: F401
 import pytest
 
@@ -65,6 +66,10 @@ class TestShortEntryFormatter(object):
           '_PID': '1',
           'MESSAGE': 'message'},
          'host syslogid[1]: message\n'),
+
+        ({'_HOSTNAME': 'host',
+          'MESSAGE': TruncatedValue('mess')},
+         'host ?: mess [...]\n'),
     ])
     def test_format(self, entry, expected):
         entry['__REALTIME_TIMESTAMP'] = datetime.fromtimestamp(0,
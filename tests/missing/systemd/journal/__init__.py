@@ -31,7 +31,7 @@ class Reader(Iterator):
 
         return entry
 
-    def this_boot(self):
+    def this_boot(self, bootid=None):
         raise RuntimeError
 
     def log_level(self, level):
@@ -49,12 +49,51 @@ class Reader(Iterator):
     def seek_cursor(self, cursor):
         raise RuntimeError
 
+    def test_cursor(self, cursor):
+        raise RuntimeError
+
     def seek_tail(self):
         raise RuntimeError
 
+    def seek_head(self):
+        raise RuntimeError
+
+    def seek_realtime(self, realtime):
+        raise RuntimeError
+
+    def flush_matches(self):
+        raise RuntimeError
+
+    def wait(self, timeout=None):
+        raise RuntimeError
+
+    def query_unique(self, field):
+        raise RuntimeError
+
     def close(self):
         pass
 
+    def _next(self, skip=1):
+        raise RuntimeError
+
+    def _get(self, field):
+        raise RuntimeError
+
+    def _get_realtime(self):
+        raise RuntimeError
+
+    def _get_monotonic(self):
+        raise RuntimeError
+
+    def _get_cursor(self):
+        raise RuntimeError
+
+    def _convert_field(self, key, value):
+        raise RuntimeError
+
+    def _convert_entry(self, entry):
+        raise RuntimeError
+
 
 class Monotonic(object):
     def __init__(self, init_tuple):
@@ -0,0 +1,104 @@
+"""
+Copyright (c) 2026 Tim Waugh <tim@cyberelk.net>
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+
+from tests.util import maybe_mock_systemd
+maybe_mock_systemd()
+
+import asyncio
+from flexmock import flexmock
+from journal_brief.aio import AsyncLatestJournalEntries, AsyncJournalFilter
+from journal_brief.format import EntryFormatter
+import pytest
+from systemd import journal
+
+
+class MemoryStream(object):
+    def __init__(self):
+        self.data = b''
+        self.drained = 0
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        self.drained += 1
+
+
+@pytest.fixture
+def cursor_file(tmp_path):
+    path = tmp_path / 'cursor'
+    path.write_text('0')
+    return path
+
+
+@pytest.fixture
+def three_entries():
+    (flexmock(journal.Reader)
+        .should_receive('seek_cursor')
+        .with_args('0')
+        .once())
+    flexmock(journal.Reader).should_receive('test_cursor').and_return(True)
+    (flexmock(journal.Reader)
+        .should_receive('get_next')
+        .and_return({'__CURSOR': '0'})
+        .and_return({'__CURSOR': '1', 'MESSAGE': 'message1'})
+        .and_return({'__CURSOR': '2', 'MESSAGE': 'message2'})
+        .and_return({'__CURSOR': '3', 'MESSAGE': 'message3'})
+        .and_return({}))
+
+
+class TestAsyncLatestJournalEntries(object):
+    @pytest.mark.parametrize('batch_size', [1, 2, 3, None])
+    def test_iterate(self, cursor_file, three_entries, batch_size):
+        async def read():
+            async with AsyncLatestJournalEntries(
+                    batch_size=batch_size,
+                    cursor_file=str(cursor_file)) as entries:
+                return [entry['MESSAGE'] async for entry in entries]
+
+        assert asyncio.run(read()) == ['message1', 'message2', 'message3']
+        assert cursor_file.read_text() == '3'
+
+    def test_stop_early(self, cursor_file, three_entries):
+        async def read():
+            async with AsyncLatestJournalEntries(
+                    batch_size=2,
+                    cursor_file=str(cursor_file)) as entries:
+                async for entry in entries:
+                    break
+
+        asyncio.run(read())
+        assert cursor_file.read_text() == '1'
+
+
+class TestAsyncJournalFilter(object):
+    def test_format(self, cursor_file, three_entries):
+        stream = MemoryStream()
+
+        async def brief():
+            async with AsyncLatestJournalEntries(
+                    cursor_file=str(cursor_file)) as entries:
+                jfilter = AsyncJournalFilter(
+                    entries, [EntryFormatter()],
+                    default_exclusions=[{'MESSAGE': ['message2']}])
+                await jfilter.format(stream)
+
+        asyncio.run(brief())
+        assert stream.data == b'message1\nmessage3\n'
+        assert stream.drained
+        assert cursor_file.read_text() == '3'
@@ -0,0 +1,94 @@
+"""
+Copyright (c) 2026 Tim Waugh <tim@cyberelk.net>
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+
+from tests.util import maybe_mock_systemd
+maybe_mock_systemd()
+
+from journal_brief.boots import Boot, BootIndex
+import pytest
+import uuid
+
+
+BOOT_IDS = [uuid.UUID(int=n).hex for n in range(3)]
+
+
+class FakeReader(object):
+    """
+    Just enough of systemd.journal.Reader to build a boot index
+    """
+
+    def __init__(self, boots):
+        self.boots = boots  # boot ID -> (first, last)
+        self.boot_id = None
+
+    def query_unique(self, field):
+        assert field == '_BOOT_ID'
+        return set(self.boots)
+
+    def flush_matches(self):
+        self.boot_id = None
+
+    def this_boot(self, boot_id):
+        self.boot_id = boot_id
+
+    def seek_head(self):
+        pass
+
+    def seek_tail(self):
+        pass
+
+    def get_next(self):
+        return {'__REALTIME_TIMESTAMP': self.boots[self.boot_id][0]}
+
+    def get_previous(self):
+        return {'__REALTIME_TIMESTAMP': self.boots[self.boot_id][1]}
+
+
+@pytest.fixture
+def boots():
+    reader = FakeReader({
+        BOOT_IDS[2]: (30, 40),
+        BOOT_IDS[0]: (1, 10),
+        BOOT_IDS[1]: (15, 20),
+    })
+    boots = BootIndex(reader)
+    assert reader.boot_id is None
+    return boots
+
+
+class TestBootIndex(object):
+    def test_order(self, boots):
+        assert list(boots) == [Boot(BOOT_IDS[0], 1, 10),
+                               Boot(BOOT_IDS[1], 15, 20),
+                               Boot(BOOT_IDS[2], 30, 40)]
+
+    @pytest.mark.parametrize(('boot', 'expected'), [
+        ('1', 0),
+        ('3', 2),
+        ('0', 2),
+        ('-2', 0),
+        (BOOT_IDS[1], 1),
+        (str(uuid.UUID(BOOT_IDS[1])), 1),
+    ])
+    def test_find(self, boots, boot, expected):
+        assert boots.find(boot).boot_id == BOOT_IDS[expected]
+
+    @pytest.mark.parametrize('boot', ['4', '-3', 'latest', 'f' * 32])
+    def test_find_missing(self, boots, boot):
+        with pytest.raises(ValueError):
+            boots.find(boot)
@@ -61,6 +61,18 @@ exclusions
         "output: none",
         "priority: -1",
         "priority: [0, 1, 2, error, 2]",
+        "filter-engine: fast",
+        "filter-engine: [indexed]",
+        "data-threshold: 0",
+        "data-threshold: large",
+        "checkpoint-entries: 0",
+        "checkpoint-entries: true",
+        "checkpoint-interval: -1",
+        "checkpoint-interval: soon",
+        "pipeline: 1",
+        "prune-fields: SYSLOG_IDENTIFIER",
+        "prune-fields: ['']",
+        "pushdown-fields: [[MESSAGE_ID]]",
 
         # Test multiple errors
         """
@@ -0,0 +1,124 @@
+"""
+Copyright (c) 2026 Tim Waugh <tim@cyberelk.net>
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+
+from tests.util import maybe_mock_systemd
+maybe_mock_systemd()
+
+from flexmock import flexmock
+from io import BytesIO, StringIO
+from journal_brief import BriefEngine, Config, SelectiveReader
+from journal_brief.engine import configured_inclusions, output_formatters
+from journal_brief.journal_brief import Rule
+from tests.test_export import CONVERTERS, export, make_entry
+import pytest
+
+
+@pytest.fixture
+def config(tmp_path):
+    config_file = tmp_path / 'journal-brief.conf'
+    config_file.write_text("""
+output: cat
+priority: err
+exclusions:
+- MESSAGE: [exclude]
+""")
+    return Config(config_file=str(config_file))
+
+
+class TestBriefEngine(object):
+    def test_export_briefs(self, config):
+        engine = BriefEngine(config)
+        assert engine.fields == {'MESSAGE'}
+
+        data = export(make_entry(1, PRIORITY='3', MESSAGE='include'),
+                      make_entry(2, PRIORITY='3', MESSAGE='exclude'),
+                      make_entry(3, PRIORITY='6', MESSAGE='info'))
+        for _ in range(2):
+            output = StringIO()
+            reader = engine.export_reader(BytesIO(data),
+                                          converters=CONVERTERS)
+            jfilter = engine.brief(output, reader=reader)
+            assert output.getvalue() == 'include\n'
+
+            # Each brief shares the index but counts its own hits
+            exclusions = jfilter.default_exclusions
+            assert (exclusions.literal_index is
+                    engine.rule_sets.default_exclusions.literal_index)
+            assert exclusions[0].hits == 1
+
+        assert engine.rule_sets.default_exclusions[0].hits == 0
+
+    def test_output(self, config):
+        engine = BriefEngine(config, output=['json'])
+        assert [formatter.FORMAT_NAME
+                for formatter in engine.get_formatters()] == ['json']
+        assert engine.fields is None
+
+    def test_reader(self, config):
+        engine = BriefEngine(config)
+        calls = []
+        (flexmock(SelectiveReader)
+            .should_receive('add_rules')
+            .replace_with(lambda rules, this_boot=None:
+                          calls.append((rules, this_boot))))
+        reader = engine.reader(this_boot=True)
+        assert calls[-1] == ([Rule(3, {})], True)
+        assert reader.fields == ['MESSAGE']
+        assert reader.lazy
+
+    def test_cursor_files(self, config, tmp_path):
+        engine = BriefEngine(config)
+        flexmock(SelectiveReader).should_receive('add_rules')
+        flexmock(SelectiveReader).should_receive('seek_cursor').twice()
+        flexmock(SelectiveReader).should_receive('test_cursor').and_return(True)
+        (flexmock(SelectiveReader)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1'})
+            .and_return({'__CURSOR': '2', 'MESSAGE': 'include'})
+            .and_return({'__CURSOR': '3', 'MESSAGE': 'exclude'})
+            .and_return({}))
+
+        for name in ['a', 'b']:
+            cursor_file = tmp_path / name
+            cursor_file.write_text('1')
+            output = StringIO()
+            engine.brief(output, reader=engine.reader(),
+                         cursor_file=str(cursor_file))
+            assert output.getvalue() == 'include\n'
+            assert cursor_file.read_text() == '3'
+
+
+SYSTEMD_INCLUSIONS = [{'_COMM': ['systemd'],
+                       'CODE_FUNCTION': ['unit_notify']}]
+
+
+@pytest.mark.parametrize(('outputs', 'expected'), [
+    (['short'], ([{'UNIT': ['a']}], [{'UNIT': ['a']}], [])),
+    (['systemd'], (None, [], SYSTEMD_INCLUSIONS)),
+    (['short', 'systemd'], ([{'UNIT': ['a']}], [{'UNIT': ['a']}],
+                            SYSTEMD_INCLUSIONS)),
+])
+def test_configured_inclusions(tmp_path, outputs, expected):
+    config_file = tmp_path / 'journal-brief.conf'
+    config_file.write_text("""
+inclusions:
+- UNIT: [a]
+""")
+    config = Config(config_file=str(config_file))
+    assert configured_inclusions(config,
+                                 output_formatters(outputs)) == expected
@@ -0,0 +1,273 @@
+"""
+Copyright (c) 2026 Tim Waugh <tim@cyberelk.net>
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+
+from tests.util import maybe_mock_systemd
+maybe_mock_systemd()
+
+from io import BytesIO, StringIO
+from journal_brief import JournalFilter
+from journal_brief.export import ExportReader, ExportFormatError
+from journal_brief.format import EntryFormatter
+from journal_brief.journal_brief import LazyJournalEntry, TruncatedValue
+import pytest
+import struct
+
+try:
+    import pytest_benchmark
+except ImportError:
+    HAVE_BENCHMARK = False
+else:
+    HAVE_BENCHMARK = True
+    del pytest_benchmark
+
+
+BOOT_ID = '0123456789abcdef0123456789abcdef'
+
+# The mock systemd.journal has no DEFAULT_CONVERTERS, so the address
+# fields need converting like this
+CONVERTERS = {
+    '__CURSOR': str,
+    '__REALTIME_TIMESTAMP': int,
+    '__MONOTONIC_TIMESTAMP': tuple,
+}
+
+
+def export(*entries):
+    """
+    Write entries in the journal export format
+
+    :param entries: dicts, field -> str or bytes value (or list of them)
+    :return: bytes
+    """
+    data = []
+    for entry in entries:
+        for field, values in entry.items():
+            if not isinstance(values, list):
+                values = [values]
+
+            for value in values:
+                if isinstance(value, str):
+                    value = value.encode()
+
+                if b'\n' in value:
+                    data.extend([field.encode(), b'\n',
+                                 struct.pack('<Q', len(value)), value, b'\n'])
+                else:
+                    data.extend([field.encode(), b'=', value, b'\n'])
+
+        data.append(b'\n')
+
+    return b''.join(data)
+
+
+def make_entry(n, **fields):
+    entry = {
+        '__CURSOR': 's=1;i={0}'.format(n),
+        '__REALTIME_TIMESTAMP': str(1000000 + n),
+        '__MONOTONIC_TIMESTAMP': str(n),
+        '__SEQNUM': str(n),
+        '_BOOT_ID': BOOT_ID,
+        'MESSAGE': 'message {0}'.format(n),
+    }
+    entry.update(fields)
+    return entry
+
+
+def read_all(data, **kwargs):
+    kwargs.setdefault('converters', CONVERTERS)
+    with ExportReader(BytesIO(data), **kwargs) as reader:
+        return list(reader)
+
+
+class TestExportReader(object):
+    def test_fields(self):
+        data = export(make_entry(1, FIELD=['a', 'b']),
+                      make_entry(2, BINARY='line 1\nline 2'))
+        entries = read_all(data)
+        assert len(entries) == 2
+        assert entries[0] == {
+            '__CURSOR': 's=1;i=1',
+            '__REALTIME_TIMESTAMP': 1000001,
+            '__MONOTONIC_TIMESTAMP': (1, bytes.fromhex(BOOT_ID)),
+            '_BOOT_ID': BOOT_ID,
+            'MESSAGE': 'message 1',
+            'FIELD': ['a', 'b'],
+        }
+        assert entries[1]['BINARY'] == 'line 1\nline 2'
+
+    def test_default_conversion(self):
+        data = export({'MESSAGE': 'message', 'INVALID': b'\xff'})
+        entries = read_all(data, converters={})
+        assert entries == [{'MESSAGE': 'message', 'INVALID': b'\xff'}]
+
+    def test_framing(self):
+        # Extra empty lines and no empty line at the end
+        data = b'\n\nMESSAGE=a\n\n\n\nMESSAGE=b=c\n'
+        assert read_all(data) == [{'MESSAGE': 'a'}, {'MESSAGE': 'b=c'}]
+        assert read_all(b'') == []
+
+    @pytest.mark.parametrize('data', [
+        b'MESSAGE\n\x05\x00',
+        b'MESSAGE\n\x05\x00\x00\x00\x00\x00\x00\x00abc',
+        b'MESSAGE\n\x03\x00\x00\x00\x00\x00\x00\x00abcd\n',
+    ])
+    def test_invalid(self, data):
+        with pytest.raises(ExportFormatError):
+            read_all(data)
+
+    def test_inclusions(self):
+        data = export(make_entry(1, PRIORITY='3'),
+                      make_entry(2, PRIORITY='6'),
+                      make_entry(3, PRIORITY='6', _COMM='a'),
+                      make_entry(4, PRIORITY='6', _COMM='b'),
+                      make_entry(5, PRIORITY='6', UNIT=['x', 'y']))
+        entries = read_all(data,
+                           log_level=3,
+                           inclusions=[{'PRIORITY': ['err']},
+                                       {'_COMM': ['a']}],
+                           explicit_inclusions=[{'UNIT': ['y']}])
+        assert [entry['MESSAGE'] for entry in entries] == ['message 1',
+                                                           'message 5']
+
+        entries = read_all(data, inclusions=[{'_COMM': ['a', 'b']}])
+        assert [entry['MESSAGE'] for entry in entries] == ['message 3',
+                                                           'message 4']
+
+    def test_matches(self):
+        data = export(make_entry(1, A='1', B='1'),
+                      make_entry(2, A='1', B='2'),
+                      make_entry(3, A='2', B='1'),
+                      make_entry(4, A='3', B='3'))
+        reader = ExportReader(BytesIO(data), converters=CONVERTERS)
+        reader.add_match(A='1')
+        reader.add_disjunction()
+        reader.add_match('A=2')
+        reader.add_conjunction()
+        reader.add_match(B='1')
+        assert [entry['MESSAGE'] for entry in reader] == ['message 1',
+                                                          'message 3']
+
+    def test_this_boot(self, tmp_path, monkeypatch):
+        boot_id_path = tmp_path / 'boot_id'
+        boot_id_path.write_text('01234567-89ab-cdef-0123-456789abcdef\n')
+        monkeypatch.setattr('journal_brief.export.BOOT_ID_PATH',
+                            str(boot_id_path))
+        data = export(make_entry(1),
+                      make_entry(2, _BOOT_ID='f' * 32))
+        entries = read_all(data, this_boot=True)
+        assert [entry['MESSAGE'] for entry in entries] == ['message 1']
+
+    def test_skip(self):
+        data = export(*[make_entry(n) for n in range(5)])
+        reader = ExportReader(BytesIO(data), converters=CONVERTERS)
+        assert reader.get_next(2)['MESSAGE'] == 'message 1'
+        assert reader.get_next(2)['MESSAGE'] == 'message 3'
+        assert reader.get_next(2) == {}
+        with pytest.raises(ValueError):
+            reader.get_previous()
+
+    def test_set_fields(self):
+        data = export(make_entry(1, A='a', B='b\nb', C='c'))
+        entries = read_all(data, fields=['A', 'B'], inclusions=[{'C': ['c']}])
+        assert entries == [{
+            '__CURSOR': 's=1;i=1',
+            '__REALTIME_TIMESTAMP': 1000001,
+            '__MONOTONIC_TIMESTAMP': (1, bytes.fromhex(BOOT_ID)),
+            '_BOOT_ID': BOOT_ID,
+            'A': 'a',
+            'B': 'b\nb',
+            'C': 'c',
+        }]
+
+    def test_data_threshold(self):
+        long_text = 'x' * 1000
+        long_binary = 'y\n' * 500
+        data = export(make_entry(1, TEXT=long_text, BINARY=long_binary,
+                                 SHORT='short'),
+                      make_entry(2))
+        entries = read_all(data, data_threshold=300)
+        assert len(entries) == 2
+        assert entries[0]['TEXT'] == long_text[:300 - len('TEXT=')]
+        assert isinstance(entries[0]['TEXT'], TruncatedValue)
+        assert entries[0]['BINARY'] == long_binary[:300 - len('BINARY=')]
+        assert isinstance(entries[0]['BINARY'], TruncatedValue)
+        assert entries[0]['SHORT'] == 'short'
+        assert entries[1]['MESSAGE'] == 'message 2'
+
+    @pytest.mark.parametrize('read_size', [1, 2, 3, 7, 64])
+    def test_read_in_pieces(self, monkeypatch, read_size):
+        monkeypatch.setattr(ExportReader, 'READ_SIZE', read_size)
+        data = export(make_entry(1, TEXT='x' * 100),
+                      make_entry(2, BINARY='y\n' * 50),
+                      make_entry(3))
+        entries = read_all(data)
+        assert [entry['MESSAGE'] for entry in entries] == ['message 1',
+                                                           'message 2',
+                                                           'message 3']
+        assert entries[0]['TEXT'] == 'x' * 100
+        assert entries[1]['BINARY'] == 'y\n' * 50
+
+    def test_small_data_threshold(self):
+        data = (b'MESSAGE=hello world\n'
+                b'PRIORITY=6\n'
+                b'\n')
+        entries = read_all(data, data_threshold=10)
+        assert entries[0]['MESSAGE'] == 'he'
+        assert isinstance(entries[0]['MESSAGE'], TruncatedValue)
+        assert entries[0]['PRIORITY'] == '6'
+
+        # Smaller than the field names
+        entries = read_all(data, data_threshold=5)
+        assert entries[0]['MESSAGE'] == ''
+        assert isinstance(entries[0]['MESSAGE'], TruncatedValue)
+        assert entries[0]['PRIORITY'] == ''
+
+        data = export(make_entry(1, TEXT='x' * 10))
+        entries = read_all(data, data_threshold=3)
+        assert entries[0]['TEXT'] == ''
+        assert isinstance(entries[0]['TEXT'], TruncatedValue)
+
+    def test_lazy(self):
+        data = export(make_entry(1))
+        entries = read_all(data, lazy=True)
+        assert isinstance(entries[0], LazyJournalEntry)
+        assert entries[0]['MESSAGE'] == 'message 1'
+
+    def test_journal_filter(self):
+        data = export(make_entry(1, MESSAGE='include'),
+                      make_entry(2, MESSAGE='exclude'))
+        reader = ExportReader(BytesIO(data), converters=CONVERTERS)
+        jfilter = JournalFilter(reader, [EntryFormatter()],
+                                default_exclusions=[{'MESSAGE': ['exclude']}])
+        output = StringIO()
+        jfilter.format(output)
+        assert output.getvalue() == 'include\n'
+
+
+@pytest.mark.skipif(not HAVE_BENCHMARK,
+                    reason="install pytest-benchmark to run this test")
+class TestExportProfile(object):
+    def test_read(self, benchmark):
+        fields = {'FIELD{0}'.format(n): 'value {0}'.format(n)
+                  for n in range(20)}
+        data = export(*[make_entry(n, **fields) for n in range(1000)])
+
+        def read():
+            return len(read_all(data, fields=['MESSAGE']))
+
+        assert benchmark(read) == 1000
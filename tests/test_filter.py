@@ -19,12 +19,16 @@ Copyright (c) 2015 Tim Waugh <tim@cyberelk.net>
 from tests.util import maybe_mock_systemd
 maybe_mock_systemd()
 
+from datetime import datetime
 from flexmock import flexmock
 from io import StringIO
 from journal_brief import JournalFilter
-from journal_brief.filter import Inclusion, Exclusion
-from journal_brief.format import EntryFormatter
+from journal_brief.filter import (Inclusion, Exclusion, RuleSet,
+                                  push_down_exclusions)
+from journal_brief.format import EntryFormatter, get_formatter
+from journal_brief.journal_brief import LazyJournalEntry, Rule
 import logging
+import pickle
 import pytest
 from systemd import journal
 import yaml
@@ -80,6 +84,30 @@ class TestFilterProfile(object):
 
         assert not benchmark(exclusion.matches, entry)
 
+    def test_literal_exclusions(self, benchmark):
+        rules = RuleSet(Exclusion({'MESSAGE': ['never matched {0}'.format(n)],
+                                   'SYSLOG_IDENTIFIER': ['id{0}'.format(n)]})
+                        for n in range(5000))
+
+        entry = {
+            'MESSAGE': 'message',
+            'SYSLOG_IDENTIFIER': 'id1',
+            '__CURSOR': '1',
+        }
+
+        assert benchmark(rules.first_match, entry) is None
+
+    def test_regexp_exclusions(self, benchmark):
+        rules = RuleSet(Exclusion({'MESSAGE': ['/never (matched) {0}/'.format(n)]})
+                        for n in range(300))
+
+        entry = {
+            'MESSAGE': 'never matched',
+            '__CURSOR': '1',
+        }
+
+        assert benchmark(rules.first_match, entry) is None
+
 
 class TestInclusion(object):
     def test_and(self):
@@ -158,6 +186,34 @@ class TestExclusion(object):
         priority_type = journal.DEFAULT_CONVERTERS.get('PRIORITY', str)
         assert exclusion.matches({'PRIORITY': priority_type(3)})
 
+    def test_last_hit_converted_lazily(self):
+        converted = []
+
+        def convert(field, value):
+            converted.append(field)
+            return value
+
+        exclusion = Exclusion({'MESSAGE': ['exclude this']})
+        timestamp = datetime(2020, 1, 2, 3, 4, 5)
+        microseconds = int(timestamp.timestamp()) * 1000000
+        for offset in [-1, 0]:
+            entry = LazyJournalEntry({'MESSAGE': 'exclude this',
+                                      '__REALTIME_TIMESTAMP':
+                                      microseconds + offset},
+                                     convert)
+            exclusion.hit(entry)
+
+        # A formatter changing the entry doesn't change the last hit
+        entry['__REALTIME_TIMESTAMP'] = 'Jan 02 03:04:05'
+
+        assert exclusion.hits == 2
+        assert converted == []
+        assert exclusion.last_hit == timestamp
+
+        unpickled = pickle.loads(pickle.dumps(exclusion))
+        assert unpickled.last_hit == timestamp
+        assert unpickled.copy().last_hit is None
+
     def test_str_without_comment(self):
         excl = {'MESSAGE': ['exclude this']}
         unyaml = StringIO()
@@ -177,6 +233,182 @@ class TestExclusion(object):
         assert yaml.safe_load(unyaml) == [excl]
 
 
+class TestFilterRule(object):
+    def test_fingerprint(self):
+        excl = Exclusion({'MESSAGE': ['a'], '_COMM': ['b']})
+        assert (excl.fingerprint() ==
+                Exclusion({'_COMM': ['b'], 'MESSAGE': ['a']},
+                          comment='comment').fingerprint())
+        assert (excl.fingerprint() !=
+                Exclusion({'MESSAGE': ['a']}).fingerprint())
+
+    @pytest.mark.parametrize(('first', 'second', 'expected'), [
+        ({'MESSAGE': ['a']}, {'MESSAGE': ['b']}, False),
+        ({'MESSAGE': ['a']}, {'MESSAGE': ['b', 'a']}, True),
+        ({'MESSAGE': ['a']}, {'_COMM': ['a']}, True),
+        ({'MESSAGE': ['a'], '_COMM': ['x']}, {'_COMM': ['y']}, False),
+        ({'MESSAGE': ['abc']}, {'MESSAGE': ['/ab/']}, True),
+        ({'MESSAGE': ['cab']}, {'MESSAGE': ['/ab/']}, False),
+        ({'MESSAGE': ['/a/']}, {'MESSAGE': ['/b/']}, True),
+        ({'MESSAGE': []}, {'MESSAGE': ['a']}, False),
+        ({}, {'MESSAGE': ['a']}, True),
+    ])
+    def test_may_overlap(self, first, second, expected):
+        first = Exclusion(first)
+        second = Exclusion(second)
+        assert first.may_overlap(second) == expected
+        assert second.may_overlap(first) == expected
+
+
+class TestRuleSet(object):
+    def test_first_match_order(self):
+        rules = RuleSet([Exclusion({'MESSAGE': ['/exclude/']}),
+                         Exclusion({'MESSAGE': ['exclude this']}),
+                         Exclusion({'MESSAGE': ['exclude this'],
+                                    'SYSLOG_IDENTIFIER': ['from here']})])
+        assert rules.first_match({'MESSAGE': 'exclude this'}) == 0
+        assert rules.first_match({'MESSAGE': 'not this'}) is None
+
+        rules = RuleSet(list(rules)[::-1])
+        assert rules.first_match({'MESSAGE': 'exclude this',
+                                  'SYSLOG_IDENTIFIER': 'from here'}) == 0
+        assert rules.first_match({'MESSAGE': 'exclude this'}) == 1
+        assert rules.first_match({'MESSAGE': 'exclude that'}) == 2
+
+    def test_same_as_linear_search(self):
+        exclusions = [Exclusion({'MESSAGE': ['a', 'b']}),
+                      Exclusion({'MESSAGE': []}),
+                      Exclusion({'MESSAGE': ['b'], '_COMM': ['x']}),
+                      Exclusion({'_COMM': ['y', '/z/']}),
+                      Exclusion({'MESSAGE': ['/c/', 'd']})]
+        rules = RuleSet(exclusions)
+        for message in ['a', 'b', 'c', 'd', 'e', None]:
+            for comm in ['x', 'y', 'zz', None]:
+                entry = {'MESSAGE': message, '_COMM': comm}
+                expected = next((position
+                                 for position, excl in enumerate(exclusions)
+                                 if excl.fields_match(entry)), None)
+                assert rules.first_match(entry) == expected
+
+    def test_empty_rule(self):
+        rules = RuleSet([Exclusion({'MESSAGE': ['a']}), Exclusion({})])
+        assert rules.first_match({'MESSAGE': 'a'}) == 0
+        assert rules.first_match({'MESSAGE': 'b'}) == 1
+
+    def test_regexp_alternation(self):
+        exclusions = [Exclusion({'MESSAGE': ['/a(b)c/', '/x/']}),
+                      Exclusion({'MESSAGE': ['/(a)((b))/'],
+                                 '_COMM': ['y']}),
+                      Exclusion({'MESSAGE': ['/(?P<ab>a)b/']}),
+                      Exclusion({'MESSAGE': ['/(a)\\1/']}),
+                      Exclusion({'MESSAGE': ['/ab/', 'literal']})]
+        rules = RuleSet(exclusions)
+        assert list(rules.regexp_index) == ['MESSAGE']
+        assert rules.unindexed == [2, 3]
+        for message in ['abc', 'abd', 'aa', 'x', 'literal', 'b', 1, None]:
+            for comm in ['y', None]:
+                entry = {'MESSAGE': message, '_COMM': comm}
+                expected = next((position
+                                 for position, excl in enumerate(exclusions)
+                                 if excl.fields_match(entry)), None)
+                assert rules.first_match(entry) == expected
+
+    @pytest.mark.parametrize('engine', ['compiled', 'reference'])
+    def test_engines(self, engine):
+        priority_type = journal.DEFAULT_CONVERTERS.get('PRIORITY', str)
+        exclusions = [Exclusion({'MESSAGE': ['a', 'b']}),
+                      Exclusion({'MESSAGE': []}),
+                      Exclusion({'MESSAGE': ['b'], '_COMM': ['x']}),
+                      Exclusion({'_COMM': ['y', '/z/']}),
+                      Exclusion({'MESSAGE': ['/(a)\\1/', '/c/', 'd']}),
+                      Exclusion({'PRIORITY': 'err', "'FIELD'": ['e']}),
+                      Exclusion({})]
+        indexed = RuleSet(exclusions)
+        rules = RuleSet(exclusions, engine=engine)
+        for message in ['a', 'aa', 'b', 'c', 'd', 'e', 1, None]:
+            for comm in ['x', 'y', 'zz', None]:
+                for priority in [priority_type(3), priority_type(6)]:
+                    entry = {'MESSAGE': message,
+                             '_COMM': comm,
+                             'PRIORITY': priority,
+                             "'FIELD'": message}
+                    assert (rules.first_match(entry) ==
+                            indexed.first_match(entry))
+
+    @pytest.mark.parametrize('engine', RuleSet.ENGINES)
+    def test_weights(self, engine):
+        exclusions = [Exclusion({'MESSAGE': ['a', 'b']}),
+                      Exclusion({'MESSAGE': ['/b/'], '_COMM': ['x']}),
+                      Exclusion({'_COMM': ['y', '/z/']}),
+                      Exclusion({'MESSAGE': ['/(a)\\1/', '/c/', 'd']}),
+                      Exclusion({'MESSAGE': ['c']}),
+                      Exclusion({})]
+        unweighted = RuleSet(exclusions)
+        rules = RuleSet(exclusions, engine=engine,
+                        weights=list(range(len(exclusions))))
+        assert rules.order == [5, 4, 3, 2, 1, 0]
+        for message in ['a', 'aa', 'b', 'c', 'd', 'e', None]:
+            for comm in ['x', 'y', 'zz', None]:
+                entry = {'MESSAGE': message, '_COMM': comm}
+                assert (rules.first_match(entry) ==
+                        unweighted.first_match(entry))
+
+    @pytest.mark.parametrize('engine', RuleSet.ENGINES)
+    def test_pickle(self, engine):
+        rules = RuleSet([Exclusion({'MESSAGE': ['/a.*/', 'b']}),
+                         Exclusion({'MESSAGE': ['/.*c/']})],
+                        engine=engine, weights=[1, 2])
+        copy = pickle.loads(pickle.dumps(rules))
+        assert copy.engine == engine
+        assert copy.order == rules.order
+        for message in ['abc', 'b', 'c', 'd']:
+            entry = {'MESSAGE': message}
+            assert copy.first_match(entry) == rules.first_match(entry)
+
+    @pytest.mark.parametrize('engine', RuleSet.ENGINES)
+    def test_prune(self, engine):
+        exclusions = [Exclusion({'MESSAGE': ['a', 'b']}),
+                      Exclusion({'MESSAGE': ['/x/'], '_COMM': ['x']}),
+                      Exclusion({'_COMM': ['y', '/z/']}),
+                      Exclusion({'_COMM': ['/w/']}),
+                      Exclusion({'MESSAGE': ['c']})]
+        unpruned = RuleSet(exclusions, engine=engine, weights=[1, 2, 3, 4, 5])
+        rules = unpruned.prune({'_COMM': {'x', 'zz'}, 'OTHER': {'v'}})
+        assert rules.pruned == {3}
+        assert rules.order == [4, 2, 1, 0]
+        assert list(rules) == exclusions
+        assert rules.prune({'_COMM': {'x', 'zz'}}) is rules
+
+        # Pruning is kept when pickled
+        assert pickle.loads(pickle.dumps(rules)).pruned == {3}
+        for message in ['a', 'b', 'c', 'x', None]:
+            for comm in ['x', 'zz', None]:
+                entry = {'MESSAGE': message, '_COMM': comm}
+                assert (rules.first_match(entry) ==
+                        unpruned.first_match(entry))
+
+        rules = unpruned.prune({'_COMM': set(), 'MESSAGE': set()})
+        assert rules.order == []
+        assert rules.first_match({'MESSAGE': 'a', '_COMM': 'y'}) is None
+
+    def test_unknown_engine(self):
+        with pytest.raises(ValueError):
+            RuleSet([], engine='fast')
+
+    def test_unhashable_value(self):
+        rules = RuleSet([Exclusion({'MESSAGE': ['a']})])
+        assert rules.first_match({'MESSAGE': ['a', 'b']}) is None
+
+    def test_inclusions(self):
+        rules = RuleSet([Inclusion({'PRIORITY': 'err'}),
+                         Inclusion({'_SYSTEMD_UNIT': ['myservice.service']})])
+        priority_type = journal.DEFAULT_CONVERTERS.get('PRIORITY', str)
+        assert rules.first_match({'PRIORITY': priority_type(3)}) == 0
+        assert rules.first_match({'PRIORITY': priority_type(6)}) is None
+        assert rules.first_match({'PRIORITY': priority_type(6),
+                                  '_SYSTEMD_UNIT': 'myservice.service'}) == 1
+
+
 class MySpecialFormatter(EntryFormatter):
     """
     Only for testing
@@ -217,6 +449,23 @@ class TestJournalFilter(object):
         lines = output.read().splitlines()
         assert lines == [entry['MESSAGE'] for entry in entries]
 
+    def test_format_last(self):
+        # Newest first
+        entries = iter([{'MESSAGE': 'message 4'},
+                        {'MESSAGE': 'exclude this'},
+                        {'MESSAGE': 'message 3'},
+                        {'MESSAGE': 'message 2'},
+                        {'MESSAGE': 'message 1'}])
+        jfilter = JournalFilter(entries, [EntryFormatter()],
+                                default_exclusions=[{'MESSAGE':
+                                                     ['exclude this']}])
+        output = StringIO()
+        jfilter.format_last(output, 3)
+        assert output.getvalue() == 'message 2\nmessage 3\nmessage 4\n'
+
+        # Reading stopped as soon as enough entries were found
+        assert list(entries) == [{'MESSAGE': 'message 1'}]
+
     def test_exclusion(self):
         priority_type = journal.DEFAULT_CONVERTERS.get('PRIORITY', str)
         entries = [{'MESSAGE': 'exclude this',
@@ -302,6 +551,116 @@ class TestJournalFilter(object):
         assert len(statistics) == 1
         assert statistics[0].hits == 1
 
+    @pytest.mark.parametrize('engine', RuleSet.ENGINES)
+    def test_statistics_first_match(self, engine):
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'MESSAGE': 'exclude', '_COMM': 'a'})
+            .and_return({'MESSAGE': 'exclude', '_COMM': 'b'})
+            .and_return({'MESSAGE': 'exclude', '_COMM': 'b'})
+            .and_return({}))
+
+        exclusions = [{'_COMM': ['a']},
+                      {'MESSAGE': ['/excl/']},
+                      {'MESSAGE': ['exclude']}]
+        formatter = EntryFormatter()
+        jfilter = JournalFilter(journal.Reader(), [formatter],
+                                default_exclusions=exclusions,
+                                engine=engine)
+        output = StringIO()
+        jfilter.format(output)
+        assert not output.getvalue()
+        hits = {str(dict(stat.exclusion)): stat.hits
+                for stat in jfilter.get_statistics()}
+        assert hits == {str({'_COMM': ['a']}): 1,
+                        str({'MESSAGE': ['/excl/']}): 2,
+                        str({'MESSAGE': ['exclude']}): 0}
+
+    def test_exclusion_hits(self):
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'MESSAGE': 'exclude', '_COMM': 'a'})
+            .and_return({'MESSAGE': 'exclude', '_COMM': 'b'})
+            .and_return({'MESSAGE': 'include', '_COMM': 'b'})
+            .and_return({}))
+
+        exclusions = [{'_COMM': ['a']},
+                      {'MESSAGE': ['exclude']}]
+        exclusion_hits = {Exclusion(exclusions[1]).fingerprint(): 10}
+        formatter = EntryFormatter()
+        jfilter = JournalFilter(journal.Reader(), [formatter],
+                                default_exclusions=exclusions,
+                                exclusion_hits=exclusion_hits)
+        assert jfilter.default_exclusions.order == [1, 0]
+        output = StringIO()
+        jfilter.format(output)
+        assert output.getvalue() == 'include\n'
+        assert [excl.hits for excl in jfilter.default_exclusions] == [1, 1]
+
+    def test_prune(self):
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'MESSAGE': 'exclude', '_COMM': 'a'})
+            .and_return({'MESSAGE': 'include', '_COMM': 'b'})
+            .and_return({}))
+
+        exclusions = [{'_COMM': ['c']},
+                      {'MESSAGE': ['exclude']}]
+        jfilter = JournalFilter(journal.Reader(), [EntryFormatter()],
+                                default_exclusions=exclusions)
+        pruned = jfilter.prune({'_COMM': {'a', 'b'}})
+        assert pruned == [Exclusion(exclusions[0])]
+        assert (jfilter.filter_rules['cat'].exclusions is
+                jfilter.default_exclusions)
+        output = StringIO()
+        jfilter.format(output)
+        assert output.getvalue() == 'include\n'
+
+        # Pruned exclusions are still reported
+        hits = {str(dict(stat.exclusion)): stat.hits
+                for stat in jfilter.get_statistics()}
+        assert hits == {str({'_COMM': ['c']}): 0,
+                        str({'MESSAGE': ['exclude']}): 1}
+
+    def test_streaming(self):
+        assert EntryFormatter.STREAMING
+        assert get_formatter('json-pretty').STREAMING
+        assert not get_formatter('login').STREAMING
+
+        # Formatters which don't say may keep output back for flush()
+        assert not MySpecialFormatter.STREAMING
+
+    def test_get_fields(self):
+        jfilter = JournalFilter(iter([]), [EntryFormatter(),
+                                           get_formatter('reboot')],
+                                default_inclusions=[{'_COMM': ['a']}],
+                                default_exclusions=[{'CODE_FILE': ['b'],
+                                                     'CODE_FUNCTION': ['c']}])
+        assert jfilter.get_fields() == {'MESSAGE', '_BOOT_ID', '_COMM',
+                                        'CODE_FILE', 'CODE_FUNCTION'}
+
+        jfilter = JournalFilter(iter([]), [EntryFormatter(),
+                                           get_formatter('json')])
+        assert jfilter.get_fields() is None
+
+        # Formatters which don't say which fields they use get them all
+        jfilter = JournalFilter(iter([]), [EntryFormatter(),
+                                           MySpecialFormatter()])
+        assert jfilter.get_fields() is None
+
+    def test_checkpoints(self, checkpoints):
+        entries = [{'MESSAGE': '1'}, {'MESSAGE': '2'}]
+        jfilter = JournalFilter(iter(entries), [EntryFormatter()])
+        jfilter.format(checkpoints.output, checkpoints=checkpoints)
+        assert checkpoints.saved == [(None, '1\n'), (None, '1\n2\n')]
+
+        # Output kept back for flush() means no checkpoints
+        checkpoints.saved = []
+        jfilter = JournalFilter(iter(entries), [EntryFormatter(),
+                                                get_formatter('login')])
+        jfilter.format(checkpoints.output, checkpoints=checkpoints)
+        assert checkpoints.saved == []
+
     def test_formatter_filters(self):
         incl_entries = [
             {
@@ -336,3 +695,38 @@ class TestJournalFilter(object):
         jfilter = JournalFilter(journal.Reader(), [formatter])
         jfilter.format(StringIO())
         assert formatter.entries_received == incl_entries
+
+
+class TestPushDownExclusions(object):
+    def test_push_down(self):
+        rules = [Rule(3, {'SYSLOG_IDENTIFIER': ['a', 'b'], '_COMM': ['x']}),
+                 Rule(3, {'_COMM': ['y']}),
+                 Rule(None, {'SYSLOG_IDENTIFIER': ['b']}),
+                 Rule(None, {'PRIORITY': 0})]
+        exclusions = [Exclusion({'SYSLOG_IDENTIFIER': ['b', 'c']}),
+                      Exclusion({'SYSLOG_IDENTIFIER': ['/a/']}),
+                      Exclusion({'SYSLOG_IDENTIFIER': ['a'],
+                                 '_COMM': ['x']}),
+                      Exclusion({'_COMM': ['x']})]
+        (new_rules, pushed) = push_down_exclusions(rules, exclusions,
+                                                   ['SYSLOG_IDENTIFIER'])
+        assert new_rules == [
+            Rule(3, {'SYSLOG_IDENTIFIER': ['a'], '_COMM': ['x']}),
+            Rule(3, {'_COMM': ['y']}),
+            Rule(None, {'PRIORITY': 0}),
+        ]
+        assert pushed == [exclusions[0]]
+
+        # The original rules are unchanged
+        assert rules[0].inclusion['SYSLOG_IDENTIFIER'] == ['a', 'b']
+
+    def test_no_fields(self):
+        rules = [Rule(None, {'SYSLOG_IDENTIFIER': ['a', 'b']})]
+        exclusions = [Exclusion({'SYSLOG_IDENTIFIER': ['b']})]
+        assert push_down_exclusions(rules, exclusions, []) == (rules, [])
+
+    def test_everything_excluded(self):
+        rules = [Rule(None, {'SYSLOG_IDENTIFIER': ['a', 'b']})]
+        exclusions = [Exclusion({'SYSLOG_IDENTIFIER': ['a', 'b']})]
+        assert push_down_exclusions(rules, exclusions,
+                                    ['SYSLOG_IDENTIFIER']) == (rules, [])
@@ -0,0 +1,96 @@
+"""
+Copyright (c) 2026 Tim Waugh <tim@cyberelk.net>
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+
+from tests.util import maybe_mock_systemd
+maybe_mock_systemd()
+
+from datetime import datetime
+from journal_brief.filter import Exclusion
+from journal_brief.history import ExclusionHistory
+import os
+
+
+def make_exclusion(mapping, hits):
+    exclusion = Exclusion(mapping)
+    exclusion.hits = hits
+    return exclusion
+
+
+class TestExclusionHistory(object):
+    def test_missing(self, tmp_path):
+        history = ExclusionHistory(os.path.join(str(tmp_path), 'history'))
+        assert history.get_hits() == {}
+
+    def test_invalid(self, tmp_path):
+        path = os.path.join(str(tmp_path), 'history')
+        for content in ['not json', '[]', '{"version": 0}']:
+            with open(path, 'wt') as fp:
+                fp.write(content)
+
+            assert ExclusionHistory(path).get_hits() == {}
+
+    def test_accumulate(self, tmp_path):
+        cursor_file = os.path.join(str(tmp_path), 'cursor')
+        first = make_exclusion({'MESSAGE': ['first']}, 2)
+        second = make_exclusion({'MESSAGE': ['second']}, 1)
+
+        history = ExclusionHistory.for_cursor_file(cursor_file)
+        history.update([first, second])
+        history.save()
+        assert os.listdir(str(tmp_path)) == ['cursor.history']
+
+        # The first rule is no longer used, the second is used twice
+        history = ExclusionHistory.for_cursor_file(cursor_file)
+        assert history.get_hits() == {first.fingerprint(): 2,
+                                      second.fingerprint(): 1}
+        history.update([second, make_exclusion({'MESSAGE': ['second']}, 3)])
+        history.save()
+
+        history = ExclusionHistory.for_cursor_file(cursor_file)
+        assert history.get_hits() == {second.fingerprint(): 5}
+
+    def test_save_directory(self, tmp_path):
+        cursor_file = os.path.join(str(tmp_path), 'new', 'cursor')
+        history = ExclusionHistory.for_cursor_file(cursor_file)
+        history.update([make_exclusion({'MESSAGE': ['hit']}, 1)])
+        history.save()
+        assert os.listdir(os.path.join(str(tmp_path), 'new')) == [
+            'cursor.history']
+
+    def test_statistics(self, tmp_path):
+        path = os.path.join(str(tmp_path), 'history')
+        last_hit = datetime(2020, 1, 2, 3, 4, 5)
+        hit = make_exclusion({'MESSAGE': ['hit']}, 2)
+        hit.last_hit = last_hit
+        missed = make_exclusion({'MESSAGE': ['missed']}, 0)
+
+        history = ExclusionHistory(path)
+        history.update([missed, hit], evaluations=10)
+        history.save()
+        history = ExclusionHistory(path)
+        history.update([missed, make_exclusion({'MESSAGE': ['hit']}, 0)],
+                       evaluations=5)
+        history.save()
+
+        history = ExclusionHistory(path)
+        new = Exclusion({'MESSAGE': ['new']})
+        stats = history.get_statistics([missed, new, hit])
+        assert [(stat.hits, stat.evaluations, stat.last_hit, stat.exclusion)
+                for stat in stats] == [(2, 15, last_hit, hit),
+                                       (0, 15, None, missed),
+                                       (0, 0, None, new)]
@@ -16,15 +16,23 @@ Copyright (c) 2015 Tim Waugh <tim@cyberelk.net>
 ## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
 """
 
+from datetime import datetime, timedelta
 from flexmock import flexmock
 from inspect import getsourcefile
 from tests.util import Watcher
 import journal_brief
 from journal_brief import SelectiveReader, LatestJournalEntries
+from journal_brief.journal_brief import (LazyJournalEntry, TruncatedValue,
+                                         MultiCursorEntries, Rule,
+                                         ReverseJournalEntries,
+                                         cursor_precedes, journal_unchanged,
+                                         match_expression, seek_bookmark,
+                                         write_cursor_file)
 from systemd import journal
 import os
 import pytest
 import re
+import time
 
 
 class TestSelectiveReader(object):
@@ -51,39 +59,34 @@ class TestSelectiveReader(object):
                        '_SYSTEMD_UNIT': ['myservice.service']}]
         SelectiveReader(log_level=0, this_boot=True, inclusions=inclusions)
 
-        # Should add matches for all of the first group
-        assert set(watcher.calls[:4]) == set([
+        # A this_boot() match for every entry
+        assert watcher.calls[0][0] == 'this_boot'
+
+        # Then a conjunction
+        assert watcher.calls[1] == ('add_conjunction', (), '{}')
+
+        # Then matches for all of the first group
+        assert watcher.calls[2:6] == [
             ('add_match', (), "{'PRIORITY': '0'}"),
             ('add_match', (), "{'PRIORITY': '1'}"),
             ('add_match', (), "{'PRIORITY': '2'}"),
             ('add_match', (), "{'PRIORITY': '3'}"),
-        ])
-
-        # Then a this_boot() match
-        assert watcher.calls[4][0] == 'this_boot'
-
-        # Then a log_level() match
-        assert watcher.calls[5] == ('log_level', (0,), '{}')
+        ]
 
         # Then a disjunction
-        assert watcher.calls[6][0] == 'add_disjunction'
+        assert watcher.calls[6] == ('add_disjunction', (), '{}')
 
-        # Then matches for all of the second group
-        assert set(watcher.calls[7:11]) == set([
+        # Then matches for all of the second group, with the log level
+        assert watcher.calls[7:12] == [
+            ('add_match', (), "{'PRIORITY': '0'}"),
             ('add_match', (), "{'PRIORITY': '4'}"),
             ('add_match', (), "{'PRIORITY': '5'}"),
             ('add_match', (), "{'PRIORITY': '6'}"),
             ('add_match', (), "{'_SYSTEMD_UNIT': 'myservice.service'}"),
-        ])
-
-        # Then a this_boot() match
-        assert watcher.calls[11][0] == 'this_boot'
-
-        # Then a log_level() match
-        assert watcher.calls[12] == ('log_level', (0,), '{}')
+        ]
 
         # No more
-        assert len(watcher.calls) == 13
+        assert len(watcher.calls) == 12
 
     def test_inclusion_log_level(self):
         watcher = self.watch_reader()
@@ -91,36 +94,203 @@ class TestSelectiveReader(object):
                       {'PRIORITY': '2'}]
         SelectiveReader(log_level=1, inclusions=inclusions)
 
-        # Matches for {'PRIORITY': '0'}
-        assert set(watcher.calls[0:2]) == set([
-            ('log_level', (0,), '{}'),
-            ('log_level', (1,), '{}'),
-        ])
-
-        # A disjunction
-        assert watcher.calls[2] == ('add_disjunction', (), '{}')
-
-        # Matches for {'PRIORITY': '2'}
-        assert set(watcher.calls[3:5]) == set([
-            ('log_level', (2,), '{}'),
-            ('log_level', (1,), '{}'),
-        ])
-
-        # No more
-        assert len(watcher.calls) == 5
+        # The second inclusion matches every entry the first does
+        assert watcher.calls == [
+            ('add_match', (), "{'PRIORITY': '0'}"),
+            ('add_match', (), "{'PRIORITY': '1'}"),
+            ('add_match', (), "{'PRIORITY': '2'}"),
+        ]
 
     def test_no_inclusions(self):
         watcher = self.watch_reader()
         SelectiveReader(log_level=0, this_boot=True)
 
-        # Should have two matches
-        assert len(watcher.calls) == 2
+        # A log level match and a this_boot() match
+        assert watcher.calls == [
+            ('add_match', (), "{'PRIORITY': '0'}"),
+            ('this_boot', (), '{}'),
+        ]
+
+    @pytest.mark.parametrize(('rules', 'common', 'terms'), [
+        # Merged
+        ([Rule(None, {'A': ['a'], 'B': ['b']}),
+          Rule(None, {'A': ['a'], 'B': ['c']}),
+          Rule(None, {'C': ['c']})],
+         {},
+         [{'A': {'a'}, 'B': {'b', 'c'}}, {'C': {'c'}}]),
+
+        # Subsumed
+        ([Rule(None, {'A': ['a'], 'B': ['b']}),
+          Rule(None, {'A': ['a', 'b']}),
+          Rule(None, {'A': ['a', 'b']})],
+         {'A': {'a', 'b'}},
+         []),
+
+        # Common terms
+        ([Rule(3, {'A': ['a']}),
+          Rule(3, {'B': ['b'], 'C': ['c']})],
+         {'PRIORITY': {'0', '1', '2', '3'}},
+         [{'A': {'a'}}, {'B': {'b'}, 'C': {'c'}}]),
+
+        # Some rule matches every entry
+        ([Rule(None, {'A': ['a']}),
+          Rule(None, {'A': []})],
+         {},
+         []),
+    ])
+    def test_match_expression(self, rules, common, terms):
+        assert match_expression(rules) == (common, terms)
+
+
+class TestLazyJournalEntry(object):
+    def test_convert_on_access(self):
+        converted = []
+
+        def convert(field, value):
+            converted.append(field)
+            return value.decode()
+
+        entry = LazyJournalEntry({'MESSAGE': b'message',
+                                  'FIELD': [b'a', b'b'],
+                                  'OTHER': b'other'}, convert)
+        assert 'OTHER' in entry
+        assert 'MISSING' not in entry
+        assert entry.get('MISSING') is None
+        assert len(entry) == 3
+        assert not converted
+
+        assert entry['MESSAGE'] == 'message'
+        assert entry.get('MESSAGE') == 'message'
+        assert converted == ['MESSAGE']
+
+        assert entry['FIELD'] == ['a', 'b']
+        assert converted == ['MESSAGE', 'FIELD', 'FIELD']
+
+        entry['OTHER'] = 'changed'
+        entry['NEW'] = 'new'
+        del entry['FIELD']
+        assert entry == {'MESSAGE': 'message',
+                         'OTHER': 'changed',
+                         'NEW': 'new'}
+        assert converted == ['MESSAGE', 'FIELD', 'FIELD']
+
+    def test_selective_reader(self):
+        (flexmock(journal.Reader)
+            .should_receive('_convert_entry')
+            .and_return({'MESSAGE': 'converted'}))
+        (flexmock(journal.Reader)
+            .should_receive('_convert_field')
+            .with_args('MESSAGE', b'message')
+            .and_return('message')
+            .once())
 
-        # A this_boot() match
-        assert watcher.calls[0][0] == 'this_boot'
+        reader = SelectiveReader()
+        assert reader._convert_entry({}) == {'MESSAGE': 'converted'}
+
+        reader = SelectiveReader(lazy=True)
+        entry = reader._convert_entry({'MESSAGE': b'message',
+                                       '_PID': b'1'})
+        assert isinstance(entry, LazyJournalEntry)
+        assert entry['MESSAGE'] == 'message'
+        assert entry['MESSAGE'] == 'message'
+
+
+class TestSelectiveReaderFields(object):
+    def test_fields(self):
+        (flexmock(journal.Reader)
+            .should_receive('_next')
+            .and_return(True)
+            .and_return(False))
+        fields = {'MESSAGE': b'message'}
+        (flexmock(journal.Reader)
+            .should_receive('_get')
+            .replace_with(lambda field: fields[field]))
+        (flexmock(journal.Reader)
+            .should_receive('_get_realtime')
+            .and_return(1))
+        (flexmock(journal.Reader)
+            .should_receive('_get_monotonic')
+            .and_return(2))
+        (flexmock(journal.Reader)
+            .should_receive('_get_cursor')
+            .and_return('3'))
+        (flexmock(journal.Reader)
+            .should_receive('_convert_entry')
+            .replace_with(lambda entry: entry))
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .never())
+
+        reader = SelectiveReader(fields=['MESSAGE', '_PID', '__CURSOR'])
+        assert reader.fields == ['MESSAGE', '_PID']
+        assert reader.get_next() == {'MESSAGE': b'message',
+                                     '__REALTIME_TIMESTAMP': 1,
+                                     '__MONOTONIC_TIMESTAMP': 2,
+                                     '__CURSOR': '3'}
+        assert reader.get_next() == {}
+
+    def test_all_fields(self):
+        (flexmock(journal.Reader)
+            .should_receive('_next')
+            .never())
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'MESSAGE': 'message'}))
+
+        reader = SelectiveReader()
+        assert reader.get_next() == {'MESSAGE': 'message'}
+
+
+class TestSelectiveReaderDataThreshold(object):
+    def test_truncation(self):
+        def convert(key, value):
+            if isinstance(value, bytes):
+                return value.decode()
+
+            return value
+
+        (flexmock(journal.Reader)
+            .should_receive('_convert_field')
+            .replace_with(convert))
+
+        reader = SelectiveReader(lazy=True, data_threshold=15)
+        assert reader.data_threshold == 15
+        entry = reader._convert_entry({
+            'MESSAGE': b'message truncated',
+            'FIELD': b'short',
+            'LIST': [b'a', b'a' + b'\xc3\xa9' * 6],
+            '__CURSOR': 'cursor',
+        })
+
+        assert entry['MESSAGE'] == 'message'
+        assert isinstance(entry['MESSAGE'], TruncatedValue)
+        assert entry['FIELD'] == 'short'
+        assert not isinstance(entry['FIELD'], TruncatedValue)
+        assert entry['LIST'] == ['a', 'a' + '\xe9' * 4 + '\ufffd']
+        assert isinstance(entry['LIST'][1], TruncatedValue)
+        assert entry['__CURSOR'] == 'cursor'
+
+    def test_unique_values(self):
+        values = {
+            'MESSAGE': {'message', 'short'},
+            'PRIORITY': {3, 6},
+            '_COMM': {'comm'},
+        }
+        (flexmock(journal.Reader)
+            .should_receive('query_unique')
+            .replace_with(lambda field: values[field]))
+
+        reader = SelectiveReader(data_threshold=15)
+        assert reader.unique_values(['MESSAGE', 'PRIORITY', '_COMM']) == {
+            # MESSAGE values might be truncated
+            'PRIORITY': {3, 6},
+            '_COMM': {'comm'},
+        }
 
-        # And a log_level() match
-        assert watcher.calls[1] == ('log_level', (0,), '{}')
+        reader = SelectiveReader()
+        assert reader.unique_values(['MESSAGE']) == {
+            'MESSAGE': {'message', 'short'},
+        }
 
 
 @pytest.fixture
@@ -179,8 +349,9 @@ class TestLatestJournalEntries(object):
 
         assert len(e) == 2
 
-        cursor_file.seek(0)
-        assert cursor_file.read() == final_cursor
+        # the cursor file is replaced, not rewritten in place
+        with open(cursor_file.name, 'rt') as fp:
+            assert fp.read() == final_cursor
 
     def test_with_cursor(self, cursor_file):
         last_cursor = '2'
@@ -192,6 +363,10 @@ class TestLatestJournalEntries(object):
             .should_receive('seek_cursor')
             .with_args(last_cursor)
             .once())
+        (flexmock(journal.Reader)
+            .should_receive('test_cursor')
+            .with_args(last_cursor)
+            .and_return(True))
         (flexmock(journal.Reader)
             .should_receive('get_next')
             .and_return(results[0])
@@ -207,8 +382,32 @@ class TestLatestJournalEntries(object):
 
         assert e == results[1:]
 
-        cursor_file.seek(0)
-        assert cursor_file.read() == final_cursor
+        # the cursor file is replaced, not rewritten in place
+        with open(cursor_file.name, 'rt') as fp:
+            assert fp.read() == final_cursor
+
+    def test_bookmark_not_found(self, cursor_file):
+        results = [{'__CURSOR': make_cursor(3)},
+                   {'__CURSOR': make_cursor(4)}]
+        flexmock(journal.Reader).should_receive('seek_cursor').once()
+        flexmock(journal.Reader).should_receive('test_cursor').and_return(
+            False)
+        (flexmock(journal_brief.journal_brief)
+            .should_receive('bookmark_exists')
+            .and_return(False))
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return(results[0])
+            .and_return(results[1])
+            .and_return({}))
+
+        cursor_file.write(make_cursor(1))
+        cursor_file.flush()
+        with LatestJournalEntries(cursor_file=cursor_file.name) as entries:
+            assert list(entries) == results
+
+        with open(cursor_file.name, 'rt') as fp:
+            assert fp.read() == make_cursor(4)
 
     def test_no_seek_cursor(self, cursor_file):
         last_cursor = '2'
@@ -236,8 +435,432 @@ class TestLatestJournalEntries(object):
 
         assert e == results
 
-        cursor_file.seek(0)
-        assert cursor_file.read() == final_cursor
+        # the cursor file is replaced, not rewritten in place
+        with open(cursor_file.name, 'rt') as fp:
+            assert fp.read() == final_cursor
+
+    def test_max_entries(self, cursor_file):
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1'})
+            .and_return({'__CURSOR': '2'})
+            .and_return({}))
+
+        cursor_file.write('0')
+        cursor_file.flush()
+        with LatestJournalEntries(cursor_file=cursor_file.name,
+                                  seek_cursor=False,
+                                  max_entries=1) as entries:
+            assert list(entries) == [{'__CURSOR': '1'}]
+
+        assert entries.stopped_early
+        with open(cursor_file.name, 'rt') as fp:
+            assert fp.read() == '1'
+
+    def test_max_entries_at_end(self, cursor_file):
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1'})
+            .and_return({'__CURSOR': '2'})
+            .and_return({})
+            .times(3))
+
+        cursor_file.write('0')
+        cursor_file.flush()
+        with LatestJournalEntries(cursor_file=cursor_file.name,
+                                  seek_cursor=False,
+                                  max_entries=2) as entries:
+            assert list(entries) == [{'__CURSOR': '1'}, {'__CURSOR': '2'}]
+
+        # Nothing was left for the next run
+        assert not entries.stopped_early
+        with open(cursor_file.name, 'rt') as fp:
+            assert fp.read() == '2'
+
+    def test_time_range(self, cursor_file):
+        since = datetime(2026, 1, 1, 2, 0)
+        until = datetime(2026, 1, 1, 4, 0)
+        results = [{'__CURSOR': '1', '__REALTIME_TIMESTAMP': since},
+                   {'__CURSOR': '2', '__REALTIME_TIMESTAMP': until},
+                   {'__CURSOR': '3',
+                    '__REALTIME_TIMESTAMP': until + timedelta(seconds=1)}]
+        (flexmock(journal.Reader)
+            .should_receive('seek_cursor')
+            .never())
+        (flexmock(journal.Reader)
+            .should_receive('seek_realtime')
+            .with_args(since)
+            .once())
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return(results[0])
+            .and_return(results[1])
+            .and_return(results[2])
+            .and_return({}))
+
+        cursor_file.write('0')
+        cursor_file.flush()
+        with LatestJournalEntries(cursor_file=cursor_file.name,
+                                  dry_run=True, since=since,
+                                  until=until) as entries:
+            assert list(entries) == results[:2]
+
+        assert not entries.stopped_early
+        with open(cursor_file.name, 'rt') as fp:
+            assert fp.read() == '0'
+
+    def test_max_runtime(self, cursor_file):
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1'})
+            .and_return({}))
+        now = [100.0]
+        flexmock(time, monotonic=lambda: now[0])
+
+        cursor_file.write('0')
+        cursor_file.flush()
+        entries = LatestJournalEntries(cursor_file=cursor_file.name,
+                                       seek_cursor=False, max_runtime=10)
+        now[0] += 10
+        assert list(entries) == []
+        assert entries.stopped_early
+
+    def test_follow(self, cursor_file):
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1'})
+            .and_return({})
+            .and_return({})
+            .and_return({'__CURSOR': '2'})
+            .and_return({'__CURSOR': '3'})
+            .and_return({})
+            .and_return({}))
+        now = [100.0]
+        flexmock(time, monotonic=lambda: now[0])
+        (flexmock(journal.Reader)
+            .should_receive('wait')
+            .with_args(10)
+            .times(2))
+
+        cursor_file.write('0')
+        cursor_file.flush()
+        entries = LatestJournalEntries(cursor_file=cursor_file.name,
+                                       seek_cursor=False, follow=True)
+        entries.set_budget(max_entries=2, max_runtime=10)
+        assert list(entries) == [{'__CURSOR': '1'}, {'__CURSOR': '2'}]
+        assert entries.stopped_early
+
+        # The entry read to find that out is not lost
+        entries.set_budget(max_entries=1, max_runtime=10)
+        assert list(entries) == [{'__CURSOR': '3'}]
+        assert not entries.stopped_early
+
+        def wait(timeout):
+            now[0] += timeout
+
+        flexmock(journal.Reader).should_receive('wait').replace_with(wait)
+        entries.set_budget(max_runtime=10)
+        assert list(entries) == []
+        assert now[0] == 110.0
+
+    def test_checkpoint_entries(self, cursor_file):
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1'})
+            .and_return({'__CURSOR': '2'})
+            .and_return({'__CURSOR': '3'})
+            .and_return({}))
+
+        cursor_file.write('0')
+        cursor_file.flush()
+
+        saved = []
+        with LatestJournalEntries(cursor_file=cursor_file.name,
+                                  seek_cursor=False,
+                                  checkpoint_entries=2) as entries:
+            assert not entries.checkpoint_due()
+            for entry in entries:
+                if entries.checkpoint_due():
+                    entries.checkpoint()
+                    with open(cursor_file.name, 'rt') as fp:
+                        saved.append(fp.read())
+
+        assert saved == ['2']
+        assert os.listdir(os.path.dirname(cursor_file.name)) == ['cursor']
+
+    def test_checkpoint_interval(self, cursor_file):
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1'}))
+        now = [100.0]
+        flexmock(time, monotonic=lambda: now[0])
+
+        cursor_file.write('0')
+        cursor_file.flush()
+        entries = LatestJournalEntries(cursor_file=cursor_file.name,
+                                       seek_cursor=False,
+                                       checkpoint_interval=5)
+        next(entries)
+        now[0] += 4
+        assert not entries.checkpoint_due()
+        now[0] += 1
+        assert entries.checkpoint_due()
+        entries.checkpoint()
+        assert not entries.checkpoint_due()
+
+    def test_checkpoint_dry_run(self, cursor_file):
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': '1'}))
+
+        cursor_file.write('0')
+        cursor_file.flush()
+        entries = LatestJournalEntries(cursor_file=cursor_file.name,
+                                       dry_run=True, seek_cursor=False,
+                                       checkpoint_entries=1)
+        next(entries)
+        assert not entries.checkpoint_due()
+
+
+def make_cursor(seqnum, seqnum_id='1', boot_id='2', monotonic=None,
+                realtime=None):
+    return 's={0};i={1:x};b={2};m={3:x};t={4:x};x=0'.format(
+        seqnum_id, seqnum, boot_id,
+        seqnum if monotonic is None else monotonic,
+        seqnum if realtime is None else realtime)
+
+
+@pytest.mark.parametrize(('cursor', 'other', 'expected'), [
+    (make_cursor(1), make_cursor(2), True),
+    (make_cursor(2), make_cursor(1), False),
+    (make_cursor(2), make_cursor(2), False),
+    # Same sequence number ID, realtime clock went backwards
+    (make_cursor(1, realtime=20), make_cursor(0x10, realtime=10), True),
+    # Same boot
+    (make_cursor(5, seqnum_id='a', monotonic=1),
+     make_cursor(1, seqnum_id='b', monotonic=2), True),
+    # Nothing in common
+    (make_cursor(5, seqnum_id='a', boot_id='a', realtime=3),
+     make_cursor(1, seqnum_id='b', boot_id='b', realtime=4), True),
+])
+def test_cursor_precedes(cursor, other, expected):
+    assert cursor_precedes(cursor, other) == expected
+
+
+def test_cursor_invalid():
+    with pytest.raises(ValueError):
+        cursor_precedes('1', make_cursor(1))
+
+
+@pytest.mark.parametrize(('tail', 'cursors', 'expected'), [
+    ({'__CURSOR': '2'}, ['2'], True),
+    ({'__CURSOR': '2'}, ['2', '2'], True),
+    ({'__CURSOR': '2'}, ['1'], False),
+    ({'__CURSOR': '2'}, ['2', '1'], False),
+    ({}, ['1'], False),
+])
+def test_journal_unchanged(tail, cursors, expected):
+    flexmock(journal.Reader).should_receive('seek_tail').once()
+    flexmock(journal.Reader).should_receive('get_previous').and_return(tail)
+    (flexmock(journal.Reader)
+        .should_receive('test_cursor')
+        .replace_with(lambda cursor: cursor == tail['__CURSOR']))
+    flexmock(journal.Reader).should_receive('close').once()
+    assert journal_unchanged(cursors) == expected
+
+
+def test_write_cursor_file(tmp_path):
+    cursor_file = tmp_path / 'dir' / 'cursor'
+    synced = []
+    fsync = os.fsync
+    (flexmock(os)
+        .should_receive('fsync')
+        .replace_with(lambda fd: synced.append(os.fstat(fd)) or fsync(fd)))
+    write_cursor_file(str(cursor_file), 'cursor')
+    assert cursor_file.read_text() == 'cursor'
+
+    # The new file, then the directory the file was renamed in
+    assert len(synced) == 2
+    assert os.path.samestat(synced[1], os.stat(str(cursor_file.parent)))
+
+
+class TestSeekBookmark(object):
+    def test_found(self, caplog):
+        bookmark = make_cursor(2)
+        flexmock(journal.Reader).should_receive('seek_cursor').with_args(
+            bookmark).once()
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': bookmark})
+            .once())
+        flexmock(journal.Reader).should_receive('test_cursor').with_args(
+            bookmark).and_return(True)
+        assert seek_bookmark(journal.Reader(), bookmark) is None
+        assert 'not found' not in caplog.text
+
+    def test_not_selected(self, caplog):
+        # The bookmarked entry is still there, but the reader's matches
+        # don't select it
+        bookmark = make_cursor(2, realtime=2000000)
+        first = {'__CURSOR': make_cursor(17, realtime=5000000)}
+        flexmock(journal.Reader, add_match=None)
+        flexmock(journal.Reader).should_receive('seek_cursor').with_args(
+            bookmark).twice()
+        flexmock(journal.Reader).should_receive('seek_realtime').never()
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return(first)
+            .and_return({'__CURSOR': bookmark}))
+        # First for the filtered reader, then for an unfiltered one
+        (flexmock(journal.Reader)
+            .should_receive('test_cursor')
+            .with_args(bookmark)
+            .and_return(False)
+            .and_return(True))
+        reader = SelectiveReader()
+        reader.add_rules([Rule(log_level=None,
+                               inclusion={'_COMM': ['other']})])
+        assert seek_bookmark(reader, bookmark) == first
+        assert 'not found' not in caplog.text
+
+    def test_later(self, caplog):
+        # The bookmarked entry has gone, and the reader lands on the
+        # first entry after it, which is new
+        bookmark = make_cursor(2, realtime=2000000)
+        first = {'__CURSOR': make_cursor(5, realtime=5000000)}
+        flexmock(journal.Reader).should_receive('seek_cursor')
+        flexmock(journal.Reader).should_receive('seek_realtime').never()
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return(first)
+            .once())
+        flexmock(journal.Reader).should_receive('test_cursor').and_return(
+            False)
+        (flexmock(journal_brief.journal_brief)
+            .should_receive('bookmark_exists')
+            .with_args(bookmark)
+            .and_return(False))
+        assert seek_bookmark(journal.Reader(), bookmark) == first
+        assert '2 entries (3.0 seconds) later' in caplog.text
+
+    def test_earlier(self, caplog):
+        # The reader lands on an entry before the bookmark, so seeks
+        # to the bookmark's time instead
+        bookmark = make_cursor(10, seqnum_id='a', boot_id='a',
+                               realtime=0x1000)
+        earlier = {'__CURSOR': make_cursor(1, seqnum_id='b', boot_id='b',
+                                           realtime=0x10)}
+        first = {'__CURSOR': make_cursor(2, seqnum_id='b', boot_id='b',
+                                         realtime=0x1000 + 1500000)}
+        flexmock(journal.Reader).should_receive('seek_cursor')
+        (flexmock(journal.Reader)
+            .should_receive('seek_realtime')
+            .with_args(0x1001)
+            .once())
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return(earlier)
+            .and_return(first))
+        flexmock(journal.Reader).should_receive('test_cursor').and_return(
+            False)
+        (flexmock(journal_brief.journal_brief)
+            .should_receive('bookmark_exists')
+            .with_args(bookmark)
+            .and_return(False))
+        assert seek_bookmark(journal.Reader(), bookmark) == first
+        assert 'continuing 1.5 seconds later' in caplog.text
+
+
+class TestReverseJournalEntries(object):
+    def test_tail(self):
+        results = [{'__CURSOR': '2'}, {'__CURSOR': '1'}]
+        flexmock(journal.Reader).should_receive('seek_tail').once()
+        (flexmock(journal.Reader)
+            .should_receive('get_previous')
+            .and_return(results[0])
+            .and_return(results[1])
+            .and_return({}))
+
+        with ReverseJournalEntries() as entries:
+            assert list(entries) == results
+
+    def test_time_range(self):
+        since = datetime(2026, 1, 1, 2, 0)
+        until = datetime(2026, 1, 1, 4, 0)
+        results = [{'__CURSOR': '3', '__REALTIME_TIMESTAMP': until},
+                   {'__CURSOR': '2', '__REALTIME_TIMESTAMP': since},
+                   {'__CURSOR': '1',
+                    '__REALTIME_TIMESTAMP': since - timedelta(seconds=1)}]
+        flexmock(journal.Reader).should_receive('seek_tail').never()
+        (flexmock(journal.Reader)
+            .should_receive('seek_realtime')
+            .with_args(until + timedelta(microseconds=1))
+            .once())
+        (flexmock(journal.Reader)
+            .should_receive('get_previous')
+            .and_return(results[0])
+            .and_return(results[1])
+            .and_return(results[2])
+            .and_return({}))
+
+        entries = ReverseJournalEntries(since=since, until=until)
+        assert list(entries) == results[:2]
+
+
+class TestMultiCursorEntries(object):
+    def test_bookmarks(self, tmp_path):
+        cursor_files = [str(tmp_path / name) for name in ['a', 'b', 'c']]
+        for cursor_file, seqnum in zip(cursor_files, [1, 3, 2]):
+            with open(cursor_file, 'wt') as fp:
+                fp.write(make_cursor(seqnum))
+
+        (flexmock(journal.Reader)
+            .should_receive('seek_cursor')
+            .with_args(make_cursor(1))
+            .once())
+        flexmock(journal.Reader).should_receive('test_cursor').and_return(True)
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': make_cursor(1)})
+            .and_return({'__CURSOR': make_cursor(2)})
+            .and_return({'__CURSOR': make_cursor(4)})
+            .and_return({'__CURSOR': make_cursor(5)})
+            .and_return({}))
+
+        active = []
+        with MultiCursorEntries(cursor_files) as entries:
+            for entry in entries:
+                active.append(entries.active[:])
+
+        # The entry at the third bookmark is not for that profile
+        assert active == [[True, False, False],
+                          [True, True, True],
+                          [True, True, True]]
+        for cursor_file in cursor_files:
+            with open(cursor_file, 'rt') as fp:
+                assert fp.read() == make_cursor(5)
+
+    def test_missing_bookmark(self, tmp_path, missing_or_empty_cursor):
+        cursor_files = [str(tmp_path / name) for name in ['a', 'b']]
+        with open(cursor_files[0], 'wt') as fp:
+            fp.write(make_cursor(2))
+
+        (flexmock(journal.Reader)
+            .should_receive('seek_cursor')
+            .never())
+        (flexmock(journal.Reader)
+            .should_receive('get_next')
+            .and_return({'__CURSOR': make_cursor(1)})
+            .and_return({}))
+
+        with MultiCursorEntries(cursor_files) as entries:
+            assert len(list(entries)) == 1
+            assert entries.active == [False, True]
+
+        expected = [make_cursor(2), make_cursor(1)]
+        for cursor_file, cursor in zip(cursor_files, expected):
+            with open(cursor_file, 'rt') as fp:
+                assert fp.read() == cursor
 
 
 def test_version():
@@ -0,0 +1,95 @@
+"""
+Copyright (c) 2026 Tim Waugh <tim@cyberelk.net>
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+
+from tests.util import maybe_mock_systemd
+maybe_mock_systemd()
+
+from io import StringIO
+from journal_brief import JournalFilter
+from journal_brief.filter import RuleSet
+from journal_brief.format import EntryFormatter
+from journal_brief.parallel import ParallelFilter
+import pytest
+
+
+EXCLUSIONS = [
+    {'MESSAGE': ['/.*7$/']},
+    {'MESSAGE': ['/message 1.*/'], '_COMM': ['a']},
+    {'_COMM': ['b']},
+    {'MESSAGE': ['/.*[05]$/']},
+]
+
+
+def comm(n):
+    return 'abc'[n % 3]
+
+
+class TestParallelFilter(object):
+    @pytest.mark.parametrize('engine', RuleSet.ENGINES)
+    def test_same_as_serial(self, make_entries, engine):
+        entries = make_entries(300, _COMM=comm)
+        serial, jfilter = [
+            JournalFilter(iter(entries), [EntryFormatter()],
+                          default_exclusions=EXCLUSIONS, engine=engine,
+                          exclusion_hits={})
+            for _ in range(2)
+        ]
+        expected = StringIO()
+        serial.format(expected)
+
+        output = StringIO()
+        ParallelFilter(jfilter, 2, chunk_size=7).format(output)
+        assert output.getvalue() == expected.getvalue()
+        assert jfilter.evaluations == serial.evaluations
+        assert ([(excl.hits, excl.last_hit)
+                 for excl in jfilter.default_exclusions] ==
+                [(excl.hits, excl.last_hit)
+                 for excl in serial.default_exclusions])
+
+    def test_reduce(self, make_entries):
+        jfilter = JournalFilter(iter([]), [EntryFormatter()],
+                                default_exclusions=EXCLUSIONS)
+        parallel = ParallelFilter(jfilter, 2)
+        entry = make_entries(2, _COMM=comm)[1]
+        assert parallel.reduce(entry) == {'MESSAGE': 'message 1',
+                                          '_COMM': 'b'}
+
+    def test_checkpoints(self, make_entries, checkpoints):
+        entries = make_entries(3, _COMM=comm)
+        jfilter = JournalFilter(iter(entries), [EntryFormatter()],
+                                default_exclusions=EXCLUSIONS)
+        ParallelFilter(jfilter, 2).format(checkpoints.output,
+                                          checkpoints=checkpoints)
+        assert checkpoints.saved == [('0', ''),
+                                     ('1', ''),
+                                     ('2', 'message 2\n')]
+
+    def test_reuse_workers(self, make_entries):
+        entries = make_entries(6, _COMM=comm)
+        jfilter = JournalFilter(iter(entries[:3]), [EntryFormatter()],
+                                default_exclusions=EXCLUSIONS)
+        output = StringIO()
+        with ParallelFilter(jfilter, 2) as parallel:
+            pool = parallel.pool
+            parallel.format(output)
+            jfilter.iterator = iter(entries[3:])
+            parallel.format(output)
+            assert parallel.pool is pool
+
+        assert parallel.pool is None
+        assert output.getvalue() == 'message 2\nmessage 3\n'
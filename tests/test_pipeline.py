@@ -0,0 +1,78 @@
+"""
+Copyright (c) 2026 Tim Waugh <tim@cyberelk.net>
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+
+from tests.util import maybe_mock_systemd
+maybe_mock_systemd()
+
+from io import StringIO
+from journal_brief import JournalFilter
+from journal_brief.format import EntryFormatter, get_formatter
+import journal_brief.format.login  # registers class; # noqa: F401
+from journal_brief.pipeline import Pipeline
+import pytest
+
+
+class TestPipeline(object):
+    @pytest.mark.parametrize('queue_size', [1, None])
+    def test_same_output(self, make_entries, queue_size):
+        entries = make_entries(100,
+                               MESSAGE_ID=lambda n:
+                               'fc2e22bc6ee647b6b90729ab34a250b1',
+                               USER_ID=lambda n: 'user{0}'.format(n % 3))
+        serial, jfilter = [
+            JournalFilter(iter(entries),
+                          [EntryFormatter(), get_formatter('login')],
+                          default_exclusions=[{'MESSAGE': ['/.*5$/']}])
+            for _ in range(2)
+        ]
+        expected = StringIO()
+        serial.format(expected)
+
+        output = StringIO()
+        Pipeline(jfilter, queue_size=queue_size).format(output)
+        assert output.getvalue() == expected.getvalue()
+        assert jfilter.evaluations == serial.evaluations
+        assert ([excl.hits for excl in jfilter.default_exclusions] ==
+                [excl.hits for excl in serial.default_exclusions])
+
+    def test_checkpoints(self, make_entries, checkpoints):
+        jfilter = JournalFilter(iter(make_entries(2)), [EntryFormatter()])
+        Pipeline(jfilter).format(checkpoints.output, checkpoints=checkpoints)
+        assert checkpoints.saved == [('0', 'message 0\n'),
+                                     ('1', 'message 0\nmessage 1\n')]
+
+    def test_read_error(self, make_entries):
+        def entries():
+            yield make_entries(1)[0]
+            raise RuntimeError
+
+        output = StringIO()
+        jfilter = JournalFilter(entries(), [EntryFormatter()])
+        with pytest.raises(RuntimeError):
+            Pipeline(jfilter).format(output)
+
+        assert output.getvalue() == 'message 0\n'
+
+    def test_write_error(self, make_entries):
+        class BrokenStream(object):
+            def write(self, data):
+                raise IOError
+
+        jfilter = JournalFilter(iter(make_entries(1000)), [EntryFormatter()])
+        with pytest.raises(IOError):
+            Pipeline(jfilter, queue_size=1).format(BrokenStream())